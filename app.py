@@ -1,6 +1,9 @@
 import pandas as pd
 import streamlit as st
 import os
+import logging
+import tempfile
+from io import BytesIO
 from pathlib import Path
 from PIL import Image
 from libs.data_cleaning import *
@@ -11,6 +14,30 @@ from libs.Futuros import Futuros
 from libs.Bdr import Bdr
 from libs.Acoes import Acoes
 from libs.PrecoMedio import PrecoMedio
+from libs.CacheExtratos import CacheExtratos
+from libs.Filtros import IndiceFiltros
+from libs.Diagnostico import Diagnostico, LOGGER
+from libs.ConsultaParquet import (
+    BaseParquet,
+    ConsultaParquet,
+    COLUNAS_CONSULTA,
+    duckdb_disponivel,
+    limpar_bases,
+    materializar,
+)
+from libs.Paginacao import Paginacao
+from libs.BaseSQLite import BaseSQLite
+from libs.Metricas import Metricas
+from libs.ResultadoRealizado import ResultadoRealizado
+from libs.EventosCorporativos import EventosCorporativos
+from libs.Cotacoes import BaseCotacoes, listar_cotahist
+from libs.Patrimonio import Patrimonio
+from libs.ImpostoRenda import ImpostoRenda
+from libs.LeituraExtratos import (
+    ESTADO_CONCLUIDO,
+    ESTADO_ERRO,
+    LeituraExtratos,
+)
 
 
 # PANDAS CONFIG
@@ -33,511 +60,1331 @@ selecionar_imagem = listar_arquivos[0] if listar_arquivos else None
 caminho_arquivo_imagem = caminho_pasta_imagens / selecionar_imagem
 
 
-# APP PRINCIPAL
+# CACHE DOS EXTRATOS
 # -------------------------------------------------------------
-# MARK: Sidebar - upload dos extratos
-with st.sidebar:
-    extratos = st.file_uploader(
-        label="Envie os extratos da B3 em excel (extensão .xlsx)",
-        accept_multiple_files=True,
+# Compartilhado entre as sessões, para que cada extrato seja lido apenas uma vez.
+# Defina B3ANALYZER_PASTA_CACHE para manter também uma cópia em disco (parquet)
+# e B3ANALYZER_PROCESSOS para limitar a quantidade de processos na leitura dos extratos.
+@st.cache_resource
+def carregar_cache_extratos() -> CacheExtratos:
+    processos = os.environ.get("B3ANALYZER_PROCESSOS")
+
+    return CacheExtratos(
+        pasta=os.environ.get("B3ANALYZER_PASTA_CACHE"),
+        processos=int(processos) if processos else None,
+        compacto=True,
     )
 
-    st.markdown("---")
 
+# LEITURA EM SEGUNDO PLANO
+# -------------------------------------------------------------
+# Os extratos enviados são lidos em segundo plano, e as análises são mostradas com os extratos que já foram lidos
+# enquanto os demais continuam sendo lidos. Defina B3ANALYZER_LEITURA_SEGUNDO_PLANO=0 para ler todos os extratos
+# antes de mostrar as análises.
+LEITURA_SEGUNDO_PLANO: bool = os.environ.get("B3ANALYZER_LEITURA_SEGUNDO_PLANO") != "0"
 
-# Mostra as informações no Streamlit quando feito o upload dos extratos, senão mostra tela inicial informando para fazer o upload.
-if extratos:
-    # Ler e concatenar extratos em um dataframe único
-    df = ler_arquivos(extratos=extratos)
+# Intervalo, em segundos, entre as atualizações do progresso da leitura
+INTERVALO_PROGRESSO: float = 1.0
 
-    # Tratar o dataframe gerado para análise
-    df = tratar_dados(df=df)
+# Aviso mostrado no lugar das métricas e do imposto de renda enquanto há extratos sendo lidos
+AVISO_LEITURA: str = "Calculado quando todos os extratos enviados forem lidos."
 
-    # MARK: Filtros
-    with st.sidebar:
-        st.markdown("Filtros:")
 
-        col1, col2 = st.columns(spec=[1, 1])
+@st.cache_resource
+def carregar_leitura_extratos() -> LeituraExtratos:
+    processos = os.environ.get("B3ANALYZER_PROCESSOS")
 
-        with col1:
-            ano = st.multiselect(
-                label="Ano",
-                options=df["Ano"].sort_values(ascending=True).unique(),
-                default=None,
-                placeholder="",
-            )
+    return LeituraExtratos(
+        cache=carregar_cache_extratos(), processos=int(processos) if processos else None
+    )
 
-        with col2:
-            mes = st.multiselect(
-                label="Mes",
-                options=df["Mes"].sort_values(ascending=True).unique(),
-                default=None,
-                placeholder="",
-            )
 
-        movimentação = st.multiselect(
-            label="Movimentação",
-            options=df["Movimentação"].sort_values(ascending=True).unique(),
-            default=None,
-            placeholder="",
+# BASE DE MOVIMENTAÇÕES
+# -------------------------------------------------------------
+# Defina B3ANALYZER_BASE_SQLITE com o caminho de um arquivo SQLite para guardar as movimentações entre as sessões.
+# A base é separada por conta, informada na barra lateral: os extratos enviados são incluídos na conta sem
+# duplicar movimentações, e as análises são feitas sobre todas as movimentações da conta, mesmo sem enviar os
+# extratos novamente. Sem conta informada, a base não é lida nem alterada. A conta não é uma senha, então em
+# servidores com vários usuários o acesso ao app deve ser restrito a quem pode ver todas as contas.
+@st.cache_resource
+def carregar_base_sqlite() -> BaseSQLite | None:
+    arquivo = os.environ.get("B3ANALYZER_BASE_SQLITE")
+
+    return BaseSQLite(arquivo=arquivo) if arquivo else None
+
+
+# MOTOR DE CONSULTAS
+# -------------------------------------------------------------
+# Defina B3ANALYZER_MOTOR=duckdb para guardar os extratos tratados em parquet, particionados por ano, e executar
+# os filtros e as tabelas no duckdb, sem manter todo o histórico em memória.
+# B3ANALYZER_PASTA_PARQUET define a pasta dos arquivos parquet.
+MOTOR_DUCKDB: bool = os.environ.get("B3ANALYZER_MOTOR") == "duckdb"
+PASTA_PARQUET: Path = Path(
+    os.environ.get("B3ANALYZER_PASTA_PARQUET")
+    or Path(tempfile.gettempdir()) / "b3analyzer_parquet"
+)
+
+# Quantidade de bases em parquet mantidas na pasta. Cada conjunto de extratos (ou versão da base SQLite) grava uma
+# base, e as bases utilizadas há mais tempo são apagadas
+BASES_PARQUET: int = 4
+
+# Quantidade de linhas de cada página dos extratos
+LINHAS_POR_PAGINA: int = 1_000
+
+# Opção do seletor de ordenação que mantém a ordem original das movimentações
+ORDEM_ORIGINAL: str = "Ordem original"
+
+
+# COTAÇÕES
+# -------------------------------------------------------------
+# Defina B3ANALYZER_PASTA_COTAHIST com a pasta dos arquivos COTAHIST baixados da B3 (.TXT ou .ZIP) para importar
+# as cotações diárias dos tickers das movimentações. As cotações são guardadas em parquet na pasta
+# B3ANALYZER_PASTA_COTACOES, e cada arquivo só é lido novamente quando muda ou quando aparecem tickers novos.
+PASTA_COTAHIST: str | None = os.environ.get("B3ANALYZER_PASTA_COTAHIST")
+
+
+@st.cache_resource
+def carregar_base_cotacoes() -> BaseCotacoes | None:
+    if not PASTA_COTAHIST:
+        return None
+
+    return BaseCotacoes(
+        pasta=os.environ.get("B3ANALYZER_PASTA_COTACOES")
+        or Path(tempfile.gettempdir()) / "b3analyzer_cotacoes"
+    )
+
+
+# DIAGNÓSTICO
+# -------------------------------------------------------------
+# Defina B3ANALYZER_DIAGNOSTICO=1 para medir o tempo e as linhas de cada etapa.
+# As medições aparecem na barra lateral e são registradas no log como linhas em json.
+# Defina também B3ANALYZER_DIAGNOSTICO_MEMORIA=1 para medir o pico de memória de cada etapa com o tracemalloc,
+# que deixa a execução mais lenta e só fica ligado durante as etapas medidas.
+# Desligado, o diagnóstico não mede nada e não liga o tracemalloc.
+DIAGNOSTICO_ATIVO: bool = os.environ.get("B3ANALYZER_DIAGNOSTICO") == "1"
+diagnostico = Diagnostico(
+    ativo=DIAGNOSTICO_ATIVO,
+    medir_memoria=os.environ.get("B3ANALYZER_DIAGNOSTICO_MEMORIA") == "1",
+)
+
+
+@st.cache_resource
+def configurar_log_diagnostico() -> None:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(logging.INFO)
+
+
+if DIAGNOSTICO_ATIVO:
+    configurar_log_diagnostico()
+
+
+def mostrar_dataframe(data, **kwargs) -> None:
+    """
+    Mostra o dataframe no app, medindo o tempo da conversão e do envio dos dados para o navegador.
+
+    Argumentos:
+        data: Pandas dataframe a ser mostrado.
+        **kwargs: Demais argumentos do st.dataframe.
+    """
+    with diagnostico.medir(etapa="st.dataframe", entrada=data):
+        st.dataframe(data=data, **kwargs)
+
+
+def mostrar_extrato(data, key: str, chave: str, **kwargs) -> None:
+    """
+    Mostra o extrato por páginas de LINHAS_POR_PAGINA (int), com a pesquisa e a ordenação feitas no servidor.
+    Somente as linhas da página selecionada são enviadas para o navegador.
+
+    A paginação fica guardada na sessão pela chave dos extratos e dos filtros, então trocar de página não pesquisa
+    e não ordena o extrato novamente, mesmo com o dataframe montado novamente a cada execução.
+
+    Argumentos:
+        data: Pandas dataframe ou ConsultaParquet a ser mostrado.
+        key (str): Chave dos seletores da tabela, única no app.
+        chave (str): Chave dos extratos e dos filtros (a mesma da exportação), que muda quando os dados mudam.
+        **kwargs: Demais argumentos do st.dataframe.
+    """
+    colunas = (
+        COLUNAS_CONSULTA if isinstance(data, ConsultaParquet) else list(data.columns)
+    )
+
+    col1, col2, col3, col4 = st.columns(spec=[3, 2, 1, 1], vertical_alignment="bottom")
+    with col1:
+        pesquisa = st.text_input(label="Pesquisar", key=f"{key}_pesquisa")
+    with col2:
+        ordenar_por = st.selectbox(
+            label="Ordenar por", options=[ORDEM_ORIGINAL, *colunas], key=f"{key}_ordem"
+        )
+    with col3:
+        crescente = not st.toggle(label="Decrescente", key=f"{key}_decrescente")
+
+    ordenar_por = None if ordenar_por == ORDEM_ORIGINAL else ordenar_por
+    chave_tabela = f"{chave}|{key}"
+    paginacao = st.session_state.get(f"{key}_paginacao")
+    if paginacao is None or not paginacao.mesma_tabela(
+        chave=chave_tabela,
+        pesquisa=pesquisa.strip(),
+        ordenar_por=ordenar_por,
+        crescente=crescente,
+    ):
+        paginacao = Paginacao(
+            chave=chave_tabela,
+            pesquisa=pesquisa.strip(),
+            ordenar_por=ordenar_por,
+            crescente=crescente,
+            tamanho_pagina=LINHAS_POR_PAGINA,
+        )
+        st.session_state[f"{key}_paginacao"] = paginacao
+
+    # Volta para a última página quando a pesquisa ou os filtros diminuem a quantidade de páginas
+    chave_pagina = f"{key}_pagina"
+    paginas = paginacao.paginas(df=data)
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = paginas
+
+    with col4:
+        pagina = st.number_input(
+            label=f"Página (de {paginas})",
+            min_value=1,
+            max_value=paginas,
+            key=chave_pagina,
         )
 
-        ticker = st.multiselect(
-            label="Ticker",
-            options=df["Ticker"].sort_values(ascending=True).unique(),
-            default=None,
-            placeholder="",
+    inicio = (pagina - 1) * LINHAS_POR_PAGINA
+    linhas = paginacao.linhas(df=data)
+    with diagnostico.medir(etapa="Paginacao.pagina", linhas_entrada=linhas) as etapa:
+        df_pagina = etapa.registrar(paginacao.pagina(df=data, numero=pagina))
+
+    mostrar_dataframe(data=df_pagina, **kwargs)
+    st.caption(
+        f"Linhas {min(inicio + 1, linhas)} a {inicio + len(df_pagina)} de {linhas}"
+    )
+
+
+# EXPORTAÇÃO PARA EXCEL
+# -------------------------------------------------------------
+# Os arquivos excel são gerados somente quando solicitados e ficam em cache pela chave dos extratos enviados,
+# dos filtros e da tabela exportada, então voltar para uma tabela já exportada não gera o arquivo novamente.
+@st.cache_data(max_entries=64, show_spinner="Gerando arquivo excel...")
+def gerar_excel(chave: str, _gerar) -> bytes:
+    with diagnostico.medir(etapa=f"exportar_excel {chave.rsplit('|', 1)[-1]}"):
+        return _gerar().getvalue()
+
+
+def botao_exportar(label: str, gerar, file_name: str, key: str, chave: str) -> None:
+    """
+    Mostra o botão que gera o arquivo excel e, depois de gerado, o botão para download.
+
+    Argumentos:
+        label (str): Texto do botão.
+        gerar: Função sem argumentos que retorna o arquivo excel em BytesIO.
+        file_name (str): Nome do arquivo para download.
+        key (str): Chave do botão, única no app.
+        chave (str): Chave dos extratos enviados e dos filtros aplicados.
+    """
+    chave = f"{chave}|{key}"
+    gerados = st.session_state.setdefault("exportacoes_geradas", set())
+
+    if chave not in gerados and not st.button(label=label, key=f"{key}_gerar"):
+        return
+
+    gerados.add(chave)
+    st.download_button(
+        label="Baixar Excel",
+        data=gerar_excel(chave=chave, _gerar=gerar),
+        file_name=file_name,
+        key=key,
+    )
+
+
+# VISUALIZAÇÕES
+# -------------------------------------------------------------
+# Cada visualização é um fragmento: os botões e seletores dentro dela executam novamente somente o próprio
+# fragmento, sem recalcular o restante da página. Os filtros da barra lateral mudam os dados de todas as
+# visualizações, então continuam executando o app inteiro.
+# MARK: Métricas
+def mostrar_metricas(
+    metricas: Metricas, ticker: list, patrimonio: pd.DataFrame | None
+) -> None:
+    st.markdown("#### Carteira")
+    st.caption(
+        "Calculada com todas as movimentações enviadas, sem os filtros de período, "
+        "movimentação e corretora. Preço médio pelo custo médio: as vendas baixam o "
+        "custo pelo preço médio e não alteram o preço médio, diferente do saldo da "
+        "aba Ativos > Preço Médio."
+    )
+    tabela = metricas.tabela()
+    if ticker:
+        tabela = tabela[tabela.index.isin(ticker)]
+
+    col1, col2, col3, col4 = st.columns(spec=[1, 1, 1, 1])
+    col1.metric(label="Ativos em carteira", value=int((tabela["Quantidade"] > 0).sum()))
+    col2.metric(label="Custo da carteira", value=f"R$ {tabela['Custo'].sum():,.2f}")
+    col3.metric(
+        label="Resultado realizado",
+        value=f"R$ {tabela['Resultado Realizado'].sum():,.2f}",
+    )
+    col4.metric(label="Rendimentos", value=f"R$ {tabela['Rendimentos'].sum():,.2f}")
+
+    mostrar_dataframe(data=tabela, use_container_width=True)
+    st.markdown("---")
+
+    # Valor de mercado diário, somente quando há cotações importadas
+    if patrimonio is None or patrimonio.empty:
+        return
+    if ticker:
+        patrimonio = patrimonio[patrimonio["Ticker"].isin(ticker)]
+    por_classe = Patrimonio().por_classe(posicoes=patrimonio)
+    if por_classe.empty:
+        return
+
+    st.markdown("#### Patrimônio")
+    st.caption(
+        "Valor de mercado diário da carteira pelo último fechamento de cada ativo."
+    )
+    col1, col2 = st.columns(spec=[1, 1])
+    col1.metric(
+        label="Valor de mercado", value=f"R$ {por_classe['Total'].iloc[-1]:,.2f}"
+    )
+    col2.metric(label="Custo", value=f"R$ {por_classe['Custo'].iloc[-1]:,.2f}")
+    st.line_chart(data=por_classe, use_container_width=True)
+    st.markdown("---")
+
+
+# MARK: Extratos
+@st.fragment
+def mostrar_extratos(df_filtered: pd.DataFrame, chave_exportacao: str) -> None:
+    st.markdown("#### Extrato Consolidado")
+    mostrar_extrato(
+        data=df_filtered,
+        key="extrato_consolidado",
+        chave=chave_exportacao,
+        use_container_width=True,
+    )
+    botao_exportar(
+        label="Exportar Excel",
+        gerar=lambda: converter_para_excel(
+            materializar(df=df_filtered), streaming=True
+        ),
+        file_name="b3_extrato_consolidado.xlsx",
+        key="b3_extrato_consolidado",
+        chave=chave_exportacao,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Entradas/Saídas")
+    if isinstance(df_filtered, ConsultaParquet):
+        entradas = df_filtered.entradas()
+        saidas = df_filtered.saidas()
+    else:
+        entradas = separar_entradas(df=df_filtered)
+        saidas = separar_saidas(df=df_filtered)
+
+    col1, col2 = st.columns(spec=[1, 1])
+
+    with col1:
+        st.markdown("##### Entradas")
+        mostrar_extrato(
+            data=entradas,
+            key="extrato_entradas",
+            chave=chave_exportacao,
+            use_container_width=True,
         )
 
-        corretora = st.multiselect(
-            label="Corretora",
-            options=df["Instituição"].sort_values(ascending=True).unique(),
-            default=None,
-            placeholder="",
+    with col2:
+        st.markdown("##### Saídas")
+        mostrar_extrato(
+            data=saidas,
+            key="extrato_saidas",
+            chave=chave_exportacao,
+            use_container_width=True,
         )
 
-        st.markdown("---")
+    botao_exportar(
+        label="Exportar Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            dfs=[materializar(df=entradas), materializar(df=saidas)],
+            nome_planilhas=["Entradas", "Saídas"],
+            streaming=True,
+        ),
+        file_name="b3_extrato_entradas_saidas.xlsx",
+        key="b3_extrato_entradas_saidas",
+        chave=chave_exportacao,
+    )
+    st.markdown("---")
 
-        st.markdown(
-            "[![ko-fi](https://ko-fi.com/img/githubbutton_sm.svg)](https://ko-fi.com/B0B3V8QAU)"
+
+# MARK: Ações
+@st.fragment
+def mostrar_acoes(
+    df_filtered: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    acoes = Acoes()
+    with diagnostico.medir(
+        etapa="Acoes.pegar_somente_acoes", entrada=df_filtered
+    ) as etapa:
+        acoes_mov = etapa.registrar(acoes.pegar_somente_acoes(df=df_filtered))
+
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *tabelas.planilhas(df=acoes_mov, prefixo="Açoes"), streaming=True
+        ),
+        file_name="b3_acoes.xlsx",
+        key="b3_acoes",
+        chave=chave_exportacao,
+    )
+
+    st.markdown("#### Extrato Açoes")
+    mostrar_extrato(
+        data=acoes_mov,
+        key="extrato_acoes",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
+
+    st.markdown("#### Açoes por Período")
+    mostrar_dataframe(
+        data=tabelas.por_periodo(df=acoes_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Açoes por Ticker - Mensal")
+    mostrar_dataframe(
+        data=tabelas.ticker_mensal(df=acoes_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Açoes por Ticker - Anual")
+    mostrar_dataframe(
+        data=tabelas.ticker_anual(df=acoes_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Açoes por Tipo - Mensal")
+    mostrar_dataframe(
+        data=tabelas.tipo_mensal(df=acoes_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Açoes por Tipo - Anual")
+    mostrar_dataframe(
+        data=tabelas.tipo_anual(df=acoes_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+
+# MARK: FII
+@st.fragment
+def mostrar_fii(
+    df_filtered: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    fundos = Fii()
+    with diagnostico.medir(etapa="Fii.pegar_somente_fii", entrada=df_filtered) as etapa:
+        fii = etapa.registrar(fundos.pegar_somente_fii(df=df_filtered))
+
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *tabelas.planilhas(df=fii, prefixo="FII"), streaming=True
+        ),
+        file_name="b3_fii.xlsx",
+        key="b3_fii",
+        chave=chave_exportacao,
+    )
+
+    st.markdown("#### Extrato FII")
+    mostrar_extrato(
+        data=fii,
+        key="extrato_fii",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
+
+    st.markdown("#### FII por Período")
+    mostrar_dataframe(
+        data=tabelas.por_periodo(df=fii),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### FII por Ticker - Mensal")
+    mostrar_dataframe(
+        data=tabelas.ticker_mensal(df=fii),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### FII por Ticker - Anual")
+    mostrar_dataframe(
+        data=tabelas.ticker_anual(df=fii),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### FII por Tipo - Mensal")
+    mostrar_dataframe(
+        data=tabelas.tipo_mensal(df=fii),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### FII por Tipo - Anual")
+    mostrar_dataframe(
+        data=tabelas.tipo_anual(df=fii),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+
+# MARK: BDR
+@st.fragment
+def mostrar_bdr(
+    df_filtered: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    bdr = Bdr()
+    with diagnostico.medir(etapa="Bdr.pegar_somente_bdr", entrada=df_filtered) as etapa:
+        bdr_mov = etapa.registrar(bdr.pegar_somente_bdr(df_filtered))
+
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *tabelas.planilhas(df=bdr_mov, prefixo="BDR"), streaming=True
+        ),
+        file_name="b3_bdr.xlsx",
+        key="b3_bdr",
+        chave=chave_exportacao,
+    )
+
+    st.markdown("#### Extrato BDRs")
+    mostrar_extrato(
+        data=bdr_mov,
+        key="extrato_bdr",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
+
+    st.markdown("#### BDR por Período")
+    mostrar_dataframe(
+        data=tabelas.por_periodo(df=bdr_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### BDR por Ticker - Mensal")
+    mostrar_dataframe(
+        data=tabelas.ticker_mensal(df=bdr_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### BDR por Ticker - Anual")
+    mostrar_dataframe(
+        data=tabelas.ticker_anual(df=bdr_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### BDR por Tipo - Mensal")
+    mostrar_dataframe(
+        data=tabelas.tipo_mensal(df=bdr_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### BDR por Tipo - Anual")
+    mostrar_dataframe(
+        data=tabelas.tipo_anual(df=bdr_mov),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+
+# MARK: Futuros
+@st.fragment
+def mostrar_futuros(
+    df_filtered: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    futuros = Futuros()
+    with diagnostico.medir(
+        etapa="Futuros.pegar_somente_futuros", entrada=df_filtered
+    ) as etapa:
+        fut = etapa.registrar(futuros.pegar_somente_futuros(df_filtered))
+    with diagnostico.medir(
+        etapa="Futuros.calcular_day_trade", entrada=df_filtered
+    ) as etapa:
+        operacoes, day_trade = futuros.calcular_day_trade(df_filtered)
+        etapa.registrar(operacoes)
+
+    def planilhas() -> tuple[list, list]:
+        dfs, nome_planilhas = tabelas.planilhas_futuros(df=fut)
+        return (
+            dfs + [day_trade, operacoes],
+            nome_planilhas + ["Day Trade Por Dia", "Day Trade Operações"],
         )
 
-    # MARK: Lógica dos filtros
-    query = []
-    if ano:
-        query.append(f"Ano == {ano}")
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *planilhas(), streaming=True
+        ),
+        file_name="b3_futuros.xlsx",
+        key="b3_futuros",
+        chave=chave_exportacao,
+    )
 
-    if mes:
-        query.append(f"Mes == {mes}")
+    st.markdown("#### Extrato Futuros")
+    mostrar_extrato(
+        data=fut,
+        key="extrato_futuros",
+        chave=chave_exportacao,
+        use_container_width=True,
+    )
+    st.markdown("---")
 
-    if movimentação:
-        query.append(f"Movimentação == {movimentação}")
+    st.markdown("#### Futuros por Dia")
+    mostrar_dataframe(
+        data=tabelas.futuros_por_dia(df=fut),
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
 
-    if ticker:
-        query.append(f"Ticker == {ticker}")
+    st.markdown("#### Futuros por Período")
+    mostrar_dataframe(
+        data=tabelas.futuros_por_periodo(df=fut),
+        use_container_width=True,
+    )
+    st.markdown("---")
 
-    if corretora:
-        query.append(f"Instituição == {corretora}")
+    st.markdown("#### Day Trade por Dia")
+    st.caption(
+        "Compras e vendas de cada contrato no mesmo dia pareadas pela quantidade "
+        "(PEPS). Dias com posição carregada tiveram quantidade aberta ou encerrada de "
+        "um dia para o outro."
+    )
+    mostrar_extrato(
+        data=day_trade,
+        key="extrato_day_trade",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
 
-    if query:
-        df_filtered = df.query(" and ".join(query))
+    st.markdown("#### Operações de Day Trade")
+    mostrar_extrato(
+        data=operacoes,
+        key="extrato_operacoes_day_trade",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
 
-    else:
-        df_filtered = df
 
-    st.markdown("# Análise dos Investimentos")
+# MARK: Rendimentos
+@st.fragment
+def mostrar_rendimentos(
+    df_filtered: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    rendimentos = Rendimentos()
+    with diagnostico.medir(
+        etapa="Rendimentos.pegar_somente_rendimentos", entrada=df_filtered
+    ) as etapa:
+        rend = etapa.registrar(rendimentos.pegar_somente_rendimentos(df=df_filtered))
+
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *tabelas.planilhas(df=rend, prefixo="Rend."), streaming=True
+        ),
+        file_name="b3_rendimentos.xlsx",
+        key="b3_rendimentos",
+        chave=chave_exportacao,
+    )
 
-    metricas, extratos, ativos = st.tabs(["Métricas", "Extratos", "Ativos"])
-    tabelas = Tabelas()
+    st.markdown("#### Extrato Rendimentos")
+    mostrar_extrato(
+        data=rend,
+        key="extrato_rendimentos",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+    st.markdown("---")
 
-    # MARK: Métricas
-    # TODO: incluir métricas
-    with metricas:
-        pass
+    st.markdown("#### Rendimentos por Período")
+    mostrar_dataframe(
+        data=tabelas.por_periodo(df=rend),
+        use_container_width=True,
+    )
+    st.markdown("---")
 
-    # MARK: Extratos
-    with extratos:
-        st.markdown("#### Extrato Consolidado")
-        st.dataframe(data=df_filtered, use_container_width=True)
-        st.download_button(
-            label="Exportar Excel",
-            data=converter_para_excel(df_filtered),
-            file_name="b3_extrato_consolidado.xlsx",
-            key="b3_extrato_consolidado",
+    st.markdown("#### Rendimentos por Ticker - Mensal")
+    mostrar_dataframe(
+        data=tabelas.ticker_mensal(df=rend),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Rendimentos por Ticker - Anual")
+    mostrar_dataframe(
+        data=tabelas.ticker_anual(df=rend),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Rendimentos por Tipo - Mensal")
+    mostrar_dataframe(
+        data=tabelas.tipo_mensal(df=rend),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Rendimentos por Tipo - Anual")
+    mostrar_dataframe(
+        data=tabelas.tipo_anual(df=rend),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+
+# MARK: Preço Médio
+@st.fragment
+def mostrar_preco_medio(df_filtered: pd.DataFrame, chave_exportacao: str) -> None:
+    pmedio = PrecoMedio()
+    with diagnostico.medir(
+        etapa="PrecoMedio.calcular_preco_medio", entrada=df_filtered
+    ) as etapa:
+        preco_medio = etapa.registrar(pmedio.calcular_preco_medio(df=df_filtered))
+    st.markdown("#### Preço Médio")
+    st.caption(
+        "Saldo de valor das movimentações filtradas: as vendas baixam o valor da "
+        "venda do saldo, então o preço médio muda com o lucro ou o prejuízo de cada "
+        "venda parcial. O preço médio pelo custo médio, usado no resultado realizado "
+        "e no imposto de renda, está na aba Métricas."
+    )
+    mostrar_extrato(
+        data=preco_medio,
+        key="extrato_preco_medio",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+        },
+    )
+
+    eventos = st.session_state["eventos"]
+    if not eventos.empty:
+        st.markdown("#### Desdobros e Grupamentos")
+        st.caption(
+            "As quantidades e os preços das movimentações anteriores a cada evento "
+            "estão ajustados pelo fator."
+        )
+        mostrar_dataframe(
+            data=eventos,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
+            },
         )
-        st.markdown("---")
 
-        st.markdown("#### Entradas/Saídas")
-        entradas = separar_entradas(df=df_filtered)
-        saidas = separar_saidas(df=df_filtered)
 
-        col1, col2 = st.columns(spec=[1, 1])
+# MARK: Resultado Realizado
+# O livro de resultados precisa de todo o histórico (o preço médio depende das compras anteriores), então é
+# calculado uma vez para cada conjunto de extratos, e os filtros são aplicados nas vendas do livro
+def filtrar_resultado(df_completo, filtros: dict) -> pd.DataFrame:
+    chave_dataset = st.session_state["chave_dataset"]
+    if st.session_state.get("chave_resultado") != chave_dataset:
+        with diagnostico.medir(etapa="ResultadoRealizado.calcular_resultado") as etapa:
+            livro = etapa.registrar(
+                ResultadoRealizado().calcular_resultado(df=df_completo)
+            )
+        st.session_state["indice_resultado"] = IndiceFiltros(df=livro)
+        st.session_state["chave_resultado"] = chave_dataset
+
+    return st.session_state["indice_resultado"].filtrar(filtros=filtros)
+
+
+@st.fragment
+def mostrar_resultado_realizado(
+    resultado: pd.DataFrame, chave_exportacao: str, tabelas: Tabelas
+) -> None:
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            *tabelas.planilhas(df=resultado, prefixo="Result."), streaming=True
+        ),
+        file_name="b3_resultado_realizado.xlsx",
+        key="b3_resultado_realizado",
+        chave=chave_exportacao,
+    )
 
-        with col1:
-            st.markdown("##### Entradas")
-            st.dataframe(data=entradas, use_container_width=True)
+    st.markdown("#### Resultado Realizado - Vendas")
+    st.caption(
+        "Resultado de cada venda de Ações, FII e BDR pelo preço médio, calculado com "
+        "todo o histórico enviado."
+    )
+    mostrar_extrato(
+        data=resultado,
+        key="extrato_resultado",
+        chave=chave_exportacao,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY"),
+            "Valor da Operação": st.column_config.NumberColumn("Resultado"),
+        },
+    )
+    st.markdown("---")
 
-        with col2:
-            st.markdown("##### Saídas")
-            st.dataframe(data=saidas, use_container_width=True)
+    st.markdown("#### Resultado por Período")
+    mostrar_dataframe(
+        data=tabelas.por_periodo(df=resultado),
+        use_container_width=True,
+    )
+    st.markdown("---")
 
-        st.download_button(
-            label="Exportar Excel",
-            data=converter_para_excel_varias_planilhas(
-                dfs=[entradas, saidas], nome_planilhas=["Entradas", "Saídas"]
-            ),
-            file_name="b3_extrato_entradas_saidas.xlsx",
-            key="b3_extrato_entradas_saidas",
+    st.markdown("#### Resultado por Ticker - Mensal")
+    mostrar_dataframe(
+        data=tabelas.ticker_mensal(df=resultado),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+    st.markdown("#### Resultado por Ticker - Anual")
+    mostrar_dataframe(
+        data=tabelas.ticker_anual(df=resultado),
+        use_container_width=True,
+    )
+    st.markdown("---")
+
+
+# MARK: Imposto de Renda
+@st.fragment
+def mostrar_imposto_renda(
+    imposto: ImpostoRenda, filtros: dict, chave_exportacao: str
+) -> None:
+    apuracao = imposto.tabela()
+    livro = imposto.livro()
+    for coluna in ["Ano", "Mes"]:
+        if filtros[coluna]:
+            apuracao = apuracao[apuracao[coluna].isin(filtros[coluna])]
+            livro = livro[livro[coluna].isin(filtros[coluna])]
+
+    botao_exportar(
+        label="Exportar Todas as Tabelas para Excel",
+        gerar=lambda: converter_para_excel_varias_planilhas(
+            dfs=[apuracao, livro],
+            nome_planilhas=["Apuração", "Livro"],
+            streaming=True,
+        ),
+        file_name="b3_imposto_renda.xlsx",
+        key="b3_imposto_renda",
+        chave=chave_exportacao,
+    )
+
+    st.markdown("#### Imposto de Renda - Apuração Mensal")
+    st.caption(
+        "Imposto sobre o lucro nas vendas de Ações, FII e BDR pelo preço médio e no "
+        "day trade de futuros, com a isenção das vendas de ações até R$ 20 mil no mês "
+        "e a compensação dos prejuízos de cada grupo. Calculado com todo o histórico "
+        "enviado."
+    )
+    col1, col2 = st.columns(spec=[1, 1])
+    col1.metric(label="Imposto", value=f"R$ {apuracao['Imposto'].sum():,.2f}")
+    prejuizo = imposto.apuracao.groupby("Grupo")["Prejuízo a Compensar"].last().sum()
+    col2.metric(label="Prejuízo a compensar", value=f"R$ {prejuizo:,.2f}")
+    mostrar_dataframe(data=apuracao, use_container_width=True, hide_index=True)
+    st.markdown("---")
+
+    st.markdown("#### Resultado por Classe de Ativo")
+    mostrar_dataframe(data=livro, use_container_width=True, hide_index=True)
+    st.markdown("---")
+
+
+# MARK: Ativos
+# Trocar a classe de ativo executa novamente somente este fragmento, e somente a classe selecionada é calculada
+@st.fragment
+def mostrar_ativos(
+    df_filtered: pd.DataFrame,
+    chave_exportacao: str,
+    tabelas: Tabelas,
+    df_completo: pd.DataFrame,
+    filtros: dict,
+    imposto: ImpostoRenda | None,
+) -> None:
+    selecao_ativo = st.radio(
+        label="Selecione qual classe de ativo deseja ver:",
+        options=[
+            "Ações",
+            "FII",
+            "BDR",
+            "Futuros",
+            "Rendimentos",
+            "Preço Médio",
+            "Resultado Realizado",
+            "Imposto de Renda",
+        ],
+        horizontal=True,
+    )
+
+    if selecao_ativo == "Ações":
+        mostrar_acoes(
+            df_filtered=df_filtered, chave_exportacao=chave_exportacao, tabelas=tabelas
         )
-        st.markdown("---")
 
-    # MARK: Ativos
-    with ativos:
-        selecao_ativo = st.radio(
-            label="Selecione qual classe de ativo deseja ver:",
-            options=["Ações", "FII", "BDR", "Futuros", "Rendimentos", "Preço Médio"],
-            horizontal=True,
+    if selecao_ativo == "FII":
+        mostrar_fii(
+            df_filtered=df_filtered, chave_exportacao=chave_exportacao, tabelas=tabelas
         )
 
-        # MARK: Ações
-        if selecao_ativo == "Ações":
-            acoes = Acoes()
-            acoes_mov = acoes.pegar_somente_acoes(df=df_filtered)
-
-            st.download_button(
-                label="Exportar Todas as Tabelas para Excel",
-                data=converter_para_excel_varias_planilhas(
-                    dfs=[
-                        acoes_mov,
-                        tabelas.por_periodo(df=acoes_mov).reset_index(),
-                        tabelas.ticker_mensal(df=acoes_mov).reset_index(),
-                        tabelas.ticker_anual(df=acoes_mov).reset_index(),
-                        tabelas.tipo_mensal(df=acoes_mov).reset_index(),
-                        tabelas.tipo_anual(df=acoes_mov).reset_index(),
-                    ],
-                    nome_planilhas=[
-                        "Açoes Extrato Consolidado",
-                        "Açoes Por Período",
-                        "Açoes Ticker Mensal",
-                        "Açoes Tiker Anual",
-                        "Açoes Tipo Mensal",
-                        "Açoes Tipo Anual",
-                    ],
-                ),
-                file_name="b3_acoes.xlsx",
-                key="b3_acoes",
-            )
+    if selecao_ativo == "BDR":
+        mostrar_bdr(
+            df_filtered=df_filtered, chave_exportacao=chave_exportacao, tabelas=tabelas
+        )
 
-            st.markdown("#### Extrato Açoes")
-            st.dataframe(
-                data=acoes_mov,
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
-            )
-            st.markdown("---")
+    if selecao_ativo == "Futuros":
+        mostrar_futuros(
+            df_filtered=df_filtered, chave_exportacao=chave_exportacao, tabelas=tabelas
+        )
 
-            st.markdown("#### Açoes por Período")
-            st.dataframe(
-                data=tabelas.por_periodo(df=acoes_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    if selecao_ativo == "Rendimentos":
+        mostrar_rendimentos(
+            df_filtered=df_filtered, chave_exportacao=chave_exportacao, tabelas=tabelas
+        )
 
-            st.markdown("#### Açoes por Ticker - Mensal")
-            st.dataframe(
-                data=tabelas.ticker_mensal(df=acoes_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    if selecao_ativo == "Preço Médio":
+        mostrar_preco_medio(df_filtered=df_filtered, chave_exportacao=chave_exportacao)
 
-            st.markdown("#### Açoes por Ticker - Anual")
-            st.dataframe(
-                data=tabelas.ticker_anual(df=acoes_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    if selecao_ativo == "Resultado Realizado":
+        mostrar_resultado_realizado(
+            resultado=filtrar_resultado(df_completo=df_completo, filtros=filtros),
+            chave_exportacao=chave_exportacao,
+            tabelas=tabelas,
+        )
 
-            st.markdown("#### Açoes por Tipo - Mensal")
-            st.dataframe(
-                data=tabelas.tipo_mensal(df=acoes_mov),
-                use_container_width=True,
+    if selecao_ativo == "Imposto de Renda":
+        if imposto is None:
+            st.info(AVISO_LEITURA)
+        else:
+            mostrar_imposto_renda(
+                imposto=imposto, filtros=filtros, chave_exportacao=chave_exportacao
             )
-            st.markdown("---")
 
-            st.markdown("#### Açoes por Tipo - Anual")
-            st.dataframe(
-                data=tabelas.tipo_anual(df=acoes_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
-
-        # MARK: FII
-        if selecao_ativo == "FII":
-            fundos = Fii()
-            fii = fundos.pegar_somente_fii(df=df_filtered)
-
-            st.download_button(
-                label="Exportar Todas as Tabelas para Excel",
-                data=converter_para_excel_varias_planilhas(
-                    dfs=[
-                        fii,
-                        tabelas.por_periodo(df=fii).reset_index(),
-                        tabelas.ticker_mensal(df=fii).reset_index(),
-                        tabelas.ticker_anual(df=fii).reset_index(),
-                        tabelas.tipo_mensal(df=fii).reset_index(),
-                        tabelas.tipo_anual(df=fii).reset_index(),
-                    ],
-                    nome_planilhas=[
-                        "FII Extrato Consolidado",
-                        "FII Por Período",
-                        "FII Ticker Mensal",
-                        "FII Tiker Anual",
-                        "FII Tipo Mensal",
-                        "FII Tipo Anual",
-                    ],
-                ),
-                file_name="b3_fii.xlsx",
-                key="b3_fii",
-            )
 
-            st.markdown("#### Extrato FII")
-            st.dataframe(
-                data=fii,
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
-            )
-            st.markdown("---")
+# MARK: Leitura dos extratos
+# Somente este fragmento é executado a cada INTERVALO_PROGRESSO (float) segundos, e o app inteiro é executado
+# novamente quando mais extratos terminam, para incluí-los nas análises
+@st.fragment(run_every=INTERVALO_PROGRESSO)
+def mostrar_progresso_leitura(
+    leitura: LeituraExtratos, nomes: dict, concluidos: set
+) -> None:
+    estados = leitura.estados(chaves=list(nomes))
+    lidos = {chave for chave, estado in estados.items() if estado == ESTADO_CONCLUIDO}
 
-            st.markdown("#### FII por Período")
-            st.dataframe(
-                data=tabelas.por_periodo(df=fii),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    st.progress(
+        value=len(lidos) / len(nomes),
+        text=f"{len(lidos)} de {len(nomes)} extratos lidos",
+    )
+    for chave, nome in nomes.items():
+        st.caption(f"{nome}: {estados[chave]}")
 
-            st.markdown("#### FII por Ticker - Mensal")
-            st.dataframe(
-                data=tabelas.ticker_mensal(df=fii),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    if lidos != concluidos:
+        st.rerun(scope="app")
 
-            st.markdown("#### FII por Ticker - Anual")
-            st.dataframe(
-                data=tabelas.ticker_anual(df=fii),
-                use_container_width=True,
-            )
-            st.markdown("---")
 
-            st.markdown("#### FII por Tipo - Mensal")
-            st.dataframe(
-                data=tabelas.tipo_mensal(df=fii),
-                use_container_width=True,
-            )
-            st.markdown("---")
+def ler_extrato(extrato) -> pd.DataFrame:
+    """
+    Retorna o extrato tratado do cache, quando já foi lido em segundo plano, ou lê e trata o extrato.
 
-            st.markdown("#### FII por Tipo - Anual")
-            st.dataframe(
-                data=tabelas.tipo_anual(df=fii),
-                use_container_width=True,
-            )
-            st.markdown("---")
-
-        # MARK: BDR
-        if selecao_ativo == "BDR":
-            bdr = Bdr()
-            bdr_mov = bdr.pegar_somente_bdr(df_filtered)
-
-            st.download_button(
-                label="Exportar Todas as Tabelas para Excel",
-                data=converter_para_excel_varias_planilhas(
-                    dfs=[
-                        bdr_mov,
-                        tabelas.por_periodo(df=bdr_mov).reset_index(),
-                        tabelas.ticker_mensal(df=bdr_mov).reset_index(),
-                        tabelas.ticker_anual(df=bdr_mov).reset_index(),
-                        tabelas.tipo_mensal(df=bdr_mov).reset_index(),
-                        tabelas.tipo_anual(df=bdr_mov).reset_index(),
-                    ],
-                    nome_planilhas=[
-                        "BDR Extrato Consolidado",
-                        "BDR Por Período",
-                        "BDR Ticker Mensal",
-                        "BDR Tiker Anual",
-                        "BDR Tipo Mensal",
-                        "BDR Tipo Anual",
-                    ],
-                ),
-                file_name="b3_bdr.xlsx",
-                key="b3_bdr",
-            )
+    Argumentos:
+        extrato: Extrato enviado para upload.
+    """
+    df = cache_extratos.obter(chave=cache_extratos.calcular_chave(extrato=extrato))
+    if df is None:
+        df = ler_e_tratar_arquivo(extrato=BytesIO(extrato.getvalue()), compacto=True)
 
-            st.markdown("#### Extrato BDRs")
-            st.dataframe(
-                data=bdr_mov,
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
-            )
-            st.markdown("---")
+    return df
 
-            st.markdown("#### BDR por Período")
-            st.dataframe(
-                data=tabelas.por_periodo(df=bdr_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
 
-            st.markdown("#### BDR por Ticker - Mensal")
-            st.dataframe(
-                data=tabelas.ticker_mensal(df=bdr_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+# APP PRINCIPAL
+# -------------------------------------------------------------
+# MARK: Sidebar - upload dos extratos
+with st.sidebar:
+    extratos = st.file_uploader(
+        label="Envie os extratos da B3 em excel (extensão .xlsx)",
+        accept_multiple_files=True,
+    )
 
-            st.markdown("#### BDR por Ticker - Anual")
-            st.dataframe(
-                data=tabelas.ticker_anual(df=bdr_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    # A base de movimentações só é utilizada depois que a conta é informada
+    base_sqlite = carregar_base_sqlite()
+    conta = ""
+    if base_sqlite is not None:
+        conta = st.text_input(
+            label="Conta da base de movimentações",
+            help="Os extratos enviados são guardados na conta informada, e as análises "
+            "mostram todas as movimentações da conta.",
+        ).strip()
+        if not conta:
+            st.info("Informe a conta para guardar e consultar os extratos na base.")
+            base_sqlite = None
 
-            st.markdown("#### BDR por Tipo - Mensal")
-            st.dataframe(
-                data=tabelas.tipo_mensal(df=bdr_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    st.markdown("---")
 
-            st.markdown("#### BDR por Tipo - Anual")
-            st.dataframe(
-                data=tabelas.tipo_anual(df=bdr_mov),
-                use_container_width=True,
-            )
-            st.markdown("---")
-
-        # MARK: Futuros
-        if selecao_ativo == "Futuros":
-            futuros = Futuros()
-            fut = futuros.pegar_somente_futuros(df_filtered)
-
-            st.download_button(
-                label="Exportar Todas as Tabelas para Excel",
-                data=converter_para_excel_varias_planilhas(
-                    dfs=[
-                        fut,
-                        tabelas.futuros_por_dia(df=fut).reset_index(),
-                        tabelas.futuros_por_periodo(df=fut).reset_index(),
-                    ],
-                    nome_planilhas=[
-                        "Futuros Extrato Consolidado",
-                        "Futuros Por Dia",
-                        "Futuros Por Período",
-                    ],
-                ),
-                file_name="b3_futuros.xlsx",
-                key="b3_futuros",
-            )
 
-            st.markdown("#### Extrato Futuros")
-            st.dataframe(
-                data=fut,
-                use_container_width=True,
-            )
-            st.markdown("---")
+cache_extratos = carregar_cache_extratos()
+base_cotacoes = carregar_base_cotacoes()
 
-            st.markdown("#### Futuros por Dia")
-            st.dataframe(
-                data=tabelas.futuros_por_dia(df=fut),
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
-            )
-            st.markdown("---")
+# MARK: Leitura em segundo plano
+# Os extratos começam a ser lidos assim que são enviados, e somente os extratos já lidos seguem para a base e
+# para as análises. O progresso dos demais fica na barra lateral
+extratos_pendentes = False
+if LEITURA_SEGUNDO_PLANO and extratos:
+    leitura_extratos = carregar_leitura_extratos()
 
-            st.markdown("#### Futuros por Período")
-            st.dataframe(
-                data=tabelas.futuros_por_periodo(df=fut),
-                use_container_width=True,
-            )
-            st.markdown("---")
-
-        # MARK: Rendimentos
-        if selecao_ativo == "Rendimentos":
-            rendimentos = Rendimentos()
-            rend = rendimentos.pegar_somente_rendimentos(df=df_filtered)
-
-            st.download_button(
-                label="Exportar Todas as Tabelas para Excel",
-                data=converter_para_excel_varias_planilhas(
-                    dfs=[
-                        rend,
-                        tabelas.por_periodo(df=rend).reset_index(),
-                        tabelas.ticker_mensal(df=rend).reset_index(),
-                        tabelas.ticker_anual(df=rend).reset_index(),
-                        tabelas.tipo_mensal(df=rend).reset_index(),
-                        tabelas.tipo_anual(df=rend).reset_index(),
-                    ],
-                    nome_planilhas=[
-                        "Rend. Extrato Consolidado",
-                        "Rend. Por Período",
-                        "Rend. Ticker Mensal",
-                        "Rend. Tiker Anual",
-                        "Rend. Tipo Mensal",
-                        "Rend. Tipo Anual",
-                    ],
-                ),
-                file_name="b3_rendimentos.xlsx",
-                key="b3_rendimentos",
+    # Os extratos que falharam são lidos novamente somente quando enviados de novo, e não a cada execução do app
+    ids_extratos = [extrato.file_id for extrato in extratos]
+    novo_envio = st.session_state.get("ids_extratos") != ids_extratos
+    st.session_state["ids_extratos"] = ids_extratos
+    chaves_extratos = leitura_extratos.enviar(
+        extratos=extratos, repetir_erros=novo_envio
+    )
+    estados = leitura_extratos.estados(chaves=chaves_extratos)
+    with st.sidebar:
+        for extrato, chave_extrato in zip(extratos, chaves_extratos):
+            if estados[chave_extrato] == ESTADO_ERRO:
+                st.error(
+                    f"{extrato.name}: não foi possível ler o extrato "
+                    f"({leitura_extratos.erro(chave=chave_extrato)})."
+                )
+
+        nomes = {
+            chave_extrato: extrato.name
+            for extrato, chave_extrato in zip(extratos, chaves_extratos)
+            if estados[chave_extrato] != ESTADO_ERRO
+        }
+        concluidos = {
+            chave_extrato
+            for chave_extrato in nomes
+            if estados[chave_extrato] == ESTADO_CONCLUIDO
+        }
+        extratos_pendentes = len(concluidos) < len(nomes)
+        if extratos_pendentes:
+            mostrar_progresso_leitura(
+                leitura=leitura_extratos, nomes=nomes, concluidos=concluidos
             )
 
-            st.markdown("#### Extrato Rendimentos")
-            st.dataframe(
-                data=rend,
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
+    extratos = [
+        extrato
+        for extrato, chave_extrato in zip(extratos, chaves_extratos)
+        if estados[chave_extrato] == ESTADO_CONCLUIDO
+    ]
+
+# MARK: Base de movimentações
+# Somente os extratos que ainda não foram incluídos são lidos, e somente as movimentações novas são gravadas
+if base_sqlite is not None and extratos:
+    for extrato in extratos:
+        chave_extrato = cache_extratos.calcular_chave(extrato=extrato)
+        if not base_sqlite.extrato_incluido(conta=conta, chave=chave_extrato):
+            with st.spinner(f"Incluindo {extrato.name} na base..."):
+                with diagnostico.medir(etapa="incluir_base_sqlite") as etapa:
+                    incluidas = base_sqlite.incluir(
+                        conta=conta,
+                        df=etapa.registrar(ler_extrato(extrato=extrato)),
+                        chave=chave_extrato,
+                    )
+            st.toast(
+                f"{extrato.name}: {incluidas} movimentações novas incluídas na base."
             )
-            st.markdown("---")
 
-            st.markdown("#### Rendimentos por Período")
-            st.dataframe(
-                data=tabelas.por_periodo(df=rend),
-                use_container_width=True,
-            )
-            st.markdown("---")
 
-            st.markdown("#### Rendimentos por Ticker - Mensal")
-            st.dataframe(
-                data=tabelas.ticker_mensal(df=rend),
-                use_container_width=True,
-            )
-            st.markdown("---")
+# No duckdb a base em parquet só é gravada com todos os extratos lidos, e não uma vez para cada extrato concluído
+aguardar_leitura = extratos_pendentes and MOTOR_DUCKDB and duckdb_disponivel()
+
+# Mostra as informações no Streamlit quando feito o upload dos extratos ou quando a conta possui movimentações na
+# base, senão mostra tela inicial informando para fazer o upload.
+if not aguardar_leitura and (
+    extratos or (base_sqlite is not None and base_sqlite.contar(conta=conta) > 0)
+):
+    # Ler, tratar e concatenar extratos em um dataframe único
+    # Somente os extratos que ainda não estão no cache são lidos novamente, e o dataframe e o índice
+    # dos filtros são montados apenas quando os extratos enviados (ou as movimentações da base) mudam
+    # As chaves dos extratos identificam as movimentações já processadas pelas métricas e pelo imposto. As
+    # movimentações da conta na base só são incluídas, nunca alteradas, então a conta tem uma única chave
+    if base_sqlite is not None:
+        chave_dataset = base_sqlite.versao(conta=conta)
+        chaves_movimentacoes = [f"{base_sqlite.arquivo}|{conta}"]
+    else:
+        chave_dataset = cache_extratos.chave_dataset(extratos=extratos)
+        chaves_movimentacoes = [
+            cache_extratos.calcular_chave(extrato=extrato) for extrato in extratos
+        ]
+    motor_duckdb = MOTOR_DUCKDB and duckdb_disponivel()
+    if MOTOR_DUCKDB and not motor_duckdb:
+        st.warning("O duckdb não está instalado, utilizando o pandas.")
+
+    # A base em parquet da sessão também é montada novamente quando foi apagada por limpar_bases
+    if st.session_state.get("chave_dataset") != (chave_dataset, motor_duckdb) or (
+        motor_duckdb and not st.session_state["indice_filtros"].gravada
+    ):
+        # No motor duckdb os extratos são tratados um de cada vez e gravados em parquet, e a pasta da base
+        # é reaproveitada enquanto os mesmos extratos forem enviados
+        if motor_duckdb:
+            base = BaseParquet(pasta=PASTA_PARQUET / chave_dataset)
+            if not base.gravada:
+                with diagnostico.medir(etapa="gravar_parquet"):
+                    if base_sqlite is not None:
+                        dfs = base_sqlite.ler_partes(conta=conta)
+                    else:
+                        dfs = (ler_extrato(extrato=extrato) for extrato in extratos)
+                    base.gravar(dfs=dfs)
+            limpar_bases(pasta=PASTA_PARQUET, atual=base.pasta, manter=BASES_PARQUET)
+            df = base.consulta()
+
+        else:
+            with diagnostico.medir(etapa="ler_extratos") as etapa:
+                if base_sqlite is not None:
+                    df = etapa.registrar(base_sqlite.ler(conta=conta))
+                else:
+                    df = etapa.registrar(
+                        cache_extratos.ler_extratos(
+                            extratos=extratos, diagnostico=diagnostico
+                        )
+                    )
+
+        # Quantidades e preços ajustados pelos desdobros e grupamentos, utilizados em todas as análises.
+        # No duckdb o ajuste é uma expressão SQL de uma nova BaseParquet, sobre os mesmos arquivos
+        eventos_corporativos = EventosCorporativos()
+        with diagnostico.medir(
+            etapa="EventosCorporativos.ajustar", entrada=df
+        ) as etapa:
+            eventos = eventos_corporativos.eventos(df=df)
+            df = eventos_corporativos.ajustar(df=df, eventos=eventos)
+            etapa.registrar(eventos)
+        st.session_state["eventos"] = eventos.reset_index(drop=True)
+
+        if motor_duckdb:
+            st.session_state["indice_filtros"] = df.base
+        else:
+            with diagnostico.medir(etapa="IndiceFiltros", entrada=df):
+                st.session_state["indice_filtros"] = IndiceFiltros(df=df)
+        st.session_state["chave_dataset"] = (chave_dataset, motor_duckdb)
+
+    # IndiceFiltros no pandas, ou BaseParquet no duckdb. Os dois informam as opções de cada filtro
+    indice_filtros = st.session_state["indice_filtros"]
+
+    # As métricas e o livro do imposto são atualizados uma vez, com todos os extratos lidos, e não para cada
+    # conjunto parcial de extratos concluídos
+    if not extratos_pendentes and (
+        st.session_state.get("chave_metricas") != st.session_state["chave_dataset"]
+    ):
+        df = indice_filtros.consulta() if motor_duckdb else indice_filtros.df
+
+        # As métricas guardadas na sessão são atualizadas somente com as movimentações novas
+        with diagnostico.medir(etapa="Metricas.atualizar"):
+            st.session_state["metricas"] = st.session_state.get(
+                "metricas", Metricas()
+            ).atualizar(df=df, chaves=chaves_movimentacoes)
+
+        # O livro do imposto também é atualizado somente a partir do primeiro mês das movimentações novas
+        with diagnostico.medir(etapa="ImpostoRenda.atualizar"):
+            st.session_state["imposto"] = st.session_state.get(
+                "imposto", ImpostoRenda()
+            ).atualizar(df=df, chaves=chaves_movimentacoes)
+        st.session_state["chave_metricas"] = st.session_state["chave_dataset"]
+
+    # MARK: Cotações
+    # Somente os arquivos COTAHIST novos ou alterados são lidos, filtrados pelos tickers das movimentações, e as
+    # cotações da sessão são lidas novamente da base quando um arquivo é importado ou os extratos mudam
+    if base_cotacoes is not None:
+        tickers = indice_filtros.opcoes(coluna="Ticker")
+        pendentes = base_cotacoes.pendentes(
+            arquivos=listar_cotahist(pasta=PASTA_COTAHIST), tickers=tickers
+        )
+        for arquivo in pendentes:
+            with st.spinner(f"Importando as cotações de {arquivo.name}..."):
+                with diagnostico.medir(etapa="importar_cotahist"):
+                    importadas = base_cotacoes.importar(
+                        arquivo=arquivo, tickers=tickers
+                    )
+            st.toast(f"{arquivo.name}: {importadas} cotações importadas.")
+
+        # O valor de mercado diário é calculado junto com as cotações, uma vez para cada conjunto de extratos
+        if pendentes or st.session_state.get("chave_cotacoes") != chave_dataset:
+            with diagnostico.medir(etapa="BaseCotacoes.ler") as etapa:
+                st.session_state["cotacoes"] = etapa.registrar(
+                    base_cotacoes.ler(tickers=tickers)
+                )
+            with diagnostico.medir(etapa="Patrimonio.posicoes_diarias") as etapa:
+                st.session_state["patrimonio"] = etapa.registrar(
+                    Patrimonio().posicoes_diarias(
+                        df=(
+                            indice_filtros.consulta()
+                            if motor_duckdb
+                            else indice_filtros.df
+                        ),
+                        cotacoes=st.session_state["cotacoes"],
+                        eventos=st.session_state["eventos"],
+                    )
+                )
+            st.session_state["chave_cotacoes"] = chave_dataset
 
-            st.markdown("#### Rendimentos por Ticker - Anual")
-            st.dataframe(
-                data=tabelas.ticker_anual(df=rend),
-                use_container_width=True,
-            )
-            st.markdown("---")
+    # MARK: Filtros
+    with st.sidebar:
+        st.markdown("Filtros:")
 
-            st.markdown("#### Rendimentos por Tipo - Mensal")
-            st.dataframe(
-                data=tabelas.tipo_mensal(df=rend),
-                use_container_width=True,
+        col1, col2 = st.columns(spec=[1, 1])
+
+        with col1:
+            ano = st.multiselect(
+                label="Ano",
+                options=indice_filtros.opcoes(coluna="Ano"),
+                default=None,
+                placeholder="",
             )
-            st.markdown("---")
 
-            st.markdown("#### Rendimentos por Tipo - Anual")
-            st.dataframe(
-                data=tabelas.tipo_anual(df=rend),
-                use_container_width=True,
+        with col2:
+            mes = st.multiselect(
+                label="Mes",
+                options=indice_filtros.opcoes(coluna="Mes"),
+                default=None,
+                placeholder="",
             )
-            st.markdown("---")
 
-        # MARK: Preço Médio
-        if selecao_ativo == "Preço Médio":
-            pmedio = PrecoMedio()
-            preco_medio = pmedio.calcular_preco_medio(df=df_filtered)
-            st.markdown(
-                "#### Preço Médio - Filtre um ativo para análise do preço médio"
+        movimentação = st.multiselect(
+            label="Movimentação",
+            options=indice_filtros.opcoes(coluna="Movimentação"),
+            default=None,
+            placeholder="",
+        )
+
+        ticker = st.multiselect(
+            label="Ticker",
+            options=indice_filtros.opcoes(coluna="Ticker"),
+            default=None,
+            placeholder="",
+        )
+
+        corretora = st.multiselect(
+            label="Corretora",
+            options=indice_filtros.opcoes(coluna="Instituição"),
+            default=None,
+            placeholder="",
+        )
+
+        st.markdown("---")
+
+        st.markdown(
+            "[![ko-fi](https://ko-fi.com/img/githubbutton_sm.svg)](https://ko-fi.com/B0B3V8QAU)"
+        )
+
+    # MARK: Lógica dos filtros
+    filtros = {
+        "Ano": ano,
+        "Mes": mes,
+        "Movimentação": movimentação,
+        "Ticker": ticker,
+        "Instituição": corretora,
+    }
+    if motor_duckdb:
+        # A consulta só é executada quando as linhas ou as tabelas são mostradas
+        df_filtered = indice_filtros.consulta().filtrar(filtros=filtros)
+    else:
+        with diagnostico.medir(etapa="filtrar", entrada=indice_filtros.df) as etapa:
+            df_filtered = etapa.registrar(indice_filtros.filtrar(filtros=filtros))
+    chave_exportacao = f"{chave_dataset}|{IndiceFiltros.chave_filtros(filtros=filtros)}"
+
+    st.markdown("# Análise dos Investimentos")
+
+    # Somente a aba selecionada é montada, ao contrário do st.tabs que executa o conteúdo de todas as abas
+    aba = st.radio(
+        label="Aba",
+        options=["Métricas", "Extratos", "Ativos"],
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    tabelas = Tabelas(diagnostico=diagnostico)
+
+    # MARK: Métricas
+    if aba == "Métricas":
+        if extratos_pendentes:
+            st.info(AVISO_LEITURA)
+        else:
+            mostrar_metricas(
+                metricas=st.session_state["metricas"],
+                ticker=ticker,
+                patrimonio=st.session_state.get("patrimonio"),
             )
+
+    # MARK: Extratos
+    if aba == "Extratos":
+        mostrar_extratos(df_filtered=df_filtered, chave_exportacao=chave_exportacao)
+
+    # MARK: Ativos
+    if aba == "Ativos":
+        mostrar_ativos(
+            df_filtered=df_filtered,
+            chave_exportacao=chave_exportacao,
+            tabelas=tabelas,
+            df_completo=(
+                indice_filtros.consulta() if motor_duckdb else indice_filtros.df
+            ),
+            filtros=filtros,
+            imposto=None if extratos_pendentes else st.session_state["imposto"],
+        )
+
+    # MARK: Diagnóstico
+    # Mostrado por último para incluir as medições de todas as etapas executadas
+    if diagnostico.ativo:
+        with st.sidebar.expander("Diagnóstico"):
             st.dataframe(
-                data=preco_medio,
-                use_container_width=True,
-                column_config={
-                    "Data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY")
-                },
+                data=diagnostico.tabela(), use_container_width=True, hide_index=True
             )
 
 
+# MARK: Leitura dos primeiros extratos
+elif extratos_pendentes:
+    st.markdown("# Análise dos Investimentos")
+    if aguardar_leitura:
+        st.info(
+            "Lendo os extratos enviados. As análises aparecem quando todos os "
+            "extratos forem lidos."
+        )
+    else:
+        st.info(
+            "Lendo os extratos enviados. As análises aparecem assim que o primeiro "
+            "extrato for lido."
+        )
+
 # MARK: Tela Inicial
 else:
     # Mostrar mensagem de erro se o logo não for encontrado
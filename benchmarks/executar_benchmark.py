@@ -0,0 +1,376 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from libs.data_cleaning import *
+from libs.Rendimentos import Rendimentos
+from libs.Fii import Fii
+from libs.Tabelas import Tabelas
+from libs.Futuros import Futuros
+from libs.Bdr import Bdr
+from libs.Acoes import Acoes
+from libs.PrecoMedio import PrecoMedio
+from libs.Filtros import IndiceFiltros
+from libs.Metricas import Metricas
+from libs.ResultadoRealizado import ResultadoRealizado
+from libs.ImpostoRenda import ImpostoRenda
+from libs.Cotacoes import ler_cotahist
+from libs.Patrimonio import Patrimonio
+from benchmarks.gerar_extratos import gerar_cotahist, gerar_extrato, salvar_extrato
+
+
+# CONSTANTES
+# -----------------------------
+# Tamanhos dos extratos medidos quando nenhum tamanho é informado
+TAMANHOS_PADRAO: list = [1_000, 10_000, 100_000, 1_000_000]
+
+# Maior extrato medido nas etapas que leem ou escrevem excel, que são bem mais lentas que as demais
+LIMITE_EXCEL_PADRAO: int = 20_000
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def medir(funcao, repeticoes: int) -> dict:
+    """
+    Mede o tempo e o pico de memória da função.
+
+    O tempo é o menor entre as repetições, sem o tracemalloc, que deixa a execução mais lenta.
+    O pico de memória é medido em uma execução separada com o tracemalloc.
+
+    Argumentos:
+        funcao: Função sem argumentos que executa a etapa e retorna o resultado.
+        repeticoes (int): Quantidade de execuções para a medição do tempo.
+
+    Retorna:
+        dict: Resultado da função, tempo em segundos e pico de memória em MB.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "resultado": resultado,
+        "segundos": min(tempos),
+        "pico_mb": pico / 1e6,
+    }
+
+
+def contar_linhas(resultado) -> int:
+    """
+    Retorna a quantidade de linhas do resultado de uma etapa.
+
+    Argumentos:
+        resultado: Dataframe, lista, tupla ou dict de dataframes, ou BytesIO retornado pela etapa.
+
+    Retorna:
+        int: Soma das linhas dos dataframes do resultado, ou 0 quando não há dataframes.
+    """
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        resultado = list(resultado.values())
+    if isinstance(resultado, (list, tuple)):
+        return sum(contar_linhas(item) for item in resultado)
+
+    return 0
+
+
+def metadados() -> dict:
+    """
+    Retorna as informações do ambiente em que o benchmark foi executado, para comparar os resultados.
+
+    Retorna:
+        dict: Data, commit do git, versões do python e das bibliotecas, sistema e quantidade de CPUs.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sistema": platform.platform(),
+        "cpus": os.cpu_count(),
+        "motor_excel": escolher_motor_excel(),
+    }
+
+
+# Etapas medidas
+def etapas(
+    bruto: pd.DataFrame, arquivos: list | None, cotahist: Path | None = None
+) -> list:
+    """
+    Monta a lista de etapas do processamento na ordem em que são executadas pelo app.
+    Cada etapa recebe o resultado das etapas anteriores, já calculado fora da medição.
+
+    Argumentos:
+        bruto (pd.DataFrame): Extrato gerado por gerar_extrato, com as colunas do extrato original.
+        arquivos (list | None): Arquivos excel do extrato, ou None para não medir as etapas de excel.
+        cotahist (Path | None): Arquivo COTAHIST com o mesmo número de linhas do extrato, ou None para não medir
+        a leitura das cotações.
+
+    Retorna:
+        list: Tuplas com o nome da etapa, a quantidade de linhas recebidas e a função sem argumentos da etapa.
+    """
+    tabelas = Tabelas()
+    valores = converter_valores(df=bruto.copy())
+    tratado = tratar_dados(df=valores.copy(), compacto=True)
+    classificado = classificar_ativos(df=tratado)
+    acoes = Acoes().pegar_somente_acoes(df=classificado)
+    futuros = Futuros().pegar_somente_futuros(classificado)
+    # Sem guardar os dataframes filtrados, para medir o filtro e não a busca no cache
+    indice_sem_cache = IndiceFiltros(df=classificado, tamanho_maximo=0)
+    filtros = {
+        "Ano": [int(classificado["Ano"].max())],
+        "Ticker": indice_sem_cache.opcoes(coluna="Ticker")[:3],
+    }
+
+    lista = [
+        ("converter_valores", len(bruto), lambda: converter_valores(df=bruto.copy())),
+        ("tratar_dados", len(valores), lambda: tratar_dados(df=valores.copy())),
+        (
+            "tratar_dados_compacto",
+            len(valores),
+            lambda: tratar_dados(df=valores.copy(), compacto=True),
+        ),
+        ("classificar_ativos", len(tratado), lambda: classificar_ativos(df=tratado)),
+        (
+            "separar_ativos",
+            len(classificado),
+            lambda: [
+                Acoes().pegar_somente_acoes(df=classificado),
+                Fii().pegar_somente_fii(df=classificado),
+                Bdr().pegar_somente_bdr(df=classificado),
+                Futuros().pegar_somente_futuros(classificado),
+                Rendimentos().pegar_somente_rendimentos(df=classificado),
+            ],
+        ),
+        (
+            "tabelas",
+            len(acoes),
+            # Instância nova a cada execução para medir também a montagem do cubo agregado
+            lambda: Tabelas().planilhas(df=acoes, prefixo="Açoes")[0][1:],
+        ),
+        (
+            "tabelas_futuros",
+            len(futuros),
+            lambda: [
+                tabelas.futuros_por_dia(df=futuros),
+                tabelas.futuros_por_periodo(df=futuros),
+            ],
+        ),
+        (
+            "day_trade_futuros",
+            len(classificado),
+            lambda: Futuros().calcular_day_trade(classificado),
+        ),
+        (
+            "preco_medio",
+            len(classificado),
+            lambda: PrecoMedio().calcular_preco_medio(df=classificado),
+        ),
+        (
+            "metricas",
+            len(classificado),
+            lambda: Metricas().atualizar(df=classificado).tabela(),
+        ),
+        (
+            "resultado_realizado",
+            len(classificado),
+            lambda: ResultadoRealizado().calcular_resultado(df=classificado),
+        ),
+        (
+            "imposto_renda",
+            len(classificado),
+            lambda: ImpostoRenda().atualizar(df=classificado).tabela(),
+        ),
+        ("indice_filtros", len(classificado), lambda: IndiceFiltros(df=classificado)),
+        (
+            "filtrar",
+            len(classificado),
+            lambda: indice_sem_cache.filtrar(filtros=filtros),
+        ),
+    ]
+
+    if cotahist is not None:
+        tickers = classificado["Ticker"].dropna().unique()
+        cotacoes = ler_cotahist(arquivo=cotahist, tickers=tickers)
+        lista += [
+            (
+                "ler_cotahist",
+                len(bruto),
+                lambda: ler_cotahist(arquivo=cotahist, tickers=tickers),
+            ),
+            (
+                "patrimonio",
+                len(classificado),
+                lambda: Patrimonio().posicoes_diarias(
+                    df=classificado, cotacoes=cotacoes
+                ),
+            ),
+        ]
+
+    if arquivos is not None:
+        lista.insert(
+            0, ("ler_arquivos", len(bruto), lambda: ler_arquivos(extratos=arquivos))
+        )
+        lista.append(
+            (
+                "exportar_excel",
+                len(classificado),
+                lambda: converter_para_excel(classificado, streaming=True),
+            )
+        )
+
+    return lista
+
+
+# Executar o benchmark
+def executar_benchmark(
+    tamanhos: list,
+    repeticoes: int = 3,
+    limite_excel: int = LIMITE_EXCEL_PADRAO,
+    semente: int = 0,
+) -> dict:
+    """
+    Mede cada etapa do processamento para cada tamanho de extrato.
+
+    Argumentos:
+        tamanhos (list): Quantidades de linhas dos extratos gerados.
+        repeticoes (int): Quantidade de execuções de cada etapa para a medição do tempo.
+        limite_excel (int): Maior extrato medido nas etapas de leitura e escrita de excel.
+        semente (int): Semente do gerador dos extratos.
+
+    Retorna:
+        dict: Metadados do ambiente e lista com tamanho, etapa, linhas, segundos, linhas/s e pico de memória.
+    """
+    resultados = []
+
+    for tamanho in tamanhos:
+        bruto = gerar_extrato(linhas=tamanho, semente=semente)
+
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivos = None
+            if tamanho <= limite_excel:
+                arquivos = salvar_extrato(df=bruto, pasta=Path(pasta))
+            cotahist = Path(pasta) / "COTAHIST.TXT"
+            cotahist.write_bytes(gerar_cotahist(linhas=tamanho, semente=semente))
+
+            for etapa, linhas, funcao in etapas(
+                bruto=bruto, arquivos=arquivos, cotahist=cotahist
+            ):
+                medicao = medir(funcao=funcao, repeticoes=repeticoes)
+                resultados.append(
+                    {
+                        "tamanho": tamanho,
+                        "etapa": etapa,
+                        "linhas_entrada": linhas,
+                        "linhas_saida": contar_linhas(medicao["resultado"]),
+                        "segundos": medicao["segundos"],
+                        "linhas_por_segundo": linhas / max(medicao["segundos"], 1e-9),
+                        "pico_mb": medicao["pico_mb"],
+                    }
+                )
+                print(
+                    f"{tamanho:>10} {etapa:<22} {medicao['segundos']:>9.4f} s "
+                    f"{medicao['pico_mb']:>9.1f} MB",
+                    flush=True,
+                )
+
+    return {"metadados": metadados(), "resultados": resultados}
+
+
+# Comparar com um benchmark anterior
+def comparar_resultados(atual: dict, anterior: dict) -> pd.DataFrame:
+    """
+    Compara o tempo e o pico de memória de cada etapa com os de um benchmark anterior.
+
+    Argumentos:
+        atual (dict): Resultado de executar_benchmark.
+        anterior (dict): Resultado de um benchmark anterior, lido do json salvo.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe por tamanho e etapa, com a razão atual / anterior do tempo e da memória.
+    """
+    colunas = ["tamanho", "etapa", "segundos", "pico_mb"]
+    df = pd.DataFrame(atual["resultados"])[colunas].merge(
+        pd.DataFrame(anterior["resultados"])[colunas],
+        on=["tamanho", "etapa"],
+        suffixes=(" atual", " anterior"),
+    )
+    df["razao segundos"] = df["segundos atual"] / df["segundos anterior"]
+    df["razao pico_mb"] = df["pico_mb atual"] / df["pico_mb anterior"]
+
+    return df.set_index(["tamanho", "etapa"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Mede o tempo e a memória de cada etapa do processamento dos extratos."
+        )
+    )
+    parser.add_argument(
+        "--tamanhos",
+        type=int,
+        nargs="+",
+        default=TAMANHOS_PADRAO,
+        help="Linhas dos extratos.",
+    )
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--limite-excel", type=int, default=LIMITE_EXCEL_PADRAO)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument(
+        "--saida",
+        type=Path,
+        default=Path("benchmark.json"),
+        help="Arquivo json com os resultados.",
+    )
+    parser.add_argument(
+        "--comparar",
+        type=Path,
+        default=None,
+        help="Arquivo json de um benchmark anterior.",
+    )
+    argumentos = parser.parse_args()
+
+    resultado = executar_benchmark(
+        tamanhos=argumentos.tamanhos,
+        repeticoes=argumentos.repeticoes,
+        limite_excel=argumentos.limite_excel,
+        semente=argumentos.semente,
+    )
+    argumentos.saida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    if argumentos.comparar is not None:
+        anterior = json.loads(argumentos.comparar.read_text())
+        print(
+            comparar_resultados(atual=resultado, anterior=anterior).round(3).to_string()
+        )
@@ -0,0 +1,342 @@
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from libs.data_cleaning import *
+
+
+# CONSTANTES
+# -----------------------------
+# Quantidade máxima de linhas de dados em uma planilha do excel (1.048.576 linhas menos o cabeçalho)
+LINHAS_POR_PLANILHA: int = 1_048_575
+
+# Produtos de cada classe de ativo, no formato da coluna Produto do extrato, e o preço de referência
+PRODUTOS: dict = {
+    "Ações": {
+        "PETR4 - PETROLEO BRASILEIRO S/A PETROBRAS": 35.0,
+        "VALE3 - VALE S.A.": 65.0,
+        "ITSA4 - ITAUSA INVESTIMENTOS ITAU S.A.": 10.0,
+        "BBAS3 - BANCO DO BRASIL S/A": 27.0,
+        "WEGE3 - WEG S.A.": 40.0,
+    },
+    "FII": {
+        "HGLG11 - CSHG LOGISTICA FDO INV IMOB - FII": 160.0,
+        "MXRF11 - MAXI RENDA FDO INV IMOB - FII": 10.0,
+        "KNRI11 - KINEA RENDA IMOBILIARIA FDO INV IMOB - FII": 150.0,
+    },
+    "BDR": {
+        "AAPL34 - APPLE INC": 50.0,
+        "ROXO34 - NU HOLDINGS LTD": 8.0,
+        "AMZO34 - AMAZON.COM, INC": 45.0,
+    },
+    "Futuros": {
+        "WDO - WDOF24": 5000.0,
+        "WDO - WDOG24": 5000.0,
+        "WIN - WINZ23": 125000.0,
+        "WIN - WING24": 125000.0,
+    },
+    "Outros": {
+        "Tesouro Selic 2029": 14000.0,
+        "CDB - CDB BANCO XP S.A.": 1000.0,
+    },
+}
+
+# Movimentações de cada classe de ativo e a probabilidade de cada uma
+MOVIMENTACOES: dict = {
+    "Ações": {
+        "Transferência - Liquidação": 0.60,
+        "Dividendo": 0.15,
+        "Juros Sobre Capital Próprio": 0.15,
+        "Desdobro": 0.04,
+        "Grupamento": 0.02,
+        "Atualização": 0.04,
+    },
+    "FII": {
+        "Transferência - Liquidação": 0.40,
+        "Rendimento": 0.52,
+        "Amortização": 0.05,
+        "Atualização": 0.03,
+    },
+    "BDR": {
+        "Transferência - Liquidação": 0.70,
+        "Dividendo": 0.25,
+        "Desdobro": 0.05,
+    },
+    "Futuros": {
+        "Compra": 0.50,
+        "Venda": 0.50,
+    },
+    "Outros": {
+        "Compra": 0.45,
+        "Juros": 0.30,
+        "Resgate": 0.25,
+    },
+}
+
+# Probabilidade de cada classe de ativo no extrato gerado
+PROPORCAO_CLASSES: dict = {
+    "Ações": 0.40,
+    "FII": 0.25,
+    "BDR": 0.12,
+    "Futuros": 0.15,
+    "Outros": 0.08,
+}
+
+# Movimentações de rendimento, com o valor por unidade no preço unitário
+MOVIMENTACOES_RENDIMENTO: list = [
+    "Dividendo",
+    "Juros Sobre Capital Próprio",
+    "Rendimento",
+    "Amortização",
+    "Juros",
+]
+
+# Movimentações em que a B3 informa "-" no preço unitário e no valor da operação
+MOVIMENTACOES_SEM_VALOR: list = ["Desdobro", "Grupamento", "Atualização"]
+
+# Movimentações de saída do ativo
+MOVIMENTACOES_DEBITO: list = ["Venda", "Resgate"]
+
+INSTITUICOES: list = [
+    "XP INVESTIMENTOS CCTVM S/A",
+    "NU INVEST CORRETORA DE VALORES S.A.",
+    "BTG PACTUAL SERVIÇOS FINANCEIROS S/A DTVM",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def repetir_textos(valores: list, codigos: np.ndarray) -> pd.Series:
+    """
+    Monta uma coluna de textos a partir dos códigos, reutilizando o mesmo objeto str para valores iguais.
+    Evita criar milhões de strings repetidas em extratos grandes.
+
+    Argumentos:
+        valores (list): Textos possíveis da coluna.
+        codigos (np.ndarray): Posição em valores do texto de cada linha.
+
+    Retorna:
+        pd.Series: Coluna com os textos, do tipo object.
+    """
+    return pd.Series(
+        pd.Categorical.from_codes(codes=codigos, categories=valores)
+    ).astype(object)
+
+
+# Gerar um extrato sintético
+def gerar_extrato(
+    linhas: int, semente: int = 0, ano_inicial: int = 2019, anos: int = 5
+) -> pd.DataFrame:
+    """
+    Gera um extrato de movimentação sintético com as mesmas colunas e formatos do extrato original da B3.
+
+    O extrato contém Ações, FII, BDR, futuros de WDO e WIN, renda fixa, rendimentos, desdobros e grupamentos,
+    com "-" nas colunas de valores das movimentações sem valor, como no extrato original.
+
+    Argumentos:
+        linhas (int): Quantidade de linhas do extrato.
+        semente (int): Semente do gerador de números aleatórios, para gerar sempre o mesmo extrato.
+        ano_inicial (int): Ano da primeira movimentação.
+        anos (int): Quantidade de anos do período das movimentações.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_EXTRATO (list), na ordem das datas.
+    """
+    rng = np.random.default_rng(semente)
+    classes = list(PROPORCAO_CLASSES)
+    produtos = [produto for classe in classes for produto in PRODUTOS[classe]]
+    precos = np.array(
+        [preco for classe in classes for preco in PRODUTOS[classe].values()]
+    )
+    movimentacoes = list(
+        dict.fromkeys(mov for classe in classes for mov in MOVIMENTACOES[classe])
+    )
+
+    classe = rng.choice(len(classes), size=linhas, p=list(PROPORCAO_CLASSES.values()))
+    codigo_produto = np.empty(linhas, dtype=np.int64)
+    codigo_movimentacao = np.empty(linhas, dtype=np.int64)
+    quantidade = np.empty(linhas, dtype=np.float64)
+
+    inicio_produtos = 0
+    for codigo_classe, nome_classe in enumerate(classes):
+        mask = classe == codigo_classe
+        total = int(mask.sum())
+        quantidade_produtos = len(PRODUTOS[nome_classe])
+
+        codigo_produto[mask] = inicio_produtos + rng.integers(
+            0, quantidade_produtos, total
+        )
+        codigos_classe = np.array(
+            [movimentacoes.index(mov) for mov in MOVIMENTACOES[nome_classe]]
+        )
+        codigo_movimentacao[mask] = codigos_classe[
+            rng.choice(
+                len(codigos_classe),
+                size=total,
+                p=list(MOVIMENTACOES[nome_classe].values()),
+            )
+        ]
+        maximo = 5 if nome_classe == "Futuros" else 500
+        quantidade[mask] = rng.integers(1, maximo + 1, total)
+
+        inicio_produtos += quantidade_produtos
+
+    movimentacao = np.array(movimentacoes, dtype=object)[codigo_movimentacao]
+    rendimento = np.isin(movimentacao, MOVIMENTACOES_RENDIMENTO)
+    sem_valor = np.isin(movimentacao, MOVIMENTACOES_SEM_VALOR)
+
+    # Preço com variação de até 30% sobre a referência, e rendimentos entre 0,1% e 1% do preço por unidade
+    preco = precos[codigo_produto] * rng.uniform(0.7, 1.3, linhas)
+    preco = np.where(rendimento, preco * rng.uniform(0.001, 0.01, linhas), preco)
+    preco = np.round(preco, 2)
+    valor = np.round(preco * quantidade, 2)
+
+    preco = preco.astype(object)
+    valor = valor.astype(object)
+    preco[sem_valor] = "-"
+    valor[sem_valor] = "-"
+
+    entrada = np.where(
+        np.isin(movimentacao, MOVIMENTACOES_DEBITO)
+        | (
+            (movimentacao == "Transferência - Liquidação") & (rng.random(linhas) < 0.35)
+        ),
+        1,
+        0,
+    )
+
+    # Datas em ordem, como no extrato da B3, montadas a partir dos dias distintos do período
+    dias = pd.date_range(f"{ano_inicial}-01-01", periods=365 * anos, freq="D")
+    codigo_dia = np.sort(rng.integers(0, len(dias), linhas))
+
+    df = pd.DataFrame(
+        {
+            "Entrada/Saída": repetir_textos(["Credito", "Debito"], entrada),
+            "Data": repetir_textos(list(dias.strftime("%d/%m/%Y")), codigo_dia),
+            "Movimentação": pd.Series(movimentacao),
+            "Produto": repetir_textos(produtos, codigo_produto),
+            "Instituição": repetir_textos(
+                INSTITUICOES, rng.integers(0, len(INSTITUICOES), linhas)
+            ),
+            "Quantidade": quantidade,
+            "Preço unitário": preco,
+            "Valor da Operação": valor,
+        },
+        columns=COLUNAS_EXTRATO,
+    )
+
+    return df
+
+
+# Salvar o extrato gerado em excel
+def salvar_extrato(df: pd.DataFrame, pasta: Path, nome: str = "extrato") -> list:
+    """
+    Salva o extrato em um ou mais arquivos excel, respeitando o limite de LINHAS_POR_PLANILHA (int) de cada arquivo.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe gerado por gerar_extrato.
+        pasta (Path): Pasta onde os arquivos são salvos.
+        nome (str): Nome base dos arquivos.
+
+    Retorna:
+        list: Caminhos dos arquivos salvos.
+    """
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    arquivos = []
+
+    for parte, inicio in enumerate(range(0, len(df), LINHAS_POR_PLANILHA), start=1):
+        arquivo = pasta / f"{nome}_{parte:03d}.xlsx"
+        conteudo = escrever_excel_streaming(
+            dfs=[df.iloc[inicio : inicio + LINHAS_POR_PLANILHA]],
+            nome_planilhas=["Movimentação"],
+        )
+        arquivo.write_bytes(conteudo.getvalue())
+        arquivos.append(arquivo)
+
+    return arquivos
+
+
+# Gerar um arquivo COTAHIST sintético
+def gerar_cotahist(linhas: int, semente: int = 0, ano: int = 2023) -> bytes:
+    """
+    Gera o conteúdo de um arquivo COTAHIST sintético, com o mesmo layout de largura fixa do arquivo da B3.
+
+    Além dos tickers de PRODUTOS (dict), as cotações incluem tickers inventados, para que a maior parte das
+    linhas seja descartada pelo filtro de tickers, como em um arquivo real com todos os papéis da bolsa.
+
+    Argumentos:
+        linhas (int): Quantidade de linhas de cotação.
+        semente (int): Semente do gerador de números aleatórios.
+        ano (int): Ano das cotações.
+
+    Retorna:
+        bytes: Conteúdo do arquivo, com cabeçalho, rodapé e quebras de linha CRLF.
+    """
+    rng = np.random.default_rng(semente)
+    tickers = [
+        produto.split(" - ")[0]
+        for classe in ["Ações", "FII", "BDR"]
+        for produto in PRODUTOS[classe]
+    ]
+    letras = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    inventados = [
+        "".join(rng.choice(letras, 4)) + str(rng.choice([3, 4, 11, 34]))
+        for _ in range(2_000)
+    ]
+    codigos = np.array(tickers + inventados, dtype="S12")
+    codigos = np.char.ljust(codigos, 12).view(np.uint8).reshape(-1, 12)
+    dias = pd.bdate_range(f"{ano}-01-01", f"{ano}-12-31")
+    dias = (dias.year * 10000 + dias.month * 100 + dias.day).to_numpy(dtype=np.int64)
+
+    registros = np.full((linhas, 247), ord(" "), dtype=np.uint8)
+    registros[:, 245:] = np.frombuffer(b"\r\n", dtype=np.uint8)
+
+    def escrever(inicio: int, valor) -> None:
+        if isinstance(valor, bytes):
+            registros[:, inicio : inicio + len(valor)] = np.frombuffer(
+                valor, dtype=np.uint8
+            )
+        else:
+            tamanho, valores = valor
+            pesos = 10 ** np.arange(tamanho - 1, -1, -1, dtype=np.int64)
+            registros[:, inicio : inicio + tamanho] = (
+                valores[:, None] // pesos
+            ) % 10 + ord("0")
+
+    centavos = rng.integers(100, 20_000, linhas)
+    quantidade = rng.integers(100, 1_000_000, linhas)
+    escrever(0, b"01")
+    escrever(2, (8, np.sort(dias[rng.integers(0, len(dias), linhas)])))
+    escrever(10, b"02")
+    registros[:, 12:24] = codigos[rng.integers(0, len(codigos), linhas)]
+    escrever(24, b"010")
+    for inicio, variacao in [(56, 1.0), (69, 1.02), (82, 0.98), (95, 1.0), (108, 1.0)]:
+        escrever(inicio, (13, (centavos * variacao).astype(np.int64)))
+    escrever(147, (5, rng.integers(1, 50_000, linhas)))
+    escrever(152, (18, quantidade))
+    escrever(170, (18, centavos * quantidade))
+    escrever(210, b"0000001")
+
+    cabecalho = f"00COTAHIST.{ano}BOVESPA {ano}1231".ljust(245).encode() + b"\r\n"
+    rodape = (
+        f"99COTAHIST.{ano}BOVESPA {ano}1231{linhas + 2:011d}".ljust(245).encode()
+        + b"\r\n"
+    )
+
+    return cabecalho + registros.tobytes() + rodape
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gera extratos de movimentação sintéticos no formato da B3."
+    )
+    parser.add_argument("linhas", type=int, help="Quantidade de linhas do extrato.")
+    parser.add_argument("pasta", type=Path, help="Pasta onde os arquivos são salvos.")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--nome", default="extrato")
+    argumentos = parser.parse_args()
+
+    df = gerar_extrato(linhas=argumentos.linhas, semente=argumentos.semente)
+    for arquivo in salvar_extrato(df=df, pasta=argumentos.pasta, nome=argumentos.nome):
+        print(arquivo)
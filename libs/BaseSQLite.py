@@ -0,0 +1,306 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from libs.ConsultaParquet import COLUNAS_CONSULTA, ajustar_tipos
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas que identificam uma movimentação. As demais colunas (ano, mês, semana e classe) são calculadas a partir delas
+COLUNAS_CHAVE: list = [
+    "Entrada/Saída",
+    "Data",
+    "Ticker",
+    "Descrição Ticker",
+    "Movimentação",
+    "Instituição",
+    "Quantidade",
+    "Preço unitário",
+    "Valor da Operação",
+]
+
+# Colunas dos filtros que podem ser consultados na base, cobertos pelos índices
+COLUNAS_FILTROS_BASE: list = ["Ano", "Mes", "Movimentação", "Ticker", "Instituição"]
+
+# Quantidade de movimentações lidas por vez em ler_partes
+LINHAS_PARTE: int = 100_000
+
+# Criação das tabelas e dos índices da base
+ESQUEMA_BASE: str = """
+CREATE TABLE IF NOT EXISTS movimentacoes (
+    "Conta" TEXT NOT NULL,
+    "Hash" INTEGER NOT NULL,
+    "Ocorrencia" INTEGER NOT NULL,
+    "Entrada/Saída" TEXT,
+    "Ano" INTEGER,
+    "Mes" TEXT,
+    "Semana" INTEGER,
+    "Data" TEXT,
+    "Ticker" TEXT,
+    "Descrição Ticker" TEXT,
+    "Classe" TEXT,
+    "Movimentação" TEXT,
+    "Instituição" TEXT,
+    "Quantidade" NUMERIC,
+    "Preço unitário" REAL,
+    "Valor da Operação" REAL,
+    UNIQUE ("Conta", "Hash", "Ocorrencia")
+);
+CREATE INDEX IF NOT EXISTS movimentacoes_conta_data ON movimentacoes ("Conta", "Data");
+CREATE INDEX IF NOT EXISTS movimentacoes_conta_ticker_data ON movimentacoes ("Conta", "Ticker", "Data");
+CREATE INDEX IF NOT EXISTS movimentacoes_conta_ano_mes ON movimentacoes ("Conta", "Ano", "Mes");
+CREATE TABLE IF NOT EXISTS extratos (
+    "Conta" TEXT NOT NULL,
+    "Chave" TEXT NOT NULL,
+    "Linhas" INTEGER NOT NULL,
+    "Incluidas" INTEGER NOT NULL,
+    "Data Inclusao" TEXT NOT NULL,
+    PRIMARY KEY ("Conta", "Chave")
+);
+"""
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def identificar_movimentacoes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula o hash do conteúdo de cada movimentação e o número da ocorrência das movimentações iguais.
+
+    Movimentações iguais no mesmo extrato (por exemplo duas compras iguais no mesmo dia) recebem ocorrências
+    0, 1, 2..., então o mesmo extrato ou extratos com períodos sobrepostos geram sempre as mesmas chaves.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe de um extrato já tratado e classificado, com os tipos compactos.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as colunas "Hash" e "Ocorrencia".
+    """
+    chave = pd.util.hash_pandas_object(df[COLUNAS_CHAVE], index=False).to_numpy()
+    # O SQLite guarda somente inteiros com sinal de 64 bits
+    chave = chave.view(np.int64)
+    ocorrencia = pd.Series(chave).groupby(chave, sort=False).cumcount().to_numpy()
+
+    return pd.DataFrame({"Hash": chave, "Ocorrencia": ocorrencia}, index=df.index)
+
+
+def converter_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas lidas da base para os mesmos tipos utilizados nos dados tratados.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe lido da tabela de movimentações.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com a data convertida e os tipos compactos.
+    """
+    df["Data"] = pd.to_datetime(df["Data"], format="%Y-%m-%d")
+    df["Semana"] = df["Semana"].astype("UInt8")
+
+    return ajustar_tipos(df=df)
+
+
+@dataclass
+class BaseSQLite:
+    """
+    Classe que guarda as movimentações já tratadas em um arquivo SQLite, para que os extratos não precisem ser
+    enviados novamente a cada sessão.
+
+    Cada movimentação é identificada pelo hash do seu conteúdo e pela ocorrência (identificar_movimentacoes), e só
+    é incluída se ainda não estiver na base, então enviar novamente um extrato ou extratos com períodos sobrepostos
+    não duplica movimentações, e um extrato com um mês novo inclui somente as movimentações novas. Os extratos já
+    incluídos ficam registrados pelo hash do arquivo, para que não sejam lidos novamente.
+
+    As movimentações são separadas por conta, informada pelo usuário: todas as leituras e inclusões recebem a
+    conta, então cada conta vê somente as suas movimentações, e o mesmo extrato enviado em duas contas é incluído
+    nas duas. A conta apenas separa as carteiras e não é uma senha: quem informa a mesma conta vê as mesmas
+    movimentações.
+
+    Cada operação abre a sua própria conexão, então a mesma base pode ser utilizada por várias sessões.
+    """
+
+    arquivo: Path
+    _trava: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.arquivo = Path(self.arquivo)
+        self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+
+        with closing(self._conectar()) as conexao:
+            colunas = [
+                linha[1]
+                for linha in conexao.execute("PRAGMA table_info(movimentacoes)")
+            ]
+            if colunas and "Conta" not in colunas:
+                raise ValueError(
+                    f"A base {self.arquivo} foi criada sem a separação por conta. "
+                    "Utilize um novo arquivo em B3ANALYZER_BASE_SQLITE."
+                )
+            conexao.executescript(ESQUEMA_BASE)
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.arquivo, timeout=30)
+
+    def contar(self, conta: str) -> int:
+        """
+        Retorna a quantidade de movimentações da conta na base.
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+        """
+        with closing(self._conectar()) as conexao:
+            return conexao.execute(
+                'SELECT count(*) FROM movimentacoes WHERE "Conta" = ?', (conta,)
+            ).fetchone()[0]
+
+    def versao(self, conta: str) -> str:
+        """
+        Retorna uma chave que muda sempre que movimentações são incluídas na conta.
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+
+        Retorna:
+            str: Hash sha256 do arquivo, da conta, da quantidade de movimentações e do maior rowid da conta.
+        """
+        with closing(self._conectar()) as conexao:
+            linhas, ultima = conexao.execute(
+                "SELECT count(*), coalesce(max(rowid), 0) FROM movimentacoes "
+                'WHERE "Conta" = ?',
+                (conta,),
+            ).fetchone()
+
+        return hashlib.sha256(
+            f"{self.arquivo}|{conta}|{linhas}|{ultima}".encode()
+        ).hexdigest()
+
+    def extrato_incluido(self, conta: str, chave: str) -> bool:
+        """
+        Verifica se o extrato já foi incluído na conta.
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+            chave (str): Hash do conteúdo do arquivo, gerado por CacheExtratos.calcular_chave.
+
+        Retorna:
+            bool: True se o extrato já foi incluído.
+        """
+        with closing(self._conectar()) as conexao:
+            encontrado = conexao.execute(
+                'SELECT 1 FROM extratos WHERE "Conta" = ? AND "Chave" = ?',
+                (conta, chave),
+            ).fetchone()
+
+        return encontrado is not None
+
+    def incluir(self, conta: str, df: pd.DataFrame, chave: str | None = None) -> int:
+        """
+        Inclui na conta somente as movimentações do extrato que ainda não estão na conta.
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+            df (pd.DataFrame): Pandas dataframe de um extrato já tratado e classificado, com os tipos compactos.
+            chave (str | None): Hash do conteúdo do arquivo, para registrar o extrato como incluído.
+
+        Retorna:
+            int: Quantidade de movimentações incluídas.
+        """
+        registros = pd.concat(
+            [identificar_movimentacoes(df=df), df[COLUNAS_CONSULTA]], axis=1
+        )
+        registros.insert(0, "Conta", conta)
+        registros["Data"] = registros["Data"].dt.strftime("%Y-%m-%d")
+        registros = registros.astype(object).where(registros.notna(), None)
+
+        colunas = ", ".join(f'"{coluna}"' for coluna in registros.columns)
+        marcadores = ", ".join("?" for _ in registros.columns)
+
+        with self._trava, closing(self._conectar()) as conexao, conexao:
+            antes = conexao.total_changes
+            conexao.executemany(
+                f"INSERT OR IGNORE INTO movimentacoes ({colunas}) "
+                f"VALUES ({marcadores})",
+                registros.itertuples(index=False, name=None),
+            )
+            incluidas = conexao.total_changes - antes
+
+            if chave is not None:
+                conexao.execute(
+                    "INSERT OR REPLACE INTO extratos VALUES (?, ?, ?, ?, ?)",
+                    (
+                        conta,
+                        chave,
+                        len(df),
+                        incluidas,
+                        datetime.now().isoformat(timespec="seconds"),
+                    ),
+                )
+
+        return incluidas
+
+    def _consulta(self, conta: str, filtros: dict | None = None) -> tuple[str, list]:
+        """
+        Monta o SQL e os parâmetros da leitura das movimentações da conta, na ordem das datas e da inclusão.
+        """
+        condicoes = ['"Conta" = ?']
+        parametros = [conta]
+        for coluna, valores in (filtros or {}).items():
+            if coluna not in COLUNAS_FILTROS_BASE:
+                raise ValueError(f"Coluna não permitida no filtro: {coluna}")
+            if valores:
+                condicoes.append(f'"{coluna}" IN ({", ".join("?" for _ in valores)})')
+                parametros += [
+                    valor.item() if isinstance(valor, np.generic) else valor
+                    for valor in valores
+                ]
+        colunas = ", ".join(f'"{coluna}"' for coluna in COLUNAS_CONSULTA)
+
+        return (
+            f"SELECT {colunas} FROM movimentacoes WHERE {' AND '.join(condicoes)} "
+            'ORDER BY "Data", rowid',
+            parametros,
+        )
+
+    def ler(self, conta: str, filtros: dict | None = None) -> pd.DataFrame:
+        """
+        Lê as movimentações da conta, na ordem das datas e da inclusão, com os mesmos tipos dos dados tratados.
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+            filtros (dict | None): Valores selecionados para as colunas de COLUNAS_FILTROS_BASE (list), resolvidos
+            pelos índices da base. Colunas sem valores selecionados não são filtradas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as movimentações, igual ao de CacheExtratos.ler_extratos.
+        """
+        sql, parametros = self._consulta(conta=conta, filtros=filtros)
+        with closing(self._conectar()) as conexao:
+            df = pd.read_sql_query(sql, conexao, params=parametros)
+
+        return converter_tipos(df=df)
+
+    def ler_partes(self, conta: str, linhas: int = LINHAS_PARTE):
+        """
+        Lê as movimentações da conta em partes, na mesma ordem de ler, para que somente uma parte fique em memória
+        por vez (por exemplo ao gravar a conta em parquet com BaseParquet.gravar).
+
+        Argumentos:
+            conta (str): Conta informada pelo usuário.
+            linhas (int): Quantidade máxima de movimentações de cada parte.
+
+        Retorna:
+            Gerador com o pandas dataframe de cada parte, com os mesmos tipos de ler.
+        """
+        sql, parametros = self._consulta(conta=conta)
+        with closing(self._conectar()) as conexao:
+            for df in pd.read_sql_query(
+                sql, conexao, params=parametros, chunksize=linhas
+            ):
+                yield converter_tipos(df=df)
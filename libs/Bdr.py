@@ -1,5 +1,7 @@
 import pandas as pd
 from dataclasses import dataclass
+from libs.data_cleaning import classificar_ativos
+from libs.ConsultaParquet import ConsultaParquet
 
 # PANDAS CONFIG
 # -----------------------------
@@ -18,10 +20,17 @@ class Bdr:
 
         Argumentos:
             df (pd.DataFrame): Pandas dataframe com as movimentações dos extratos para tratamento inicial.
+            Também aceita uma ConsultaParquet, que retorna a consulta somente com as movimentações de BDR.
 
         Retorna:
             df (pd.DataFrame): Pandas dataframe com os dados tratados e somente com as movimentações de BDR.
         """
-        df = df[df["Ticker"].str.contains("35|34|33|32|31")]
+        if isinstance(df, ConsultaParquet):
+            return df.onde('"Classe" = ?', "BDR")
+
+        if "Classe" not in df.columns:
+            df = classificar_ativos(df=df)
+
+        df = df[df["Classe"] == "BDR"]
 
         return df
@@ -0,0 +1,262 @@
+import hashlib
+import functools
+import threading
+import pandas as pd
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from libs.data_cleaning import *
+from libs.Diagnostico import Diagnostico, DIAGNOSTICO_INATIVO
+
+
+# CONSTANTES
+# -----------------------------
+# Versão do tratamento dos extratos, incluída no nome dos arquivos do cache em disco. Deve ser incrementada quando
+# o tratamento ou as colunas do dataframe tratado mudarem, para que os arquivos de versões anteriores não sejam lidos
+VERSAO_TRATAMENTO: int = 2
+
+# Quantidade máxima de file_id guardados com a chave do extrato. Os mais antigos são descartados
+MAXIMO_CHAVES_ENVIADOS: int = 1_024
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def ler_bytes(extrato) -> bytes:
+    """
+    Retorna o conteúdo em bytes de um extrato.
+
+    Argumentos:
+        extrato: Extrato enviado para upload (objeto com getvalue) ou caminho do arquivo.
+
+    Retorna:
+        bytes: Conteúdo do arquivo.
+    """
+    if hasattr(extrato, "getvalue"):
+        return extrato.getvalue()
+
+    return Path(extrato).read_bytes()
+
+
+def ler_e_tratar_com_diagnostico(
+    extrato, compacto: bool = False, medir_memoria: bool = False
+) -> tuple:
+    """
+    Executa ler_e_tratar_arquivo medindo cada etapa. As medições são retornadas junto com o dataframe,
+    pois o extrato pode ser lido em outro processo. O log fica a cargo do diagnóstico que recebe as medições.
+
+    Argumentos:
+        extrato: Extrato no formato em excel (.xlsx) para leitura, enviado para upload ou caminho do arquivo.
+        compacto (bool): Se True, utiliza os tipos de dados compactos de TIPOS_COMPACTOS (dict).
+        medir_memoria (bool): Se True, também mede o pico de memória de cada etapa (Diagnostico.medir_memoria).
+
+    Retorna:
+        tuple: Pandas dataframe tratado e lista com as medições das etapas.
+    """
+    diagnostico = Diagnostico(
+        ativo=True, registrar_log=False, medir_memoria=medir_memoria
+    )
+    df = ler_e_tratar_arquivo(
+        extrato=extrato, compacto=compacto, diagnostico=diagnostico
+    )
+
+    return df, diagnostico.medicoes
+
+
+@dataclass
+class CacheExtratos:
+    """
+    Classe que guarda os extratos já lidos e tratados para evitar ler novamente o mesmo arquivo.
+
+    Cada extrato é identificado pelo hash do conteúdo do arquivo, portanto apenas extratos novos ou alterados
+    são lidos com o openpyxl. Os dataframes ficam em memória, descartando o extrato usado há mais tempo quando
+    o limite de tamanho_maximo é atingido, e opcionalmente também são salvos em disco (parquet) na pasta informada.
+    Os extratos que não estão no cache são lidos em paralelo, utilizando até a quantidade de processos informada.
+    Com compacto=True os dataframes utilizam os tipos de dados compactos de tratar_dados. Os arquivos em disco
+    incluem no nome a VERSAO_TRATAMENTO (int) e o compacto, então só são lidos pelo mesmo tratamento que os gravou.
+    """
+
+    tamanho_maximo: int = 32
+    pasta: Path | None = None
+    processos: int | None = None
+    compacto: bool = False
+    _memoria: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+    _trava: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+    _chaves_enviados: OrderedDict = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        if self.pasta is not None:
+            self.pasta = Path(self.pasta)
+            self.pasta.mkdir(parents=True, exist_ok=True)
+
+    def calcular_chave(self, extrato) -> str:
+        """
+        Calcula a chave do extrato com base no hash do conteúdo do arquivo.
+        Para arquivos enviados pelo upload, o hash é calculado apenas uma vez para cada file_id.
+
+        Argumentos:
+            extrato: Extrato enviado para upload ou caminho do arquivo.
+
+        Retorna:
+            str: Hash sha256 do conteúdo do arquivo.
+        """
+        id_arquivo = getattr(extrato, "file_id", None)
+        with self._trava:
+            if id_arquivo in self._chaves_enviados:
+                self._chaves_enviados.move_to_end(id_arquivo)
+                return self._chaves_enviados[id_arquivo]
+
+        chave = hashlib.sha256(ler_bytes(extrato)).hexdigest()
+        if id_arquivo is not None:
+            with self._trava:
+                self._chaves_enviados[id_arquivo] = chave
+                while len(self._chaves_enviados) > MAXIMO_CHAVES_ENVIADOS:
+                    self._chaves_enviados.popitem(last=False)
+
+        return chave
+
+    def chave_dataset(self, extratos) -> str:
+        """
+        Calcula a chave do conjunto de extratos, que muda quando algum extrato é incluído, removido ou alterado.
+
+        Argumentos:
+            extratos: Extratos enviados para upload ou caminhos dos arquivos.
+
+        Retorna:
+            str: Hash sha256 das chaves de todos os extratos, na ordem enviada.
+        """
+        chaves = [self.calcular_chave(extrato=extrato) for extrato in extratos]
+
+        return hashlib.sha256("".join(chaves).encode()).hexdigest()
+
+    def obter(self, chave: str) -> pd.DataFrame | None:
+        """
+        Busca o dataframe tratado do extrato, primeiro em memória e depois em disco.
+
+        Argumentos:
+            chave (str): Chave do extrato gerada em calcular_chave.
+
+        Retorna:
+            df (pd.DataFrame | None): Pandas dataframe tratado, ou None caso o extrato não esteja no cache.
+        """
+        with self._trava:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                return self._memoria[chave]
+
+        if self.pasta is not None:
+            arquivo = self._arquivo(chave=chave)
+            if arquivo.exists():
+                df = pd.read_parquet(arquivo)
+                self._guardar_em_memoria(chave=chave, df=df)
+                return df
+
+        return None
+
+    def guardar(self, chave: str, df: pd.DataFrame) -> None:
+        """
+        Guarda o dataframe tratado do extrato em memória e, se configurado, em disco.
+
+        Argumentos:
+            chave (str): Chave do extrato gerada em calcular_chave.
+            df (pd.DataFrame): Pandas dataframe já tratado.
+        """
+        self._guardar_em_memoria(chave=chave, df=df)
+
+        if self.pasta is not None:
+            df.to_parquet(self._arquivo(chave=chave))
+
+    def _arquivo(self, chave: str) -> Path:
+        """
+        Retorna o caminho do arquivo parquet do extrato no cache em disco, com a versão do tratamento e o compacto.
+        """
+        sufixo = "-compacto" if self.compacto else ""
+
+        return self.pasta / f"{chave}-v{VERSAO_TRATAMENTO}{sufixo}.parquet"
+
+    def _guardar_em_memoria(self, chave: str, df: pd.DataFrame) -> None:
+        with self._trava:
+            self._memoria[chave] = df
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.tamanho_maximo:
+                self._memoria.popitem(last=False)
+
+    def ler_extratos(
+        self, extratos, diagnostico: Diagnostico | None = None
+    ) -> pd.DataFrame:
+        """
+        Lê e trata os extratos enviados, utilizando o cache para os extratos já processados.
+
+        O resultado é o mesmo de tratar_dados(ler_arquivos(extratos), compacto), mas somente os extratos que não estão
+        no cache são lidos e tratados.
+
+        Argumentos:
+            extratos: Extratos enviados para upload no formato em excel (.xlsx) para leitura.
+            diagnostico (Diagnostico | None): Diagnóstico que mede as etapas da leitura, inclusive as feitas
+            nos outros processos.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com todos os extratos já tratados para análise.
+        """
+        diagnostico = diagnostico or DIAGNOSTICO_INATIVO
+
+        with diagnostico.medir(etapa="buscar_cache"):
+            chaves = [self.calcular_chave(extrato=extrato) for extrato in extratos]
+            encontrados = {chave: self.obter(chave=chave) for chave in chaves}
+
+        # Lê e trata em paralelo somente os extratos que não estão no cache
+        faltantes = {
+            chave: extrato
+            for chave, extrato in zip(chaves, extratos)
+            if encontrados[chave] is None
+        }
+        if faltantes:
+            with diagnostico.medir(etapa="ler_e_tratar_extratos") as etapa:
+                lidos = processar_em_paralelo(
+                    funcao=(
+                        functools.partial(
+                            ler_e_tratar_com_diagnostico,
+                            compacto=self.compacto,
+                            medir_memoria=diagnostico.medir_memoria,
+                        )
+                        if diagnostico.ativo
+                        else functools.partial(
+                            ler_e_tratar_arquivo, compacto=self.compacto
+                        )
+                    ),
+                    extratos=faltantes.values(),
+                    processos=self.processos,
+                )
+                if diagnostico.ativo:
+                    for _, medicoes in lidos:
+                        diagnostico.incluir(medicoes=medicoes)
+                    lidos = [df for df, _ in lidos]
+
+                for chave, df in zip(faltantes, etapa.registrar(lidos)):
+                    self.guardar(chave=chave, df=df)
+                    encontrados[chave] = df
+
+        with diagnostico.medir(etapa="juntar_extratos") as etapa:
+            dfs = []
+            deslocamento = 0
+
+            for chave in chaves:
+                df = encontrados[chave]
+
+                # Mantém o índice igual ao gerado pela leitura de todos os extratos de uma vez
+                dfs.append(df.set_axis(df.index + deslocamento))
+                deslocamento += len(df)
+
+            df = pd.concat(dfs)
+            df = df.sort_values("Data", ascending=True, kind="stable")
+
+            # Extratos com categorias diferentes perdem o tipo category ao serem concatenados
+            if self.compacto and len(dfs) > 1:
+                df = compactar_dados(df=df)
+
+            etapa.registrar(df)
+
+        return df
@@ -0,0 +1,554 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from libs.data_cleaning import MESES, CLASSES_ATIVOS, compactar_dados
+
+
+# CONSTANTES
+# -----------------------------
+# Módulo do motor de consultas SQL utilizado pela base em parquet
+MODULO_DUCKDB: str = "duckdb"
+
+# Coluna com a ordem original das movimentações (ordem dos extratos enviados e das linhas de cada extrato)
+COLUNA_ORDEM: str = "Linha"
+
+# Multiplicador da data na chave da ordem das movimentações (chave_ordem). A COLUNA_ORDEM ocupa os bits abaixo dele
+DESLOCAMENTO_ORDEM: int = 2**40
+
+# Chave da ordem das movimentações calculada no duckdb, igual a chave_ordem
+CHAVE_ORDEM_SQL: str = (
+    f"datediff('day', TIMESTAMP '1970-01-01', \"Data\") * {DESLOCAMENTO_ORDEM} + "
+    f"{COLUNA_ORDEM}"
+)
+
+# Sufixo das pastas temporárias em que as bases são gravadas, antes de substituírem a pasta da base
+SUFIXO_GRAVACAO: str = ".gravando-"
+
+# Colunas que podem ser agrupadas e somadas nas consultas
+COLUNAS_CONSULTA: list = [
+    "Entrada/Saída",
+    "Ano",
+    "Mes",
+    "Semana",
+    "Data",
+    "Ticker",
+    "Descrição Ticker",
+    "Classe",
+    "Movimentação",
+    "Instituição",
+    "Quantidade",
+    "Preço unitário",
+    "Valor da Operação",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def duckdb_disponivel() -> bool:
+    """
+    Verifica se o duckdb está instalado, necessário para utilizar a base em parquet.
+
+    Retorna:
+        bool: True se o duckdb estiver instalado.
+    """
+    return importlib.util.find_spec(MODULO_DUCKDB) is not None
+
+
+def coluna_sql(coluna: str) -> str:
+    """
+    Retorna o nome da coluna entre aspas duplas, para ser utilizado no SQL.
+
+    Argumentos:
+        coluna (str): Nome da coluna, de COLUNAS_CONSULTA (list).
+
+    Retorna:
+        str: Nome da coluna entre aspas duplas.
+    """
+    if coluna not in COLUNAS_CONSULTA:
+        raise ValueError(f"Coluna não permitida na consulta: {coluna}")
+
+    return f'"{coluna}"'
+
+
+def chave_ordem(datas: pd.Series, linhas: np.ndarray) -> np.ndarray:
+    """
+    Calcula uma chave inteira que segue a ordem das movimentações da base: pela data e, na mesma data, pela
+    COLUNA_ORDEM (str). Mesmo cálculo de CHAVE_ORDEM_SQL (str).
+
+    Argumentos:
+        datas (pd.Series): Data de cada movimentação.
+        linhas (np.ndarray): COLUNA_ORDEM (str) de cada movimentação.
+
+    Retorna:
+        np.ndarray: Chave de cada movimentação.
+    """
+    dias = datas.to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+    return dias * DESLOCAMENTO_ORDEM + np.asarray(linhas, dtype=np.int64)
+
+
+def materializar(df) -> pd.DataFrame:
+    """
+    Retorna o dataframe com os dados da consulta, ou o próprio dataframe quando já é um pandas dataframe.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Dados já tratados.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com todas as linhas.
+    """
+    if isinstance(df, ConsultaParquet):
+        return df.dataframe()
+
+    return df
+
+
+def ajustar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas lidas pelo duckdb para os mesmos tipos utilizados pelo pandas nos dados tratados.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe retornado pelo duckdb.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com os tipos compactos e o mês como categoria ordenada.
+    """
+    if "Mes" in df.columns:
+        df["Mes"] = pd.Categorical(df["Mes"], categories=MESES, ordered=True)
+    if "Classe" in df.columns:
+        df["Classe"] = pd.Categorical(df["Classe"], categories=CLASSES_ATIVOS)
+
+    return compactar_dados(df=df)
+
+
+def limpar_bases(pasta: Path, atual: Path, manter: int) -> None:
+    """
+    Mantém na pasta somente as bases em parquet utilizadas mais recentemente e apaga as demais.
+
+    A base atual é marcada como utilizada agora (pela data de modificação da pasta), então fica entre as mantidas.
+    As pastas temporárias das gravações em andamento não são apagadas.
+
+    Argumentos:
+        pasta (Path): Pasta com as bases em parquet, uma subpasta por base.
+        atual (Path): Pasta da base utilizada pela sessão.
+        manter (int): Quantidade de bases mantidas, incluindo a atual.
+    """
+
+    def utilizada_em(base: Path) -> float:
+        try:
+            return base.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    if Path(atual).exists():
+        os.utime(atual)
+
+    bases = [
+        base
+        for base in Path(pasta).iterdir()
+        if base.is_dir() and SUFIXO_GRAVACAO not in base.name
+    ]
+    for base in sorted(bases, key=utilizada_em, reverse=True)[manter:]:
+        if base != Path(atual):
+            shutil.rmtree(base, ignore_errors=True)
+
+
+@dataclass
+class BaseParquet:
+    """
+    Classe que guarda os extratos já tratados em parquet, particionados por ano, para consultas com o duckdb.
+
+    Os extratos são gravados um de cada vez, então nunca é preciso ter todo o histórico em memória.
+    As consultas leem somente as partições e colunas necessárias (o filtro de ano é aplicado pelas pastas das
+    partições e os demais filtros são enviados para a leitura do parquet), e somente as linhas mostradas são
+    convertidas em dataframe.
+
+    Com os fatores dos eventos corporativos (EventosCorporativos.ajustar), todas as consultas leem as quantidades
+    e os preços unitários já ajustados, sem alterar os arquivos gravados: cada movimentação é ligada ao próximo
+    evento do seu ticker por um ASOF JOIN na chave da ordem (CHAVE_ORDEM_SQL), antes das condições e das expressões
+    de cada consulta.
+    """
+
+    pasta: Path
+    fatores: pd.DataFrame | None = None
+    _conexao: object = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        import duckdb
+
+        self.pasta = Path(self.pasta)
+        self._conexao = duckdb.connect()
+
+        # A tabela fica no banco em memória da conexão, visível pelos cursores de cada consulta
+        if self.fatores is not None:
+            self._conexao.register("fatores_ajuste", self.fatores)
+            self._conexao.execute(
+                "CREATE TABLE fatores AS SELECT * FROM fatores_ajuste"
+            )
+            self._conexao.unregister("fatores_ajuste")
+
+    @property
+    def gravada(self) -> bool:
+        """
+        Indica se a base já possui extratos gravados.
+        """
+        return self.pasta.exists() and any(self.pasta.rglob("*.parquet"))
+
+    def gravar(self, dfs) -> None:
+        """
+        Grava os extratos tratados na pasta, substituindo os dados existentes.
+        Os arquivos são gravados em uma pasta temporária, que só substitui a pasta da base ao final da gravação.
+
+        Argumentos:
+            dfs: Iterável com o pandas dataframe tratado e classificado de cada extrato, na ordem dos extratos.
+            Pode ser um gerador, para que somente um extrato fique em memória por vez.
+        """
+        # Cada gravação utiliza uma pasta temporária própria, então sessões que gravam a mesma base ao mesmo
+        # tempo não escrevem nos mesmos arquivos
+        self.pasta.parent.mkdir(parents=True, exist_ok=True)
+        pasta_temporaria = Path(
+            tempfile.mkdtemp(
+                prefix=f"{self.pasta.name}{SUFIXO_GRAVACAO}", dir=self.pasta.parent
+            )
+        )
+
+        try:
+            deslocamento = 0
+            for parte, df in enumerate(dfs):
+                df = df.reset_index(drop=True)
+                df[COLUNA_ORDEM] = df.index + deslocamento
+                deslocamento += len(df)
+
+                df.to_parquet(
+                    pasta_temporaria,
+                    partition_cols=["Ano"],
+                    basename_template=f"extrato{parte:05d}-{{i}}.parquet",
+                    index=False,
+                )
+        except BaseException:
+            shutil.rmtree(pasta_temporaria, ignore_errors=True)
+            raise
+
+        if self.pasta.exists():
+            shutil.rmtree(self.pasta, ignore_errors=True)
+        try:
+            os.replace(pasta_temporaria, self.pasta)
+        except OSError:
+            # Outra sessão terminou de gravar a mesma base antes, e a base dela é mantida
+            shutil.rmtree(pasta_temporaria, ignore_errors=True)
+
+    def executar(self, sql: str, parametros: list | None = None) -> pd.DataFrame:
+        """
+        Executa o SQL e retorna o resultado em um dataframe.
+        Cada consulta utiliza um cursor próprio, pois a mesma base pode ser consultada por sessões diferentes.
+
+        Argumentos:
+            sql (str): Consulta SQL. A tabela com os extratos é informada como {fonte}.
+            parametros (list | None): Valores dos parâmetros "?" da consulta.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com o resultado.
+        """
+        # O caminho entra no SQL como texto, então as aspas simples da pasta são duplicadas
+        arquivos = (self.pasta / "**" / "*.parquet").as_posix().replace("'", "''")
+        fonte = f"read_parquet('{arquivos}', hive_partitioning = true)"
+        if self.fatores is not None:
+            # Na linha do próprio evento vale o fator dos eventos seguintes, e o desdobro deixa de somar ações
+            evento = 'f."Chave" = m."Chave Ordem"'
+            fator = (
+                f'CASE WHEN {evento} THEN f."Fator Posterior" '
+                'ELSE coalesce(f."Fator Anterior", 1.0) END'
+            )
+            fonte = (
+                '(SELECT m.* EXCLUDE ("Chave Ordem") REPLACE ('
+                f'CASE WHEN {evento} AND f."Desdobro" THEN 0.0 '
+                f'ELSE CAST(m."Quantidade" AS DOUBLE) * ({fator}) END AS "Quantidade", '
+                f'CAST(m."Preço unitário" AS DOUBLE) / ({fator}) AS "Preço unitário") '
+                f'FROM (SELECT *, {CHAVE_ORDEM_SQL} AS "Chave Ordem" FROM {fonte}) m '
+                'ASOF LEFT JOIN fatores f ON m."Ticker" = f."Ticker" AND f."Chave" >= '
+                'm."Chave Ordem")'
+            )
+
+        return (
+            self._conexao.cursor()
+            .execute(sql.format(fonte=fonte), parametros or [])
+            .df()
+        )
+
+    def consulta(self) -> "ConsultaParquet":
+        """
+        Retorna a consulta de todas as movimentações da base.
+        """
+        return ConsultaParquet(base=self)
+
+    def opcoes(self, coluna: str) -> list:
+        """
+        Retorna os valores distintos da coluna em ordem crescente, para as opções dos filtros.
+
+        Argumentos:
+            coluna (str): Coluna de COLUNAS_CONSULTA (list).
+
+        Retorna:
+            list: Valores distintos da coluna em ordem crescente (os meses na ordem do calendário).
+        """
+        coluna = coluna_sql(coluna)
+        ordem = f"list_position(?, {coluna})" if coluna == '"Mes"' else coluna
+        parametros = [MESES] if coluna == '"Mes"' else []
+
+        df = self.executar(
+            f"SELECT DISTINCT {coluna} AS valor, {ordem} AS ordem "
+            f"FROM {{fonte}} WHERE {coluna} IS NOT NULL ORDER BY ordem",
+            parametros,
+        )
+
+        return df["valor"].tolist()
+
+
+@dataclass(frozen=True)
+class ConsultaParquet:
+    """
+    Classe que monta a consulta SQL das movimentações da base em parquet, sem ler os dados.
+
+    Cada filtro retorna uma nova consulta com as condições acumuladas. As expressões substituem o valor de colunas
+    (por exemplo o sinal do valor da operação), da mesma forma que as classes de ativos alteram o dataframe.
+    Os dados só são lidos ao contar as linhas, agrupar ou pedir uma página de linhas.
+    """
+
+    base: BaseParquet
+    condicoes: tuple = ()
+    parametros: tuple = ()
+    expressoes: tuple = ()
+    ordem: tuple = ()
+
+    def onde(self, condicao: str, *parametros) -> "ConsultaParquet":
+        """
+        Retorna uma nova consulta com mais uma condição. A condição é aplicada nas colunas originais da base.
+
+        Argumentos:
+            condicao (str): Condição em SQL, com "?" no lugar dos valores.
+            *parametros: Valores dos "?" da condição.
+
+        Retorna:
+            ConsultaParquet: Nova consulta com a condição.
+        """
+        return replace(
+            self,
+            condicoes=self.condicoes + (f"({condicao})",),
+            parametros=self.parametros + parametros,
+        )
+
+    def com_expressao(self, coluna: str, expressao: str) -> "ConsultaParquet":
+        """
+        Retorna uma nova consulta em que a coluna é calculada pela expressão SQL.
+
+        Argumentos:
+            coluna (str): Coluna de COLUNAS_CONSULTA (list) que recebe o valor da expressão.
+            expressao (str): Expressão SQL calculada sobre as colunas originais da base, sem parâmetros.
+
+        Retorna:
+            ConsultaParquet: Nova consulta com a expressão.
+        """
+        return replace(
+            self, expressoes=self.expressoes + ((coluna_sql(coluna), expressao),)
+        )
+
+    def filtrar(self, filtros: dict) -> "ConsultaParquet":
+        """
+        Retorna uma nova consulta somente com as linhas que possuem algum dos valores selecionados em cada coluna.
+        Mesmo comportamento de IndiceFiltros.filtrar.
+
+        Argumentos:
+            filtros (dict): Valores selecionados para cada coluna. Colunas sem valores selecionados não são filtradas.
+
+        Retorna:
+            ConsultaParquet: Nova consulta com os filtros.
+        """
+        consulta = self
+        for coluna, valores in filtros.items():
+            if valores:
+                marcadores = ", ".join("?" for _ in valores)
+                consulta = consulta.onde(
+                    f"{coluna_sql(coluna)} IN ({marcadores})", *valores
+                )
+
+        return consulta
+
+    def entradas(self) -> "ConsultaParquet":
+        """
+        Mesmas movimentações de separar_entradas, aplicado na consulta.
+        """
+        return self.onde(
+            '"Entrada/Saída" = ? AND "Movimentação" <> ?', "Credito", "Amortização"
+        )
+
+    def saidas(self) -> "ConsultaParquet":
+        """
+        Mesmas movimentações de separar_saidas, aplicado na consulta.
+        """
+        return self.onde(
+            '"Entrada/Saída" = ? OR "Movimentação" IN (?, ?)',
+            "Debito",
+            "Amortização",
+            "Resgate",
+        )
+
+    def pesquisar(self, texto: str, colunas: list) -> "ConsultaParquet":
+        """
+        Retorna uma nova consulta somente com as linhas em que alguma das colunas contém o texto,
+        sem diferenciar maiúsculas e minúsculas.
+
+        Argumentos:
+            texto (str): Texto pesquisado.
+            colunas (list): Colunas de texto de COLUNAS_CONSULTA (list) pesquisadas.
+
+        Retorna:
+            ConsultaParquet: Nova consulta com a pesquisa.
+        """
+        # As colunas são unidas por um separador que não é digitado, para o texto não ser encontrado entre duas colunas
+        valores = ", ".join(f"CAST({coluna_sql(c)} AS VARCHAR)" for c in colunas)
+
+        return self.onde(
+            f"contains(lower(concat_ws(chr(31), {valores})), ?)", texto.lower()
+        )
+
+    def ordenar(self, coluna: str, crescente: bool = True) -> "ConsultaParquet":
+        """
+        Retorna uma nova consulta ordenada pela coluna. As linhas com o mesmo valor mantêm a ordem das datas e dos
+        extratos enviados, e os valores vazios ficam no final.
+
+        Argumentos:
+            coluna (str): Coluna de COLUNAS_CONSULTA (list).
+            crescente (bool): Se True, ordem crescente.
+
+        Retorna:
+            ConsultaParquet: Nova consulta com a ordenação.
+        """
+        return replace(self, ordem=((coluna_sql(coluna), crescente),))
+
+    def _sql(self) -> str:
+        """
+        Monta o SQL das movimentações da consulta, com as condições e as expressões.
+        """
+        substituicoes = ""
+        if self.expressoes:
+            substituicoes = " REPLACE ({})".format(
+                ", ".join(
+                    f"{expressao} AS {coluna}" for coluna, expressao in self.expressoes
+                )
+            )
+        onde = f" WHERE {' AND '.join(self.condicoes)}" if self.condicoes else ""
+
+        return f"SELECT *{substituicoes} FROM {{fonte}}{onde}"
+
+    def __len__(self) -> int:
+        df = self.base.executar(
+            f"SELECT count(*) AS linhas FROM ({self._sql()})", list(self.parametros)
+        )
+
+        return int(df["linhas"].iloc[0])
+
+    def pagina(
+        self,
+        inicio: int,
+        tamanho: int,
+        com_ordem: bool = False,
+        colunas: list | None = None,
+    ) -> pd.DataFrame:
+        """
+        Retorna somente as linhas da página, na ordem da consulta, ou na ordem das datas e dos extratos enviados.
+
+        Argumentos:
+            inicio (int): Posição da primeira linha da página.
+            tamanho (int): Quantidade máxima de linhas da página.
+            com_ordem (bool): Se True, inclui a coluna COLUNA_ORDEM (str), que identifica cada linha da base.
+            colunas (list | None): Colunas de COLUNAS_CONSULTA (list) lidas. Se None, lê todas as colunas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as linhas da página.
+        """
+        ordem = []
+        parametros_ordem = []
+        for coluna, crescente in self.ordem:
+            direcao = "ASC" if crescente else "DESC"
+            # O mês é ordenado pela ordem dos meses, e não em ordem alfabética
+            if coluna == coluna_sql("Mes"):
+                coluna = f"list_position(?, {coluna})"
+                parametros_ordem.append(MESES)
+            ordem.append(f"{coluna} {direcao} NULLS LAST")
+        ordem += ['"Data"', COLUNA_ORDEM]
+
+        # Somente as colunas pedidas são lidas dos arquivos parquet e convertidas em dataframe
+        colunas = COLUNAS_CONSULTA if colunas is None else colunas
+        colunas = colunas + [COLUNA_ORDEM] if com_ordem else colunas
+        selecao = ", ".join(
+            COLUNA_ORDEM if coluna == COLUNA_ORDEM else coluna_sql(coluna)
+            for coluna in colunas
+        )
+
+        df = self.base.executar(
+            f"SELECT {selecao} FROM ({self._sql()}) "
+            f"ORDER BY {', '.join(ordem)} LIMIT ? OFFSET ?",
+            list(self.parametros) + parametros_ordem + [int(tamanho), int(inicio)],
+        )
+
+        return ajustar_tipos(df=df)[[c for c in colunas if c in df.columns]]
+
+    def ultima_linha(self) -> pd.DataFrame:
+        """
+        Retorna somente a última linha da consulta, na ordem das datas e dos extratos enviados, sem ordenar as
+        demais linhas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com a última linha, ou vazio se a consulta não possui linhas.
+        """
+        df = self.base.executar(
+            f"SELECT * FROM ({self._sql()}) "
+            f'ORDER BY "Data" DESC, {COLUNA_ORDEM} DESC LIMIT 1',
+            list(self.parametros),
+        )
+
+        return ajustar_tipos(df=df)[[c for c in COLUNAS_CONSULTA if c in df.columns]]
+
+    def dataframe(
+        self, com_ordem: bool = False, colunas: list | None = None
+    ) -> pd.DataFrame:
+        """
+        Retorna todas as linhas da consulta em um dataframe, utilizado nas exportações e nos cálculos que
+        precisam de todas as movimentações.
+
+        Argumentos:
+            com_ordem (bool): Se True, inclui a coluna COLUNA_ORDEM (str), que identifica cada linha da base.
+            colunas (list | None): Colunas de COLUNAS_CONSULTA (list) lidas. Se None, lê todas as colunas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as linhas da consulta.
+        """
+        return self.pagina(
+            inicio=0, tamanho=2**62, com_ordem=com_ordem, colunas=colunas
+        )
+
+    def agrupar(self, colunas: list, coluna: str = "Valor da Operação") -> pd.Series:
+        """
+        Soma a coluna agrupada pelas colunas informadas, calculado pelo duckdb.
+
+        Argumentos:
+            colunas (list): Colunas de COLUNAS_CONSULTA (list) para o agrupamento.
+            coluna (str): Coluna somada.
+
+        Retorna:
+            pd.Series: Soma da coluna com um índice por coluna de agrupamento, como no groupby do pandas.
+        """
+        grupos = ", ".join(coluna_sql(c) for c in colunas)
+        df = self.base.executar(
+            f"SELECT {grupos}, sum({coluna_sql(coluna)}) AS {coluna_sql(coluna)} "
+            f"FROM ({self._sql()}) GROUP BY {grupos}",
+            list(self.parametros),
+        )
+        df = ajustar_tipos(df=df)
+
+        return df.set_index(colunas)[coluna].sort_index()
@@ -0,0 +1,396 @@
+import json
+import threading
+import zipfile
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from pathlib import Path
+from libs.data_cleaning import compactar_dados
+
+
+# CONSTANTES
+# -----------------------------
+# Tamanho de cada registro do COTAHIST, sem a quebra de linha
+TAMANHO_REGISTRO_COTAHIST: int = 245
+
+# Campos do registro de cotação do COTAHIST utilizados: posição inicial (a partir de zero) e tamanho, conforme o
+# layout publicado pela B3. Os preços têm duas casas decimais implícitas
+CAMPOS_COTAHIST: dict = {
+    "TIPREG": (0, 2),
+    "DATPRE": (2, 8),
+    "CODNEG": (12, 12),
+    "TPMERC": (24, 3),
+    "PREABE": (56, 13),
+    "PREMAX": (69, 13),
+    "PREMIN": (82, 13),
+    "PREMED": (95, 13),
+    "PREULT": (108, 13),
+    "TOTNEG": (147, 5),
+    "QUATOT": (152, 18),
+    "VOLTOT": (170, 18),
+    "FATCOT": (210, 7),
+}
+
+# Colunas de preço do COTAHIST e a coluna correspondente nas cotações
+CAMPOS_PRECO: dict = {
+    "PREABE": "Abertura",
+    "PREMAX": "Máxima",
+    "PREMIN": "Mínima",
+    "PREMED": "Média",
+    "PREULT": "Fechamento",
+}
+
+# Registros de cotação (os demais são o cabeçalho e o rodapé) do mercado à vista
+TIPO_REGISTRO_COTACAO: bytes = b"01"
+MERCADO_A_VISTA: bytes = b"010"
+
+# Colunas das cotações
+COLUNAS_COTACOES: list = [
+    "Data",
+    "Ticker",
+    "Abertura",
+    "Máxima",
+    "Mínima",
+    "Média",
+    "Fechamento",
+    "Negócios",
+    "Quantidade Negociada",
+    "Volume",
+]
+
+# Extensões dos arquivos COTAHIST publicados pela B3
+EXTENSOES_COTAHIST: list = [".txt", ".zip"]
+
+# Arquivo com os arquivos COTAHIST importados na base de cotações e os tickers de cada um
+ARQUIVO_INDICE_COTACOES: str = "indice.json"
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def tipo_registro(tamanho_linha: int) -> np.dtype:
+    """
+    Monta o tipo estruturado do numpy que lê cada linha do COTAHIST como um registro, com um campo de bytes
+    para cada campo de CAMPOS_COTAHIST (dict).
+
+    O código de negociação também é lido como dois inteiros (os 8 primeiros e os 4 últimos bytes), que são
+    comparados com os tickers procurados muito mais rápido que os textos.
+
+    Argumentos:
+        tamanho_linha (int): Tamanho de cada linha do arquivo, com a quebra de linha.
+
+    Retorna:
+        np.dtype: Tipo estruturado com os campos nas posições do layout.
+    """
+    inicio_codigo = CAMPOS_COTAHIST["CODNEG"][0]
+    nomes = list(CAMPOS_COTAHIST) + ["CODNEG_INICIO", "CODNEG_FIM"]
+    formatos = [f"S{tamanho}" for _, tamanho in CAMPOS_COTAHIST.values()] + [
+        "<u8",
+        "<u4",
+    ]
+    posicoes = [inicio for inicio, _ in CAMPOS_COTAHIST.values()] + [
+        inicio_codigo,
+        inicio_codigo + 8,
+    ]
+
+    return np.dtype(
+        {
+            "names": nomes,
+            "formats": formatos,
+            "offsets": posicoes,
+            "itemsize": tamanho_linha,
+        }
+    )
+
+
+def codigos_tickers(tickers) -> np.ndarray:
+    """
+    Converte os tickers para o mesmo formato do código de negociação do COTAHIST (12 bytes, completado com
+    espaços), lido pelos campos CODNEG, CODNEG_INICIO e CODNEG_FIM de tipo_registro.
+
+    Argumentos:
+        tickers: Lista de tickers.
+
+    Retorna:
+        np.ndarray: Registros com os campos do código de negociação de cada ticker.
+    """
+    tamanho = CAMPOS_COTAHIST["CODNEG"][1]
+    codigos = b"".join(
+        str(ticker).strip().upper().encode("ascii", "ignore")[:tamanho].ljust(tamanho)
+        for ticker in tickers
+    )
+    tipo = np.dtype(
+        {
+            "names": ["CODNEG", "CODNEG_INICIO", "CODNEG_FIM"],
+            "formats": [f"S{tamanho}", "<u8", "<u4"],
+            "offsets": [0, 0, 8],
+            "itemsize": tamanho,
+        }
+    )
+
+    return np.frombuffer(codigos, dtype=tipo)
+
+
+def decodificar_numeros(campo: np.ndarray) -> np.ndarray:
+    """
+    Converte um campo numérico de largura fixa (dígitos ASCII completados com zeros) em inteiros, somando os
+    dígitos multiplicados pelas potências de 10 de todas as linhas de uma vez.
+
+    Argumentos:
+        campo (np.ndarray): Array de bytes de tamanho fixo (dtype "S").
+
+    Retorna:
+        np.ndarray: Array de int64 com o número de cada linha.
+    """
+    tamanho = campo.dtype.itemsize
+    digitos = np.ascontiguousarray(campo).view(np.uint8).reshape(len(campo), tamanho)
+    pesos = 10 ** np.arange(tamanho - 1, -1, -1, dtype=np.int64)
+
+    return (digitos.astype(np.int64) - ord("0")) @ pesos
+
+
+def decodificar_datas(campo: np.ndarray) -> np.ndarray:
+    """
+    Converte um campo de data AAAAMMDD do COTAHIST em datetime64, sem converter cada linha em texto.
+
+    Argumentos:
+        campo (np.ndarray): Array de bytes de tamanho 8 (dtype "S8").
+
+    Retorna:
+        np.ndarray: Array de datetime64[ns].
+    """
+    numeros = decodificar_numeros(campo)
+    meses = (numeros // 10000 - 1970) * 12 + numeros // 100 % 100 - 1
+    dias = meses.astype("datetime64[M]").astype("datetime64[D]") + (numeros % 100 - 1)
+
+    return dias.astype("datetime64[ns]")
+
+
+def abrir_cotahist(arquivo) -> np.ndarray:
+    """
+    Abre o arquivo COTAHIST como um array de bytes. O arquivo de texto é mapeado em memória (np.memmap), então
+    somente as partes lidas são carregadas. O arquivo zip publicado pela B3 é descompactado em memória.
+
+    Argumentos:
+        arquivo: Caminho do arquivo COTAHIST (.TXT ou .ZIP).
+
+    Retorna:
+        np.ndarray: Array de uint8 com o conteúdo do arquivo.
+    """
+    arquivo = Path(arquivo)
+    if zipfile.is_zipfile(arquivo):
+        with zipfile.ZipFile(arquivo) as compactado:
+            return np.frombuffer(
+                compactado.read(compactado.namelist()[0]), dtype=np.uint8
+            )
+
+    return np.memmap(arquivo, dtype=np.uint8, mode="r")
+
+
+def listar_cotahist(pasta) -> list:
+    """
+    Lista os arquivos COTAHIST de uma pasta, pelo nome (COTAHIST_A2023.TXT, COTAHIST_M012024.ZIP, ...).
+
+    Argumentos:
+        pasta: Pasta com os arquivos baixados da B3.
+
+    Retorna:
+        list: Caminhos dos arquivos, em ordem de nome. Lista vazia se a pasta não existe.
+    """
+    pasta = Path(pasta)
+    if not pasta.is_dir():
+        return []
+
+    return sorted(
+        arquivo
+        for arquivo in pasta.iterdir()
+        if arquivo.name.upper().startswith("COTAHIST")
+        and arquivo.suffix.lower() in EXTENSOES_COTAHIST
+    )
+
+
+# Ler um arquivo COTAHIST da B3
+def ler_cotahist(arquivo, tickers=None) -> pd.DataFrame:
+    """
+    Lê as cotações diárias do mercado à vista de um arquivo COTAHIST da B3.
+
+    O arquivo é lido como um array de registros de tamanho fixo (tipo_registro), sem percorrer as linhas em
+    Python: os registros são filtrados pelos campos de bytes, e somente os registros filtrados têm os números e
+    as datas convertidos (decodificar_numeros e decodificar_datas).
+
+    Argumentos:
+        arquivo: Caminho do arquivo COTAHIST (.TXT ou .ZIP).
+        tickers: Lista dos tickers que devem ser lidos. Se None, lê todos os tickers.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_COTACOES (list), com os preços por unidade
+        (divididos pelo fator de cotação), ordenado por data e ticker.
+    """
+    conteudo = abrir_cotahist(arquivo)
+    quebras = np.flatnonzero(
+        conteudo[: 2 * (TAMANHO_REGISTRO_COTAHIST + 2)] == ord("\n")
+    )
+    tamanho_linha = int(quebras[0]) + 1 if len(quebras) else TAMANHO_REGISTRO_COTAHIST
+    registros = np.frombuffer(
+        conteudo,
+        dtype=tipo_registro(tamanho_linha),
+        count=len(conteudo) // tamanho_linha,
+    )
+
+    # Primeiro os códigos como inteiros, depois a confirmação nos poucos registros encontrados
+    if tickers is not None:
+        codigos = codigos_tickers(tickers)
+        registros = registros[
+            np.isin(registros["CODNEG_INICIO"], codigos["CODNEG_INICIO"])
+            & np.isin(registros["CODNEG_FIM"], codigos["CODNEG_FIM"])
+        ]
+        registros = registros[np.isin(registros["CODNEG"], codigos["CODNEG"])]
+    registros = registros[
+        (registros["TIPREG"] == TIPO_REGISTRO_COTACAO)
+        & (registros["TPMERC"] == MERCADO_A_VISTA)
+    ]
+
+    fator = decodificar_numeros(registros["FATCOT"]).clip(min=1) * 100
+    df = pd.DataFrame(
+        {
+            "Data": decodificar_datas(registros["DATPRE"]),
+            "Ticker": np.char.strip(registros["CODNEG"]).astype(str),
+            **{
+                coluna: decodificar_numeros(registros[campo]) / fator
+                for campo, coluna in CAMPOS_PRECO.items()
+            },
+            "Negócios": decodificar_numeros(registros["TOTNEG"]),
+            "Quantidade Negociada": decodificar_numeros(registros["QUATOT"]),
+            "Volume": decodificar_numeros(registros["VOLTOT"]) / 100,
+        }
+    )
+
+    return compactar_dados(
+        df=df.sort_values(["Data", "Ticker"], kind="stable").reset_index(drop=True)
+    )
+
+
+@dataclass
+class BaseCotacoes:
+    """
+    Classe que guarda as cotações lidas dos arquivos COTAHIST em parquet, um arquivo parquet para cada arquivo
+    COTAHIST, somente com os tickers das movimentações.
+
+    O índice da base guarda o tamanho, a data de modificação e os tickers de cada arquivo importado, então um
+    arquivo COTAHIST só é lido novamente quando muda ou quando as movimentações têm tickers novos.
+    """
+
+    pasta: Path
+    _trava: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.pasta = Path(self.pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+
+    def _ler_indice(self) -> dict:
+        arquivo = self.pasta / ARQUIVO_INDICE_COTACOES
+        if not arquivo.exists():
+            return {}
+
+        return json.loads(arquivo.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def _assinatura(arquivo: Path) -> dict:
+        estado = arquivo.stat()
+
+        return {"tamanho": estado.st_size, "modificacao": estado.st_mtime_ns}
+
+    def pendentes(self, arquivos: list, tickers: list) -> list:
+        """
+        Retorna os arquivos COTAHIST que ainda não foram importados, que mudaram ou que não têm todos os tickers.
+
+        Argumentos:
+            arquivos (list): Caminhos dos arquivos COTAHIST.
+            tickers (list): Tickers das movimentações.
+
+        Retorna:
+            list: Caminhos dos arquivos que precisam ser importados.
+        """
+        indice = self._ler_indice()
+        pendentes = []
+        for arquivo in map(Path, arquivos):
+            importado = indice.get(arquivo.name)
+            if (
+                importado is None
+                or importado["assinatura"] != self._assinatura(arquivo)
+                or not set(tickers) <= set(importado["tickers"])
+            ):
+                pendentes.append(arquivo)
+
+        return pendentes
+
+    def importar(self, arquivo, tickers: list) -> int:
+        """
+        Lê as cotações dos tickers de um arquivo COTAHIST e grava na base, substituindo as cotações já
+        importadas do mesmo arquivo. Os tickers já importados do arquivo continuam na base.
+
+        Argumentos:
+            arquivo: Caminho do arquivo COTAHIST (.TXT ou .ZIP).
+            tickers (list): Tickers das movimentações.
+
+        Retorna:
+            int: Quantidade de cotações gravadas.
+        """
+        arquivo = Path(arquivo)
+        with self._trava:
+            indice = self._ler_indice()
+            anteriores = indice.get(arquivo.name, {}).get("tickers", [])
+            tickers = sorted(set(tickers) | set(anteriores))
+
+            df = ler_cotahist(arquivo=arquivo, tickers=tickers)
+            destino = self.pasta / f"{arquivo.stem}.parquet"
+            temporario = destino.with_suffix(".gravando")
+            df.to_parquet(temporario, index=False)
+            temporario.replace(destino)
+
+            indice[arquivo.name] = {
+                "assinatura": self._assinatura(arquivo),
+                "tickers": tickers,
+                "parquet": destino.name,
+            }
+            (self.pasta / ARQUIVO_INDICE_COTACOES).write_text(
+                json.dumps(indice, indent=2), encoding="utf-8"
+            )
+
+        return len(df)
+
+    def ler(self, tickers: list | None = None) -> pd.DataFrame:
+        """
+        Lê as cotações da base, somente as colunas e os tickers pedidos são lidos dos arquivos parquet.
+
+        Argumentos:
+            tickers (list | None): Tickers lidos. Se None, lê todos os tickers da base.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_COTACOES (list), ordenado por data e
+            ticker. Cotações do mesmo ticker e data em mais de um arquivo aparecem uma única vez.
+        """
+        arquivos = [
+            self.pasta / importado["parquet"]
+            for importado in self._ler_indice().values()
+        ]
+        arquivos = [arquivo for arquivo in arquivos if arquivo.exists()]
+        if not arquivos:
+            return compactar_dados(
+                df=pd.DataFrame(columns=COLUNAS_COTACOES).astype(
+                    {"Data": "datetime64[ns]"}
+                )
+            )
+
+        filtros = [("Ticker", "in", list(tickers))] if tickers is not None else None
+        df = pd.concat(
+            [pd.read_parquet(arquivo, filters=filtros) for arquivo in arquivos],
+            ignore_index=True,
+        )
+
+        return compactar_dados(
+            df=df.drop_duplicates(subset=["Data", "Ticker"], keep="last")
+            .sort_values(["Data", "Ticker"], kind="stable")
+            .reset_index(drop=True)[COLUNAS_COTACOES]
+        )
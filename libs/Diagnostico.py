@@ -0,0 +1,240 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+import pandas as pd
+from dataclasses import dataclass, field
+
+
+# CONSTANTES
+# -----------------------------
+# Logger das medições, cada medição é registrada como uma linha em json
+LOGGER: logging.Logger = logging.getLogger("b3analyzer.diagnostico")
+
+# Trava da ligação do tracemalloc, que é do processo inteiro
+TRAVA_TRACEMALLOC: threading.Lock = threading.Lock()
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def contar_linhas(resultado) -> int | None:
+    """
+    Retorna a quantidade de linhas do resultado de uma etapa.
+
+    Argumentos:
+        resultado: Dataframe, series, lista ou tupla de dataframes retornado pela etapa.
+
+    Retorna:
+        int | None: Quantidade de linhas, ou None quando o resultado não possui linhas.
+    """
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return len(resultado)
+    if isinstance(resultado, (list, tuple)):
+        linhas = [contar_linhas(item) for item in resultado]
+        linhas = [quantidade for quantidade in linhas if quantidade is not None]
+        return sum(linhas) if linhas else None
+
+    return None
+
+
+class EtapaInativa:
+    """
+    Etapa retornada quando o diagnóstico está desligado. Não mede nada e não guarda nada.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro) -> bool:
+        return False
+
+    def registrar(self, resultado):
+        return resultado
+
+
+ETAPA_INATIVA: EtapaInativa = EtapaInativa()
+
+
+@dataclass
+class Etapa:
+    """
+    Classe que mede o tempo, o pico de memória e as linhas de entrada e saída de uma etapa do processamento.
+    Utilizada como context manager, criada por Diagnostico.medir. O pico de memória só é medido com
+    Diagnostico.medir_memoria, senão fica None.
+    """
+
+    diagnostico: "Diagnostico"
+    nome: str
+    linhas_entrada: int | None = None
+    linhas_saida: int | None = None
+    entrada: object = field(default=None, repr=False)
+    _inicio: float = field(default=0.0, init=False, repr=False)
+    _memoria_inicio: int = field(default=0, init=False, repr=False)
+    _pico: int = field(default=0, init=False, repr=False)
+
+    def __enter__(self):
+        if self.entrada is not None:
+            self.linhas_entrada = len(self.entrada)
+
+        pilha = self.diagnostico._pilha
+        if not pilha:
+            self.diagnostico._ligar_tracemalloc()
+
+        if self.diagnostico._rastreando:
+            # Guarda o pico atual na etapa de fora antes de zerar o pico para esta etapa
+            if pilha:
+                pilha[-1]._pico = max(
+                    pilha[-1]._pico, tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+            self._memoria_inicio = tracemalloc.get_traced_memory()[0]
+        pilha.append(self)
+        self._inicio = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *erro) -> bool:
+        segundos = time.perf_counter() - self._inicio
+        pilha = self.diagnostico._pilha
+        pilha.pop()
+
+        pico_mb = None
+        if self.diagnostico._rastreando:
+            pico = max(self._pico, tracemalloc.get_traced_memory()[1])
+            pico_mb = round(max(pico - self._memoria_inicio, 0) / 1e6, 3)
+            if pilha:
+                pilha[-1]._pico = max(pilha[-1]._pico, pico)
+        if not pilha:
+            self.diagnostico._desligar_tracemalloc()
+
+        self.diagnostico.incluir(
+            medicoes=[
+                {
+                    "etapa": self.nome,
+                    "pai": pilha[-1].nome if pilha else None,
+                    "segundos": round(segundos, 6),
+                    "pico_mb": pico_mb,
+                    "linhas_entrada": self.linhas_entrada,
+                    "linhas_saida": self.linhas_saida,
+                }
+            ]
+        )
+
+        return False
+
+    def registrar(self, resultado):
+        """
+        Registra as linhas de saída da etapa a partir do resultado e retorna o próprio resultado.
+
+        Argumentos:
+            resultado: Resultado da etapa, normalmente um dataframe.
+
+        Retorna:
+            O mesmo resultado recebido.
+        """
+        self.linhas_saida = contar_linhas(resultado)
+
+        return resultado
+
+
+@dataclass
+class Diagnostico:
+    """
+    Classe que mede as etapas do processamento, para identificar onde o tempo e a memória são gastos.
+
+    Cada etapa é medida com "with diagnostico.medir(...)", que registra o tempo e as linhas de entrada e de
+    saída. As medições ficam guardadas em medicoes e também são registradas no LOGGER como linhas em json, exceto
+    com registrar_log=False. Com ativo=False o medir retorna sempre a mesma etapa vazia, sem medir nada.
+
+    O pico de memória só é medido com medir_memoria=True, pois o tracemalloc deixa a execução mais lenta. O
+    tracemalloc é ligado na primeira etapa e desligado quando ela termina, junto com as etapas de dentro. Como o
+    tracemalloc é do processo inteiro, a memória não é medida quando ele já está ligado por outro diagnóstico ou
+    por outra sessão, para não zerar o pico medido por eles, e com várias sessões ao mesmo tempo o pico é
+    aproximado.
+    """
+
+    ativo: bool = False
+    registrar_log: bool = True
+    medir_memoria: bool = False
+    medicoes: list = field(default_factory=list)
+    _pilha: list = field(default_factory=list, init=False, repr=False)
+    _rastreando: bool = field(default=False, init=False, repr=False)
+
+    def _ligar_tracemalloc(self) -> None:
+        """
+        Liga o tracemalloc no início da primeira etapa, se a memória for medida e ele ainda não estiver ligado.
+        """
+        if self.medir_memoria:
+            with TRAVA_TRACEMALLOC:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._rastreando = True
+
+    def _desligar_tracemalloc(self) -> None:
+        """
+        Desliga o tracemalloc ligado por este diagnóstico quando a primeira etapa termina.
+        """
+        if self._rastreando:
+            with TRAVA_TRACEMALLOC:
+                tracemalloc.stop()
+                self._rastreando = False
+
+    def medir(self, etapa: str, linhas_entrada: int | None = None, entrada=None):
+        """
+        Retorna o context manager que mede a etapa.
+
+        Argumentos:
+            etapa (str): Nome da etapa.
+            linhas_entrada (int | None): Quantidade de linhas recebidas pela etapa.
+            entrada: Dados recebidos pela etapa (dataframe ou ConsultaParquet), no lugar de linhas_entrada. As linhas
+            só são contadas com o diagnóstico ligado, pois na ConsultaParquet a contagem é uma consulta no duckdb.
+
+        Retorna:
+            Etapa, ou ETAPA_INATIVA quando o diagnóstico está desligado.
+        """
+        if not self.ativo:
+            return ETAPA_INATIVA
+
+        return Etapa(
+            diagnostico=self, nome=etapa, linhas_entrada=linhas_entrada, entrada=entrada
+        )
+
+    def incluir(self, medicoes: list) -> None:
+        """
+        Guarda as medições e registra cada uma no LOGGER. Utilizado também para incluir as medições feitas
+        em outros processos, que ficam como filhas da etapa em andamento.
+
+        Argumentos:
+            medicoes (list): Medições no formato gerado pelas etapas.
+        """
+        for medicao in medicoes:
+            if medicao["pai"] is None and self._pilha:
+                medicao = {**medicao, "pai": self._pilha[-1].nome}
+
+            self.medicoes.append(medicao)
+            if self.registrar_log:
+                LOGGER.info(json.dumps(medicao, ensure_ascii=False))
+
+    def tabela(self) -> pd.DataFrame:
+        """
+        Retorna as medições em um dataframe, na ordem em que as etapas terminaram.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com uma linha por medição.
+        """
+        return pd.DataFrame(
+            self.medicoes,
+            columns=[
+                "etapa",
+                "pai",
+                "segundos",
+                "pico_mb",
+                "linhas_entrada",
+                "linhas_saida",
+            ],
+        )
+
+
+# Diagnóstico desligado, utilizado quando nenhum diagnóstico é informado
+DIAGNOSTICO_INATIVO: Diagnostico = Diagnostico()
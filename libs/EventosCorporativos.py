@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, replace
+from libs.ConsultaParquet import COLUNA_ORDEM, BaseParquet, ConsultaParquet, chave_ordem
+from libs.PrecoMedio import (
+    MOVIMENTACOES_EVENTOS,
+    MOVIMENTACOES_PRECO_MEDIO,
+    selecionar_movimentacoes,
+)
+from libs.Metricas import calcular_custo_medio
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas da tabela de eventos corporativos
+COLUNAS_EVENTOS: list = [
+    "Data",
+    "Ticker",
+    "Movimentação",
+    "Quantidade Anterior",
+    "Quantidade Posterior",
+    "Proporção",
+    "Fator Ajuste",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def fator_posterior(grupos: np.ndarray, proporcao: np.ndarray) -> np.ndarray:
+    """
+    Calcula, para cada linha, o produto das proporções das linhas seguintes do mesmo grupo.
+
+    O produto é acumulado de trás para frente com cumprod em cada grupo, e cada linha recebe o produto a partir
+    da linha seguinte (a proporção da própria linha não entra).
+
+    Argumentos:
+        grupos (np.ndarray): Código do grupo de cada linha, com as linhas em ordem cronológica.
+        proporcao (np.ndarray): Proporção de cada linha, 1 nas linhas que não são eventos.
+
+    Retorna:
+        np.ndarray: Fator de cada linha, na ordem recebida.
+    """
+    ordem = np.argsort(grupos, kind="stable")[::-1]
+    invertidos = grupos[ordem]
+    produto = (
+        pd.Series(proporcao[ordem]).groupby(invertidos, sort=False).cumprod().to_numpy()
+    )
+
+    # Na ordem invertida, o produto das linhas seguintes é o produto acumulado da linha anterior do grupo
+    fator = np.ones(len(grupos))
+    mesmo_grupo = invertidos[1:] == invertidos[:-1]
+    fator[1:][mesmo_grupo] = produto[:-1][mesmo_grupo]
+
+    saida = np.empty_like(fator)
+    saida[ordem] = fator
+
+    return saida
+
+
+@dataclass
+class EventosCorporativos:
+    """
+    Classe que ajusta as movimentações pelos desdobros e grupamentos de cada ticker.
+
+    A proporção de cada evento é a quantidade em carteira logo após o evento dividida pela quantidade logo antes.
+    As quantidades das movimentações anteriores ao evento são multiplicadas pela proporção e os preços unitários
+    divididos por ela (o valor da operação não muda), e a própria linha do evento deixa de alterar a quantidade:
+    o desdobro passa a ter quantidade zero, e o grupamento continua informando a quantidade após o evento, que é
+    a mesma quantidade ajustada em carteira. Assim as tabelas, o preço médio e as posições são calculados sobre
+    dados ajustados sem nenhum tratamento especial.
+    """
+
+    def eventos(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Encontra os desdobros e grupamentos de cada ticker e calcula a proporção de cada um.
+
+        A quantidade em carteira é a mesma posição das métricas (calcular_custo_medio), com as movimentações do
+        preço médio (MOVIMENTACOES_PRECO_MEDIO) em ordem cronológica. Eventos de tickers sem quantidade em carteira
+        não têm proporção e não são ajustados.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas, em ordem cronológica. Também
+            aceita uma ConsultaParquet, em que somente as movimentações do preço médio são lidas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_EVENTOS (list), uma linha por evento
+            ajustado, indexado pela posição da linha do evento em df (ou pela COLUNA_ORDEM (str) na ConsultaParquet).
+            "Fator Ajuste" é o fator aplicado nas movimentações anteriores ao evento, incluindo os eventos seguintes.
+        """
+        if isinstance(df, ConsultaParquet):
+            df = df.onde(
+                '"Movimentação" IS NOT NULL AND regexp_matches("Movimentação", ?)',
+                MOVIMENTACOES_PRECO_MEDIO,
+            ).dataframe(com_ordem=True)
+            df.index = df.pop(COLUNA_ORDEM).to_numpy()
+        else:
+            df = df.set_axis(np.arange(len(df)))
+
+        movs = df.loc[selecionar_movimentacoes(df=df) & df["Ticker"].notna().to_numpy()]
+        movimentacao = movs["Movimentação"].to_numpy()
+        credito = movs["Entrada/Saída"].to_numpy() == "Credito"
+        quantidade = movs["Quantidade"].to_numpy(dtype="float64")
+        grupos, tickers = pd.factorize(movs["Ticker"])
+        zeros = np.zeros(len(tickers))
+
+        # Quantidade em carteira após cada movimentação, e a quantidade da linha anterior do mesmo ticker
+        posterior = calcular_custo_medio(
+            grupos=grupos,
+            credito=credito,
+            grupamento=movimentacao == "Grupamento",
+            quantidade=quantidade,
+            valor=movs["Valor da Operação"].to_numpy(dtype="float64"),
+            quantidade_inicial=zeros,
+            custo_inicial=zeros,
+        )["Quantidade"]
+        ordem = np.argsort(grupos, kind="stable")
+        inicio_grupo = np.ones(len(ordem), dtype=bool)
+        inicio_grupo[1:] = grupos[ordem][1:] != grupos[ordem][:-1]
+        anterior = np.empty(len(ordem))
+        anterior[ordem] = np.where(inicio_grupo, 0, np.roll(posterior[ordem], 1))
+
+        # O desdobro é sempre uma entrada de ações. Um desdobro de saída é tratado como uma venda
+        evento = (
+            ((movimentacao == "Grupamento") | ((movimentacao == "Desdobro") & credito))
+            & (quantidade > 0)
+            & (anterior > 0)
+            & (posterior > 0)
+        )
+        eventos = movs.loc[evento, ["Data", "Ticker", "Movimentação"]]
+        eventos["Quantidade Anterior"] = anterior[evento]
+        eventos["Quantidade Posterior"] = posterior[evento]
+        eventos["Proporção"] = posterior[evento] / anterior[evento]
+        eventos["Fator Ajuste"] = eventos["Proporção"] * fator_posterior(
+            grupos=grupos[evento], proporcao=eventos["Proporção"].to_numpy()
+        )
+
+        return eventos[COLUNAS_EVENTOS]
+
+    def ajustar(
+        self, df: pd.DataFrame, eventos: pd.DataFrame | None = None
+    ) -> pd.DataFrame:
+        """
+        Ajusta as quantidades e os preços unitários das movimentações anteriores a cada desdobro e grupamento.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas, em ordem cronológica. Também
+            aceita uma ConsultaParquet, e o ajuste passa a ser feito pela base em todas as consultas.
+            eventos (pd.DataFrame | None): Eventos já encontrados por eventos nos mesmos dados, para não
+            calculá-los novamente.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as movimentações ajustadas, ou a ConsultaParquet de uma nova
+            BaseParquet com os fatores do ajuste. Sem eventos ajustados, retorna os dados recebidos.
+        """
+        if eventos is None:
+            eventos = self.eventos(df=df)
+        if eventos.empty:
+            return df
+
+        if isinstance(df, ConsultaParquet):
+            return self._ajustar_consulta(consulta=df, eventos=eventos)
+
+        tickers = pd.Index(eventos["Ticker"].unique()).astype(object)
+        grupos = tickers.get_indexer(df["Ticker"].astype(object))
+        ajustadas = np.flatnonzero(grupos >= 0)
+
+        proporcao = np.ones(len(df))
+        proporcao[eventos.index] = eventos["Proporção"].to_numpy()
+        fator = np.ones(len(df))
+        fator[ajustadas] = fator_posterior(
+            grupos=grupos[ajustadas], proporcao=proporcao[ajustadas]
+        )
+
+        quantidade = df["Quantidade"].to_numpy(dtype="float64") * fator
+        desdobros = eventos.index[eventos["Movimentação"] == "Desdobro"]
+        quantidade[desdobros] = 0
+
+        return df.assign(
+            **{
+                "Quantidade": quantidade,
+                "Preço unitário": df["Preço unitário"].to_numpy(dtype="float64")
+                / fator,
+            }
+        )
+
+    def _ajustar_consulta(
+        self, consulta: ConsultaParquet, eventos: pd.DataFrame
+    ) -> ConsultaParquet:
+        """
+        Monta a tabela de fatores dos eventos, com a chave da ordem de cada evento (chave_ordem), o fator das
+        movimentações anteriores e o fator da própria linha do evento (o dos eventos seguintes do ticker), e
+        retorna a consulta em uma nova BaseParquet com os fatores.
+        """
+        posterior = (
+            eventos.groupby("Ticker", sort=False)["Fator Ajuste"].shift(-1).fillna(1.0)
+        )
+        fatores = pd.DataFrame(
+            {
+                "Ticker": eventos["Ticker"].astype(object).to_numpy(),
+                "Chave": chave_ordem(datas=eventos["Data"], linhas=eventos.index),
+                "Fator Anterior": eventos["Fator Ajuste"].to_numpy(),
+                "Fator Posterior": posterior.to_numpy(),
+                "Desdobro": (eventos["Movimentação"] == "Desdobro").to_numpy(),
+            }
+        )
+
+        return replace(
+            consulta, base=BaseParquet(pasta=consulta.base.pasta, fatores=fatores)
+        )
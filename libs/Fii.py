@@ -1,8 +1,8 @@
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass
-
-# from libs.data_cleaning import *
+from libs.data_cleaning import classificar_ativos
+from libs.ConsultaParquet import ConsultaParquet
 
 
 # PANDAS CONFIG
@@ -22,17 +22,24 @@ class Fii:
 
         Argumentos:
             df (pd.DataFrame): Pandas dataframe com as movimentações dos extratos para tratamento inicial.
+            Também aceita uma ConsultaParquet, que retorna a consulta somente com as movimentações de FIIs.
 
         Retorna:
             df (pd.DataFrame): Pandas dataframe com os dados tratados e somente com as movimentações de FIIs.
         """
-        df = df[
-            df["Descrição Ticker"].str.contains(
-                "FII|INVESTIMENTO IMOBILIARIO|INVESTIMENTO IMOBILIÁRIO|INV IMOB"
+        if isinstance(df, ConsultaParquet):
+            return df.onde(
+                '"Classe" = ? AND "Movimentação" <> ?', "FII", "Rendimento"
+            ).com_expressao(
+                coluna="Valor da Operação",
+                expressao="""CASE WHEN "Movimentação" IN ('Amortização', 'Resgate')
+                THEN -"Valor da Operação" ELSE "Valor da Operação" END""",
             )
-        ]
-        df = df[df["Ticker"].str.contains("11")]
-        df = df[df["Movimentação"] != "Rendimento"]
+
+        if "Classe" not in df.columns:
+            df = classificar_ativos(df=df)
+
+        df = df[(df["Classe"] == "FII") & (df["Movimentação"] != "Rendimento")]
         df["Valor da Operação"] = np.where(
             df["Movimentação"] == "Amortização",
             df["Valor da Operação"] * -1,
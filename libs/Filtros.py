@@ -0,0 +1,120 @@
+import pandas as pd
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas disponíveis para filtro na barra lateral
+COLUNAS_FILTROS: list = ["Ano", "Mes", "Movimentação", "Ticker", "Instituição"]
+
+
+@dataclass
+class IndiceFiltros:
+    """
+    Classe que guarda um índice das posições das linhas de cada valor das colunas de filtro.
+
+    O índice é montado uma única vez para o dataframe. Cada filtro é resolvido unindo as posições dos valores
+    selecionados em cada coluna e cruzando o resultado entre as colunas, sem montar expressões para o df.query
+    e sem percorrer o dataframe inteiro. As posições das linhas filtradas (e não cópias do dataframe) ficam
+    guardadas pela combinação de filtros, descartando a combinação usada há mais tempo quando o limite de
+    tamanho_maximo é atingido.
+    """
+
+    df: pd.DataFrame
+    tamanho_maximo: int = 32
+    _posicoes: dict = field(default_factory=dict, init=False, repr=False)
+    _filtradas: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+
+    def __post_init__(self):
+        for coluna in COLUNAS_FILTROS:
+            codigos, valores = pd.factorize(self.df[coluna])
+
+            # Ordena as posições pelo código do valor e separa as posições de cada valor
+            ordem = np.argsort(codigos, kind="stable")
+            limites = np.searchsorted(codigos[ordem], np.arange(len(valores) + 1))
+            self._posicoes[coluna] = {
+                valor: ordem[inicio:fim]
+                for valor, inicio, fim in zip(valores, limites[:-1], limites[1:])
+            }
+
+    def opcoes(self, coluna: str) -> list:
+        """
+        Retorna os valores distintos da coluna em ordem crescente, para as opções dos filtros.
+
+        Argumentos:
+            coluna (str): Coluna de COLUNAS_FILTROS (list).
+
+        Retorna:
+            list: Valores distintos da coluna em ordem crescente.
+        """
+        valores = pd.Series(list(self._posicoes[coluna]), dtype=self.df[coluna].dtype)
+
+        return valores.sort_values(ascending=True).tolist()
+
+    @staticmethod
+    def chave_filtros(filtros: dict) -> tuple:
+        """
+        Retorna uma chave que identifica a combinação de filtros, independente da ordem dos valores selecionados.
+
+        Argumentos:
+            filtros (dict): Valores selecionados para cada coluna de COLUNAS_FILTROS (list).
+
+        Retorna:
+            tuple: Chave da combinação de filtros.
+        """
+        return tuple(
+            (coluna, tuple(sorted(set(filtros.get(coluna) or []), key=str)))
+            for coluna in COLUNAS_FILTROS
+        )
+
+    def posicoes(self, filtros: dict) -> np.ndarray | None:
+        """
+        Retorna as posições das linhas que possuem algum dos valores selecionados em cada coluna filtrada.
+
+        Argumentos:
+            filtros (dict): Valores selecionados para cada coluna de COLUNAS_FILTROS (list).
+            Colunas ausentes ou sem valores selecionados não são filtradas.
+
+        Retorna:
+            np.ndarray | None: Posições das linhas em ordem crescente, ou None quando nenhuma coluna é filtrada.
+        """
+        chave = self.chave_filtros(filtros=filtros)
+        if chave in self._filtradas:
+            self._filtradas.move_to_end(chave)
+            return self._filtradas[chave]
+
+        mask = None
+        for coluna, valores in chave:
+            if not valores:
+                continue
+
+            mask_coluna = np.zeros(len(self.df), dtype=bool)
+            for valor in valores:
+                mask_coluna[self._posicoes[coluna].get(valor, [])] = True
+
+            mask = mask_coluna if mask is None else mask & mask_coluna
+
+        posicoes = None if mask is None else np.flatnonzero(mask)
+
+        self._filtradas[chave] = posicoes
+        while len(self._filtradas) > self.tamanho_maximo:
+            self._filtradas.popitem(last=False)
+
+        return posicoes
+
+    def filtrar(self, filtros: dict) -> pd.DataFrame:
+        """
+        Retorna somente as linhas que possuem algum dos valores selecionados em cada coluna filtrada.
+
+        Argumentos:
+            filtros (dict): Valores selecionados para cada coluna de COLUNAS_FILTROS (list).
+            Colunas ausentes ou sem valores selecionados não são filtradas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe filtrado, na mesma ordem do dataframe original.
+        """
+        posicoes = self.posicoes(filtros=filtros)
+
+        return self.df if posicoes is None else self.df.take(posicoes)
@@ -2,6 +2,132 @@ import pandas as pd
 import numpy as np
 from dataclasses import dataclass
 from libs.data_cleaning import *
+from libs.ConsultaParquet import ConsultaParquet
+
+
+# CONSTANTES
+# -----------------------------
+# Movimentações consideradas negócios de contratos futuros, e se cada uma é uma compra
+NEGOCIOS_FUTUROS: dict = {"Compra": True, "Venda": False}
+
+# Colunas dos negócios de futuros lidas da ConsultaParquet para o day trade
+COLUNAS_NEGOCIOS: list = [
+    "Data",
+    "Ticker",
+    "Classe",
+    "Movimentação",
+    "Quantidade",
+    "Preço unitário",
+]
+
+# Colunas das operações de day trade, uma linha por par de compra e venda
+COLUNAS_OPERACOES_DAY_TRADE: list = [
+    "Ano",
+    "Mes",
+    "Data",
+    "Contrato",
+    "Sentido",
+    "Quantidade",
+    "Preço Compra",
+    "Preço Venda",
+    "Pontos",
+    "Resultado",
+]
+
+# Colunas do day trade por dia, uma linha por contrato e dia
+COLUNAS_DAY_TRADE_POR_DIA: list = [
+    "Ano",
+    "Mes",
+    "Data",
+    "Contrato",
+    "Quantidade Comprada",
+    "Quantidade Vendida",
+    "Quantidade Day Trade",
+    "Resultado",
+    "Posição Carregada",
+    "Carregou Posição",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def acumular_por_grupo(
+    quantidade: np.ndarray, grupos: np.ndarray, n_grupos: int
+) -> np.ndarray:
+    """
+    Soma cumulativa das quantidades dentro de cada grupo, para quantidades já ordenadas por grupo.
+
+    Como as quantidades são inteiras, a soma cumulativa de todas as linhas menos o total dos grupos anteriores é
+    exata.
+
+    Argumentos:
+        quantidade (np.ndarray): Quantidades inteiras, ordenadas por grupo.
+        grupos (np.ndarray): Código do grupo de cada linha.
+        n_grupos (int): Quantidade de grupos.
+
+    Retorna:
+        np.ndarray: Quantidade acumulada de cada linha dentro do seu grupo.
+    """
+    total = np.zeros(n_grupos, dtype=np.int64)
+    np.add.at(total, grupos, quantidade)
+    anteriores = np.cumsum(total) - total
+
+    return np.cumsum(quantidade) - anteriores[grupos]
+
+
+def parear_negocios(
+    grupos: np.ndarray, compra: np.ndarray, quantidade: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pareia as compras e as vendas de cada grupo pelo método PEPS (primeiro que entra, primeiro que sai).
+
+    No PEPS, a k-ésima unidade comprada no grupo é sempre encerrada pela k-ésima unidade vendida (e vice-versa),
+    então cada negócio ocupa um intervalo da quantidade acumulada do seu lado. Os intervalos de todos os grupos são
+    colocados lado a lado em um único eixo, e os pares são os trechos entre os fins de intervalo das compras e das
+    vendas, encontrados com searchsorted, sem percorrer os grupos. As quantidades que sobram em um dos lados não
+    são pareadas.
+
+    Argumentos:
+        grupos (np.ndarray): Código do grupo de cada negócio, com os negócios ordenados por grupo e, dentro do
+        grupo, na ordem de execução.
+        compra (np.ndarray): Array booleano, True nas compras e False nas vendas.
+        quantidade (np.ndarray): Quantidade inteira de cada negócio.
+
+    Retorna:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Posição da compra, posição da venda e quantidade de cada par.
+    """
+    n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+    quantidade = quantidade.astype(np.int64)
+
+    total_compra = np.zeros(n_grupos, dtype=np.int64)
+    total_venda = np.zeros(n_grupos, dtype=np.int64)
+    np.add.at(total_compra, grupos[compra], quantidade[compra])
+    np.add.at(total_venda, grupos[~compra], quantidade[~compra])
+
+    # Cada grupo ocupa no eixo somente a quantidade pareada, e as sobras ficam presas no fim do grupo
+    pareada = np.minimum(total_compra, total_venda)
+    fim = np.cumsum(pareada)
+    inicio = fim - pareada
+
+    def fins(lado: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        posicoes = np.flatnonzero(lado)
+        acumulada = acumular_por_grupo(quantidade[posicoes], grupos[posicoes], n_grupos)
+        g = grupos[posicoes]
+
+        return posicoes, np.minimum(inicio[g] + acumulada, fim[g])
+
+    posicoes_compra, fins_compra = fins(compra)
+    posicoes_venda, fins_venda = fins(~compra)
+
+    cortes = np.unique(np.concatenate([[0], fim, fins_compra, fins_venda]))
+    par_compra = np.searchsorted(fins_compra, cortes[1:], side="left")
+    par_venda = np.searchsorted(fins_venda, cortes[1:], side="left")
+
+    return (
+        posicoes_compra[par_compra],
+        posicoes_venda[par_venda],
+        np.diff(cortes),
+    )
 
 
 @dataclass
@@ -11,7 +137,28 @@ class Futuros:
     """
 
     def pegar_somente_futuros(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df[df["Descrição Ticker"].str.contains("WDO|WIN")]
+        if isinstance(df, ConsultaParquet):
+            return (
+                df.onde('"Classe" = ?', "Futuros")
+                .com_expressao(
+                    coluna="Descrição Ticker",
+                    expressao='"Descrição Ticker" || \' - \' || "Ticker"',
+                )
+                .com_expressao(
+                    coluna="Ticker",
+                    expressao="""left("Descrição Ticker" || ' - ' || "Ticker", 6)""",
+                )
+                .com_expressao(
+                    coluna="Preço unitário",
+                    expressao="""CASE WHEN "Movimentação" = 'Compra'
+                    THEN -"Preço unitário" ELSE "Preço unitário" END""",
+                )
+            )
+
+        if "Classe" not in df.columns:
+            df = classificar_ativos(df=df)
+
+        df = df[df["Classe"] == "Futuros"]
         df.loc[:, "Descrição Ticker"] = df["Descrição Ticker"] + " - " + df["Ticker"]
         df.loc[:, "Ticker"] = df["Descrição Ticker"].str[:6]
         df.loc[:, "Preço unitário"] = np.where(
@@ -21,3 +168,130 @@ class Futuros:
         )
 
         return df
+
+    def calcular_day_trade(self, df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Pareia as compras e as vendas de cada contrato no mesmo dia, ponderadas pela quantidade, e calcula o
+        resultado das operações de day trade.
+
+        Os negócios são pareados pelo PEPS dentro de cada contrato e dia, na ordem das movimentações tratadas
+        (parear_negocios). O extrato não informa o horário dos negócios: tratar_dados inverte o extrato da B3, que
+        lista os negócios do mais recente para o mais antigo, e ordena as datas de forma estável, então os negócios
+        de cada dia ficam na ordem em que foram executados.
+        A quantidade que sobra em um dos lados não é day trade: é uma posição aberta ou encerrada de um dia para
+        o outro, e fica marcada no day trade por dia como posição carregada (positiva quando comprada e negativa
+        quando vendida).
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas. Também aceita uma
+            ConsultaParquet, em que somente as colunas de COLUNAS_NEGOCIOS (list) dos negócios de futuros são
+            lidas.
+
+        Retorna:
+            tuple[pd.DataFrame, pd.DataFrame]: Pandas dataframe com as operações de day trade, com as colunas de
+            COLUNAS_OPERACOES_DAY_TRADE (list), e Pandas dataframe com o day trade por dia, com as colunas de
+            COLUNAS_DAY_TRADE_POR_DIA (list). O resultado é em reais, pelo valor do ponto de cada contrato.
+        """
+        if isinstance(df, ConsultaParquet):
+            marcadores = ", ".join("?" for _ in NEGOCIOS_FUTUROS)
+            df = df.onde(
+                f'"Classe" = ? AND "Movimentação" IN ({marcadores})',
+                "Futuros",
+                *NEGOCIOS_FUTUROS,
+            ).dataframe(colunas=COLUNAS_NEGOCIOS)
+
+        if "Classe" not in df.columns:
+            df = classificar_ativos(df=df)
+
+        negocios = df.loc[
+            (df["Classe"] == "Futuros").to_numpy()
+            & df["Movimentação"].isin(list(NEGOCIOS_FUTUROS)).to_numpy()
+            & (df["Quantidade"] > 0).to_numpy()
+            & df["Ticker"].notna().to_numpy(),
+            ["Data", "Ticker", "Movimentação", "Quantidade", "Preço unitário"],
+        ]
+
+        # Um grupo por contrato e dia, com os negócios de cada grupo juntos e na ordem das movimentações
+        grupos = (
+            negocios.groupby(["Ticker", "Data"], sort=True, observed=True)
+            .ngroup()
+            .to_numpy()
+        )
+        ordem = np.argsort(grupos, kind="stable")
+        negocios = negocios.iloc[ordem]
+        grupos = grupos[ordem]
+
+        compra = (
+            negocios["Movimentação"]
+            .astype("object")
+            .map(NEGOCIOS_FUTUROS)
+            .to_numpy(dtype=bool)
+        )
+        quantidade = negocios["Quantidade"].to_numpy(dtype=np.int64)
+        preco = negocios["Preço unitário"].to_numpy(dtype="float64")
+        posicoes_compra, posicoes_venda, pareada = parear_negocios(
+            grupos=grupos, compra=compra, quantidade=quantidade
+        )
+
+        # Operações
+        pontos = preco[posicoes_venda] - preco[posicoes_compra]
+        pares = negocios.iloc[posicoes_compra]
+        operacoes = pd.DataFrame(
+            {
+                "Data": pares["Data"].to_numpy(),
+                "Contrato": pares["Ticker"].to_numpy(),
+                "Sentido": np.where(
+                    posicoes_compra < posicoes_venda, "Comprado", "Vendido"
+                ),
+                "Quantidade": pareada,
+                "Preço Compra": preco[posicoes_compra],
+                "Preço Venda": preco[posicoes_venda],
+                "Pontos": pontos,
+                "Resultado": pontos
+                * pareada
+                * valor_do_ponto(pares["Ticker"].to_numpy()),
+            }
+        )
+
+        # Day trade por dia
+        n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+        inicio_grupo = np.r_[True, grupos[1:] != grupos[:-1]] if len(grupos) else grupos
+        dias = negocios.loc[inicio_grupo, ["Data", "Ticker"]]
+        comprada = np.bincount(grupos, weights=quantidade * compra, minlength=n_grupos)
+        vendida = np.bincount(grupos, weights=quantidade * ~compra, minlength=n_grupos)
+        carregada = (comprada - vendida).astype(np.int64)
+        por_dia = pd.DataFrame(
+            {
+                "Data": dias["Data"].to_numpy(),
+                "Contrato": dias["Ticker"].to_numpy(),
+                "Quantidade Comprada": comprada.astype(np.int64),
+                "Quantidade Vendida": vendida.astype(np.int64),
+                "Quantidade Day Trade": np.minimum(comprada, vendida).astype(np.int64),
+                "Resultado": np.bincount(
+                    grupos[posicoes_compra],
+                    weights=operacoes["Resultado"].to_numpy(),
+                    minlength=n_grupos,
+                ),
+                "Posição Carregada": carregada,
+                "Carregou Posição": carregada != 0,
+            }
+        )
+
+        operacoes = operacoes.sort_values("Data", kind="stable")
+        por_dia = por_dia.sort_values("Data", kind="stable")
+        for tabela in (operacoes, por_dia):
+            tabela.insert(0, "Ano", tabela["Data"].dt.year.astype("int16"))
+            tabela.insert(
+                1,
+                "Mes",
+                pd.Categorical.from_codes(
+                    codes=tabela["Data"].dt.month.sub(1).astype("int8"),
+                    categories=MESES,
+                    ordered=True,
+                ),
+            )
+
+        return (
+            operacoes[COLUNAS_OPERACOES_DAY_TRADE].reset_index(drop=True),
+            por_dia[COLUNAS_DAY_TRADE_POR_DIA].reset_index(drop=True),
+        )
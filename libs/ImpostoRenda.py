@@ -0,0 +1,480 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from libs.data_cleaning import MESES
+from libs.ConsultaParquet import ConsultaParquet
+from libs.PrecoMedio import (
+    MOVIMENTACOES_EVENTOS,
+    MOVIMENTACOES_PRECO_MEDIO,
+    selecionar_movimentacoes,
+)
+from libs.Metricas import (
+    acumular_por_trecho,
+    calcular_custo_medio,
+    contar_ate,
+    continuar,
+    fronteira,
+    movimentacoes_desde,
+)
+from libs.Futuros import NEGOCIOS_FUTUROS, Futuros
+from libs.ResultadoRealizado import CLASSES_RESULTADO
+
+
+# CONSTANTES
+# -----------------------------
+# Limite das vendas de ações no mês para a isenção do lucro nas operações comuns
+LIMITE_ISENCAO_ACOES: float = 20_000.0
+
+# Grupo de apuração de cada classe de ativo. Os prejuízos de um grupo só compensam os lucros do mesmo grupo
+GRUPOS_IMPOSTO: dict = {
+    "Ações": "Operações Comuns",
+    "BDR": "Operações Comuns",
+    "FII": "FII",
+    "Futuros": "Day Trade",
+}
+
+# Alíquota do imposto de cada grupo de apuração
+ALIQUOTAS_IMPOSTO: dict = {
+    "Operações Comuns": 0.15,
+    "FII": 0.20,
+    "Day Trade": 0.20,
+}
+
+# Colunas do livro do imposto, uma linha por ano, mês e classe de ativo
+COLUNAS_LIVRO_IMPOSTO: list = [
+    "Ano",
+    "Mes",
+    "Classe",
+    "Grupo",
+    "Vendas",
+    "Resultado",
+    "Isento",
+    "Resultado Tributável",
+]
+
+# Colunas da apuração do imposto, uma linha por ano, mês e grupo de apuração
+COLUNAS_APURACAO: list = [
+    "Ano",
+    "Mes",
+    "Grupo",
+    "Resultado Tributável",
+    "Prejuízo Anterior",
+    "Prejuízo Compensado",
+    "Base de Cálculo",
+    "Alíquota",
+    "Imposto",
+    "Prejuízo a Compensar",
+]
+
+# Colunas das movimentações de posição e dos negócios de futuros lidas da ConsultaParquet
+COLUNAS_CALCULO_IMPOSTO: list = [
+    "Data",
+    "Ticker",
+    "Classe",
+    "Movimentação",
+    "Entrada/Saída",
+    "Quantidade",
+    "Preço unitário",
+    "Valor da Operação",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def calcular_periodos(datas: pd.Series) -> np.ndarray:
+    """
+    Converte as datas em períodos mensais inteiros (ano * 12 + mês - 1), que mantêm a ordem cronológica.
+
+    Argumentos:
+        datas (pd.Series): Datas das movimentações.
+
+    Retorna:
+        np.ndarray: Período de cada data.
+    """
+    datas = pd.to_datetime(datas)
+
+    return (datas.dt.year * 12 + datas.dt.month - 1).to_numpy(dtype=np.int64)
+
+
+def inserir_ano_mes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Troca a coluna Periodo pelas colunas Ano e Mes, no mesmo formato das movimentações.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe com a coluna Periodo de calcular_periodos.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as colunas Ano e Mes no início, sem a coluna Periodo.
+    """
+    periodos = df.pop("Periodo").to_numpy()
+    df.insert(0, "Ano", (periodos // 12).astype("int16"))
+    df.insert(
+        1,
+        "Mes",
+        pd.Categorical.from_codes(
+            codes=(periodos % 12).astype("int8"), categories=MESES, ordered=True
+        ),
+    )
+
+    return df
+
+
+def compensar_prejuizos(
+    grupos: np.ndarray, resultado: np.ndarray, prejuizo_inicial: np.ndarray
+) -> dict:
+    """
+    Compensa os prejuízos acumulados de cada grupo nos lucros dos meses seguintes, sem percorrer os meses.
+
+    O prejuízo a compensar segue a regra prejuízo = max(prejuízo anterior - resultado, 0), que é a soma cumulativa
+    de -resultado a partir do prejuízo inicial menos o menor valor negativo já atingido pela soma (como o saldo de
+    valor de calcular_saldos). A soma de cada grupo é feita separadamente (acumular_por_trecho), então os meses de
+    um grupo não alteram o prejuízo dos outros grupos.
+
+    Argumentos:
+        grupos (np.ndarray): Código do grupo de cada linha, com as linhas ordenadas por grupo e, dentro do grupo,
+        em ordem cronológica.
+        resultado (np.ndarray): Resultado tributável do mês.
+        prejuizo_inicial (np.ndarray): Prejuízo a compensar de cada grupo antes da primeira linha, pelo código do
+        grupo.
+
+    Retorna:
+        dict: Arrays com "Prejuízo Anterior", "Prejuízo Compensado", "Base de Cálculo" e "Prejuízo a Compensar"
+        de cada linha.
+    """
+    inicio_grupo = np.ones(len(grupos), dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+
+    soma = prejuizo_inicial[grupos] + acumular_por_trecho(
+        valores=-resultado, inicios=inicio_grupo
+    )
+    minimo = np.minimum(pd.Series(soma).groupby(grupos).cummin().to_numpy(), 0)
+    prejuizo = soma - minimo
+
+    anterior = np.empty(len(grupos))
+    anterior[1:] = prejuizo[:-1]
+    anterior[inicio_grupo] = prejuizo_inicial[grupos[inicio_grupo]]
+    compensado = np.minimum(anterior, np.maximum(resultado, 0))
+
+    return {
+        "Prejuízo Anterior": anterior,
+        "Prejuízo Compensado": compensado,
+        "Base de Cálculo": np.maximum(resultado, 0) - compensado,
+        "Prejuízo a Compensar": prejuizo,
+    }
+
+
+def meses_vazios() -> pd.DataFrame:
+    """
+    Retorna o livro do imposto sem nenhum mês.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe vazio com o período, a classe e os valores de cada mês.
+    """
+    return pd.DataFrame(
+        {
+            "Periodo": pd.Series(dtype=np.int64),
+            "Classe": pd.Series(dtype=object),
+            "Vendas": pd.Series(dtype="float64"),
+            "Resultado": pd.Series(dtype="float64"),
+            "Isento": pd.Series(dtype=bool),
+            "Resultado Tributável": pd.Series(dtype="float64"),
+        }
+    )
+
+
+def apuracao_vazia() -> pd.DataFrame:
+    """
+    Retorna a apuração do imposto sem nenhum mês.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe vazio com o período, o grupo e os valores da apuração de cada mês.
+    """
+    return pd.DataFrame(
+        {
+            "Periodo": pd.Series(dtype=np.int64),
+            "Grupo": pd.Series(dtype=object),
+            "Resultado Tributável": pd.Series(dtype="float64"),
+            "Prejuízo Anterior": pd.Series(dtype="float64"),
+            "Prejuízo Compensado": pd.Series(dtype="float64"),
+            "Base de Cálculo": pd.Series(dtype="float64"),
+            "Prejuízo a Compensar": pd.Series(dtype="float64"),
+        }
+    )
+
+
+def estado_tickers_vazio() -> pd.DataFrame:
+    """
+    Retorna a posição e o custo sem nenhum ticker.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe vazio com a quantidade e o custo, indexado pelo ticker.
+    """
+    return pd.DataFrame(
+        {
+            "Quantidade": pd.Series(dtype="float64"),
+            "Custo": pd.Series(dtype="float64"),
+        },
+        index=pd.Index([], dtype=object, name="Ticker"),
+    )
+
+
+@dataclass
+class ImpostoRenda:
+    """
+    Classe que mantém o livro mensal do imposto de renda sobre o lucro nas vendas, por ano, mês e classe de ativo.
+
+    Regras:
+    - Operações comuns (Ações e BDR): alíquota de 15%, com o lucro das ações isento nos meses em que as vendas de
+      ações somam até LIMITE_ISENCAO_ACOES (float). O prejuízo das ações nos meses isentos continua compensável.
+    - FII: alíquota de 20%, sem isenção.
+    - Day trade: alíquota de 20%, com o resultado do day trade de futuros (Futuros.calcular_day_trade). O extrato
+      de movimentação traz as liquidações das ações e não os negócios, então as vendas de ações, FII e BDR são
+      tratadas como operações comuns, pelo preço médio (calcular_custo_medio).
+    - O prejuízo de cada grupo (GRUPOS_IMPOSTO) é compensado nos lucros dos meses seguintes do mesmo grupo.
+
+    Como em Metricas, atualizar processa somente as movimentações novas quando os extratos recebidos começam pelas
+    mesmas linhas já processadas (continuar): as vendas novas são calculadas a partir da posição e do custo guardados de cada
+    ticker e somadas aos meses em que ocorreram, o day trade de futuros é recalculado somente a partir do primeiro
+    mês das movimentações novas, e a compensação dos prejuízos é refeita a partir desse mês, com o prejuízo a
+    compensar guardado do mês anterior. Nos demais casos, todo o histórico é recalculado.
+    """
+
+    meses: pd.DataFrame = field(default_factory=meses_vazios)
+    apuracao: pd.DataFrame = field(default_factory=apuracao_vazia)
+    estado: pd.DataFrame = field(default_factory=estado_tickers_vazio)
+    linhas: int = 0
+    _processadas: tuple | None = field(default=None, init=False, repr=False)
+
+    def atualizar(self, df: pd.DataFrame, chaves: list | None = None) -> "ImpostoRenda":
+        """
+        Atualiza o livro e a apuração com as movimentações do dataframe que ainda não foram processadas.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com todas as movimentações já tratadas e classificadas, em ordem
+            cronológica. Também aceita uma ConsultaParquet, em que somente as movimentações utilizadas são lidas.
+            chaves (list | None): Chaves dos extratos das movimentações (CacheExtratos.calcular_chave). Sem as
+            chaves, todas as movimentações são recalculadas.
+
+        Retorna:
+            ImpostoRenda: O próprio objeto, com o livro e a apuração atualizados.
+        """
+        continua = continuar(
+            df=df, linhas=self.linhas, processadas=self._processadas, chaves=chaves
+        )
+        if continua:
+            # O day trade é recalculado desde o primeiro mês das movimentações novas, então as movimentações são
+            # lidas desde o início do mês da fronteira
+            data = self._processadas[1]
+            lidas = self._selecionar(
+                df=movimentacoes_desde(df=df, data=data.to_period("M").to_timestamp())
+            )
+            inicio = contar_ate(df=lidas, data=data)
+            novas = lidas.iloc[inicio:]
+            continua = not (
+                novas["Movimentação"].isin(MOVIMENTACOES_EVENTOS).to_numpy()
+                & novas["Ticker"].isin(self.estado.index).to_numpy()
+            ).any()
+        if not continua:
+            self.meses = meses_vazios()
+            self.apuracao = apuracao_vazia()
+            self.estado = estado_tickers_vazio()
+            lidas = self._selecionar(df=df)
+            inicio = 0
+
+        if len(lidas) > inicio:
+            desde = self._incluir(df=lidas, inicio=inicio)
+            self._apurar(desde=desde)
+        self.linhas = len(df)
+        self._processadas = fronteira(df=df, chaves=chaves)
+
+        return self
+
+    @staticmethod
+    def _selecionar(df) -> pd.DataFrame:
+        """
+        Retorna as movimentações em um pandas dataframe. Da ConsultaParquet, somente as colunas de
+        COLUNAS_CALCULO_IMPOSTO (list) das movimentações de posição e dos negócios de futuros são lidas.
+        """
+        if isinstance(df, ConsultaParquet):
+            marcadores = ", ".join("?" for _ in NEGOCIOS_FUTUROS)
+            return df.onde(
+                '"Movimentação" IS NOT NULL AND (regexp_matches("Movimentação", ?) '
+                f'OR ("Classe" = ? AND "Movimentação" IN ({marcadores})))',
+                MOVIMENTACOES_PRECO_MEDIO,
+                "Futuros",
+                *NEGOCIOS_FUTUROS,
+            ).dataframe(colunas=COLUNAS_CALCULO_IMPOSTO)
+
+        return df
+
+    def _incluir(self, df: pd.DataFrame, inicio: int) -> int:
+        """
+        Soma as vendas das movimentações novas (as linhas de df a partir de inicio) aos meses do livro, recalcula o
+        day trade de futuros a partir do primeiro mês das movimentações novas e retorna esse mês (calcular_periodos).
+        """
+        novas = df.iloc[inicio:]
+        desde = int(calcular_periodos(novas["Data"]).min())
+
+        # Vendas de ações, FII e BDR, a partir da posição e do custo guardados de cada ticker
+        movs = novas.loc[
+            selecionar_movimentacoes(df=novas)
+            & novas["Classe"].isin(CLASSES_RESULTADO).to_numpy()
+            & novas["Ticker"].notna().to_numpy()
+        ]
+        tickers = pd.Index(movs["Ticker"].unique()).astype(object)
+        grupos = tickers.get_indexer(movs["Ticker"].astype(object))
+        anterior = self.estado.reindex(tickers)
+        calculo = calcular_custo_medio(
+            grupos=grupos,
+            credito=movs["Entrada/Saída"].to_numpy() == "Credito",
+            grupamento=movs["Movimentação"].to_numpy() == "Grupamento",
+            quantidade=movs["Quantidade"].to_numpy(dtype="float64"),
+            valor=movs["Valor da Operação"].to_numpy(dtype="float64"),
+            quantidade_inicial=anterior["Quantidade"].fillna(0).to_numpy(),
+            custo_inicial=anterior["Custo"].fillna(0).to_numpy(),
+        )
+
+        finais = (
+            pd.DataFrame(
+                {
+                    "Ticker": tickers[grupos],
+                    "Quantidade": calculo["Quantidade"],
+                    "Custo": calculo["Custo"],
+                }
+            )
+            .groupby("Ticker", sort=False)
+            .last()
+        )
+        estado = self.estado.reindex(self.estado.index.union(finais.index))
+        estado.loc[finais.index, ["Quantidade", "Custo"]] = finais
+        estado.index.name = "Ticker"
+        self.estado = estado
+
+        venda = calculo["Quantidade Vendida"] > 0
+        vendas = pd.DataFrame(
+            {
+                "Periodo": calcular_periodos(movs["Data"])[venda],
+                "Classe": movs["Classe"].astype(object).to_numpy()[venda],
+                "Vendas": calculo["Resultado"][venda] + calculo["Custo Venda"][venda],
+                "Resultado": calculo["Resultado"][venda],
+            }
+        )
+
+        # Day trade de futuros: os negócios já processados do primeiro mês podem formar pares com os novos
+        primeiro_dia = pd.Timestamp(year=desde // 12, month=desde % 12 + 1, day=1)
+        por_dia = Futuros().calcular_day_trade(
+            df[(df["Data"] >= primeiro_dia).to_numpy()]
+        )[1]
+        day_trade = pd.DataFrame(
+            {
+                "Periodo": calcular_periodos(por_dia["Data"]),
+                "Classe": "Futuros",
+                "Vendas": 0.0,
+                "Resultado": por_dia["Resultado"].to_numpy(),
+            }
+        )
+
+        mantidos = self.meses[
+            ~((self.meses["Periodo"] >= desde) & (self.meses["Classe"] == "Futuros"))
+        ]
+        somados = (
+            pd.concat(
+                [
+                    mantidos[["Periodo", "Classe", "Vendas", "Resultado"]],
+                    vendas,
+                    day_trade,
+                ]
+            )
+            .groupby(["Periodo", "Classe"], as_index=False)[["Vendas", "Resultado"]]
+            .sum()
+        )
+        self.meses = somados.merge(
+            mantidos[["Periodo", "Classe", "Isento", "Resultado Tributável"]],
+            on=["Periodo", "Classe"],
+            how="left",
+        )
+
+        return desde
+
+    def _apurar(self, desde: int) -> None:
+        """
+        Recalcula a isenção dos meses a partir de desde e a compensação dos prejuízos de cada grupo a partir de
+        desde, com o prejuízo a compensar do último mês anterior de cada grupo.
+        """
+        meses = self.meses
+        recalcular = (meses["Periodo"] >= desde).to_numpy()
+        acoes = (meses["Classe"] == "Ações").to_numpy()
+        vendas_acoes = (
+            meses["Vendas"]
+            .where(acoes, 0)
+            .groupby(meses["Periodo"])
+            .transform("sum")
+            .to_numpy()
+        )
+        isento = (
+            acoes
+            & (vendas_acoes <= LIMITE_ISENCAO_ACOES)
+            & (meses["Resultado"] > 0).to_numpy()
+        )
+        meses.loc[recalcular, "Isento"] = isento[recalcular]
+        meses.loc[recalcular, "Resultado Tributável"] = np.where(
+            isento, 0.0, meses["Resultado"].to_numpy()
+        )[recalcular]
+        meses["Isento"] = meses["Isento"].astype(bool)
+
+        por_grupo = (
+            meses.loc[recalcular]
+            .assign(Grupo=meses.loc[recalcular, "Classe"].map(GRUPOS_IMPOSTO))
+            .groupby(["Grupo", "Periodo"], as_index=False)["Resultado Tributável"]
+            .sum()
+        )
+        anteriores = self.apuracao[self.apuracao["Periodo"] < desde]
+        grupos, nomes = pd.factorize(por_grupo["Grupo"])
+        prejuizo_inicial = (
+            anteriores.groupby("Grupo")["Prejuízo a Compensar"]
+            .last()
+            .reindex(nomes)
+            .fillna(0)
+            .to_numpy(dtype="float64")
+        )
+        calculo = compensar_prejuizos(
+            grupos=grupos,
+            resultado=por_grupo["Resultado Tributável"].to_numpy(dtype="float64"),
+            prejuizo_inicial=prejuizo_inicial,
+        )
+
+        self.apuracao = (
+            pd.concat([anteriores, por_grupo.assign(**calculo)], ignore_index=True)
+            .sort_values(["Grupo", "Periodo"], kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def livro(self) -> pd.DataFrame:
+        """
+        Retorna o livro do imposto, com as vendas e o resultado de cada classe de ativo em cada mês.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_LIVRO_IMPOSTO (list), em ordem
+            cronológica. "Vendas" é zero no day trade de futuros, que é liquidado pelo ajuste diário.
+        """
+        df = self.meses.sort_values(["Periodo", "Classe"], kind="stable").reset_index(
+            drop=True
+        )
+        df["Grupo"] = df["Classe"].map(GRUPOS_IMPOSTO)
+
+        return inserir_ano_mes(df=df)[COLUNAS_LIVRO_IMPOSTO]
+
+    def tabela(self) -> pd.DataFrame:
+        """
+        Retorna a apuração do imposto de cada grupo em cada mês.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_APURACAO (list), em ordem cronológica.
+        """
+        df = self.apuracao.sort_values(["Periodo", "Grupo"], kind="stable").reset_index(
+            drop=True
+        )
+        df["Alíquota"] = df["Grupo"].map(ALIQUOTAS_IMPOSTO)
+        df["Imposto"] = df["Base de Cálculo"] * df["Alíquota"]
+
+        return inserir_ano_mes(df=df)[COLUNAS_APURACAO]
@@ -0,0 +1,192 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from io import BytesIO
+from libs.data_cleaning import contexto_processos, ler_e_tratar_arquivo
+from libs.CacheExtratos import CacheExtratos, ler_bytes
+
+
+# CONSTANTES
+# -----------------------------
+# Estados da leitura de cada extrato
+ESTADO_NA_FILA: str = "Na fila"
+ESTADO_LENDO: str = "Lendo"
+ESTADO_CONCLUIDO: str = "Concluído"
+ESTADO_ERRO: str = "Erro"
+
+# Quantidade máxima de erros de leitura guardados. Os erros mais antigos são descartados
+MAXIMO_ERROS: int = 256
+
+
+@dataclass
+class LeituraExtratos:
+    """
+    Classe que lê e trata os extratos em segundo plano, guardando cada extrato no CacheExtratos assim que termina.
+
+    Os extratos enviados são lidos em outros processos (ou em uma thread, com um único processo), então o app
+    continua respondendo durante a leitura e pode mostrar as análises dos extratos que já terminaram enquanto os
+    demais são lidos. Os menores extratos são enviados primeiro, para que os primeiros dados apareçam antes.
+    A leitura de cada extrato é iniciada uma única vez, mesmo que seja enviado por várias sessões. Os extratos cuja
+    leitura falhou só são lidos novamente quando enviados de novo (repetir_erros).
+
+    Se um dos processos termina de forma inesperada (por exemplo por falta de memória), o executor deixa de aceitar
+    tarefas (BrokenProcessPool): os extratos que estavam na fila ou sendo lidos são marcados com erro, e o executor
+    é descartado e criado novamente na próxima leitura, para que um novo envio leia esses extratos de novo.
+    """
+
+    cache: CacheExtratos
+    processos: int | None = None
+    _executor: ProcessPoolExecutor | ThreadPoolExecutor | None = field(
+        default=None, init=False, repr=False
+    )
+    _tarefas: dict = field(default_factory=dict, init=False, repr=False)
+    _erros: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+    _trava: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def _obter_executor(self) -> ProcessPoolExecutor | ThreadPoolExecutor:
+        if self._executor is None:
+            processos = self.processos or os.cpu_count() or 1
+            if processos <= 1:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=processos, mp_context=contexto_processos()
+                )
+
+        return self._executor
+
+    def _descartar_executor(
+        self, executor: ProcessPoolExecutor | ThreadPoolExecutor
+    ) -> None:
+        """
+        Descarta o executor quebrado, para que a próxima leitura crie um novo. Deve ser chamado com a trava.
+        Os processos do executor quebrado já são encerrados pelo próprio executor, então ele só deixa de ser usado.
+        """
+        if self._executor is executor:
+            self._executor = None
+
+    def enviar(self, extratos, repetir_erros: bool = False) -> list:
+        """
+        Inicia a leitura dos extratos que ainda não estão no cache nem sendo lidos.
+
+        Argumentos:
+            extratos: Extratos enviados para upload ou caminhos dos arquivos.
+            repetir_erros (bool): Lê novamente os extratos cuja leitura falhou, como em um novo upload.
+
+        Retorna:
+            list: Chaves dos extratos (CacheExtratos.calcular_chave), na ordem recebida.
+        """
+        chaves = [self.cache.calcular_chave(extrato=extrato) for extrato in extratos]
+        if repetir_erros:
+            with self._trava:
+                for chave in chaves:
+                    self._erros.pop(chave, None)
+
+        conteudos = {}
+        for chave, extrato in zip(chaves, extratos):
+            with self._trava:
+                iniciado = chave in self._tarefas or chave in self._erros
+            if (
+                not iniciado
+                and chave not in conteudos
+                and self.cache.obter(chave=chave) is None
+            ):
+                conteudos[chave] = ler_bytes(extrato)
+
+        ler = functools.partial(ler_e_tratar_arquivo, compacto=self.cache.compacto)
+        for chave, conteudo in sorted(conteudos.items(), key=lambda item: len(item[1])):
+            with self._trava:
+                # Um executor que quebrou depois da última leitura é descartado, e a leitura vai para um novo
+                # executor. Se o novo executor também não aceitar a leitura, o extrato fica com erro
+                futuro = None
+                for _ in range(2):
+                    executor = self._obter_executor()
+                    try:
+                        futuro = executor.submit(ler, BytesIO(conteudo))
+                        break
+                    except BrokenProcessPool as excecao:
+                        self._descartar_executor(executor=executor)
+                        erro = excecao
+                if futuro is None:
+                    self._registrar_erro(chave=chave, erro=erro)
+                    continue
+                self._tarefas[chave] = futuro
+            futuro.add_done_callback(functools.partial(self._concluir, chave, executor))
+
+        return chaves
+
+    def _concluir(
+        self,
+        chave: str,
+        executor: ProcessPoolExecutor | ThreadPoolExecutor,
+        futuro: Future,
+    ) -> None:
+        """
+        Guarda o extrato lido no cache, ou o erro da leitura, e encerra a tarefa do extrato.
+        Um erro ao guardar o extrato no cache também é registrado como erro da leitura, e a tarefa é sempre
+        encerrada, para que o extrato não fique na fila. Se o executor quebrou, ele é descartado.
+        """
+        erro = None
+        try:
+            erro = futuro.exception()
+            if erro is None:
+                self.cache.guardar(chave=chave, df=futuro.result())
+        except Exception as excecao:
+            erro = excecao
+        finally:
+            with self._trava:
+                if isinstance(erro, BrokenProcessPool):
+                    self._descartar_executor(executor=executor)
+                if erro is not None:
+                    self._registrar_erro(chave=chave, erro=erro)
+                self._tarefas.pop(chave, None)
+
+    def _registrar_erro(self, chave: str, erro: BaseException) -> None:
+        """
+        Guarda o erro da leitura do extrato, descartando os erros mais antigos. Deve ser chamado com a trava.
+        """
+        self._erros[chave] = erro
+        while len(self._erros) > MAXIMO_ERROS:
+            self._erros.popitem(last=False)
+
+    def estados(self, chaves: list) -> dict:
+        """
+        Retorna o estado da leitura de cada extrato.
+
+        Argumentos:
+            chaves (list): Chaves retornadas por enviar.
+
+        Retorna:
+            dict: Estado de cada chave (ESTADO_NA_FILA, ESTADO_LENDO, ESTADO_CONCLUIDO ou ESTADO_ERRO).
+        """
+        estados = {}
+        with self._trava:
+            for chave in chaves:
+                if chave in self._erros:
+                    estados[chave] = ESTADO_ERRO
+                elif chave in self._tarefas:
+                    estados[chave] = (
+                        ESTADO_LENDO
+                        if self._tarefas[chave].running()
+                        else ESTADO_NA_FILA
+                    )
+                else:
+                    estados[chave] = ESTADO_CONCLUIDO
+
+        return estados
+
+    def erro(self, chave: str) -> BaseException | None:
+        """
+        Retorna o erro da leitura do extrato, ou None se a leitura não falhou.
+
+        Argumentos:
+            chave (str): Chave retornada por enviar.
+        """
+        with self._trava:
+            return self._erros.get(chave)
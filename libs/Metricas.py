@@ -0,0 +1,542 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from libs.ConsultaParquet import ConsultaParquet
+from libs.PrecoMedio import (
+    MOVIMENTACOES_EVENTOS,
+    MOVIMENTACOES_PRECO_MEDIO,
+    selecionar_movimentacoes,
+)
+from libs.Rendimentos import Rendimentos
+from libs.BaseSQLite import COLUNAS_CHAVE
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas do estado de cada ticker
+COLUNAS_ESTADO: list = [
+    "Classe",
+    "Quantidade",
+    "Custo",
+    "Resultado Realizado",
+    "Rendimentos",
+]
+
+# Variação máxima (em logaritmo natural) do fator acumulado do custo dentro de um trecho do cálculo vetorizado.
+# Limita os valores intermediários em torno de e^50, longe do limite do float64
+LIMITE_FATOR_CUSTO: float = 30.0
+
+# Colunas das movimentações de posição lidas da ConsultaParquet para o cálculo do estado
+COLUNAS_CALCULO: list = [
+    "Ticker",
+    "Classe",
+    "Movimentação",
+    "Entrada/Saída",
+    "Quantidade",
+    "Valor da Operação",
+]
+
+# Quantidades menores que esta são consideradas zero, para que erros de arredondamento não deixem sobras de posição
+TOLERANCIA_QUANTIDADE: float = 1e-9
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def acumular_por_trecho(valores: np.ndarray, inicios: np.ndarray) -> np.ndarray:
+    """
+    Soma cumulativa que recomeça do zero em cada posição marcada em inicios.
+
+    Soma cada trecho separadamente com a soma compensada do groupby do pandas, que perde menos precisão que a soma
+    linha a linha de somar_por_segmento (usada quando o resultado precisa ser igual ao cálculo linha a linha).
+
+    Argumentos:
+        valores (np.ndarray): Valores a serem somados.
+        inicios (np.ndarray): Array booleano marcando o início de cada trecho.
+
+    Retorna:
+        np.ndarray: Soma cumulativa de cada trecho.
+    """
+    return pd.Series(valores).groupby(np.cumsum(inicios)).cumsum().to_numpy()
+
+
+def deslocar_por_grupo(
+    valores: np.ndarray, inicio_grupo: np.ndarray, iniciais: np.ndarray
+) -> np.ndarray:
+    """
+    Retorna o valor da linha anterior do mesmo grupo, com o valor inicial do grupo na primeira linha.
+
+    Argumentos:
+        valores (np.ndarray): Valores ordenados por grupo.
+        inicio_grupo (np.ndarray): Array booleano marcando a primeira linha de cada grupo.
+        iniciais (np.ndarray): Valor inicial do grupo de cada linha.
+
+    Retorna:
+        np.ndarray: Valor anterior de cada linha.
+    """
+    anteriores = np.empty_like(valores)
+    anteriores[1:] = valores[:-1]
+    anteriores[inicio_grupo] = iniciais[inicio_grupo]
+
+    return anteriores
+
+
+def resolver_recorrencia(
+    fator: np.ndarray,
+    soma: np.ndarray,
+    inicios: np.ndarray,
+    valores_iniciais: np.ndarray,
+) -> np.ndarray:
+    """
+    Resolve x[t] = fator[t] * x[t-1] + soma[t] sem percorrer as linhas, recomeçando em cada trecho marcado em inicios.
+
+    A solução de cada trecho é x[t] = F[t] * (x0 + soma acumulada de soma[k] / F[k]), em que F é o produto acumulado
+    dos fatores. Para que F não fique pequeno demais em trechos longos, os trechos são divididos sempre que o
+    logaritmo de F varia mais que LIMITE_FATOR_CUSTO (float), e o valor final de cada divisão é passado para a
+    seguinte. Como fator > 0 e soma >= 0, todos os termos somados são positivos e não há perda de precisão.
+
+    Argumentos:
+        fator (np.ndarray): Fator de cada linha, maior que zero (exceto na primeira linha de cada trecho).
+        soma (np.ndarray): Valor somado em cada linha, maior ou igual a zero.
+        inicios (np.ndarray): Array booleano marcando a primeira linha de cada trecho.
+        valores_iniciais (np.ndarray): x0 de cada linha, utilizado somente na primeira linha de cada trecho.
+
+    Retorna:
+        np.ndarray: x de cada linha.
+    """
+    log_fator = np.log(np.where(inicios & (fator <= 0), 1.0, fator))
+
+    # Divide os trechos quando o fator acumulado passa de cada múltiplo do limite
+    acumulado = acumular_por_trecho(valores=log_fator, inicios=inicios)
+    faixa = np.floor(-acumulado / LIMITE_FATOR_CUSTO)
+    divisoes = inicios.copy()
+    divisoes[1:] |= faixa[1:] != faixa[:-1]
+    continuacao = divisoes & ~inicios
+
+    log_produto = acumular_por_trecho(valores=log_fator, inicios=divisoes)
+    produto = np.exp(log_produto)
+    local = produto * acumular_por_trecho(
+        valores=soma * np.exp(-log_produto), inicios=divisoes
+    )
+
+    # Valor de entrada de cada divisão: x0 no início do trecho, ou o valor final da divisão anterior
+    posicoes = np.flatnonzero(divisoes)
+    entrada = valores_iniciais[posicoes].astype("float64")
+    fins = np.append(posicoes[1:] - 1, len(fator) - 1)
+    for divisao in np.flatnonzero(continuacao[posicoes]):
+        fim = fins[divisao - 1]
+        entrada[divisao] = local[fim] + produto[fim] * entrada[divisao - 1]
+
+    return local + produto * entrada[np.cumsum(divisoes) - 1]
+
+
+def calcular_custo_medio(
+    grupos: np.ndarray,
+    credito: np.ndarray,
+    grupamento: np.ndarray,
+    quantidade: np.ndarray,
+    valor: np.ndarray,
+    quantidade_inicial: np.ndarray,
+    custo_inicial: np.ndarray,
+) -> dict:
+    """
+    Calcula a posição, o custo pelo preço médio e o resultado de cada venda, para todos os tickers de uma vez.
+
+    Regras, na ordem cronológica de cada ticker:
+    - Entrada: soma a quantidade e o valor ao custo (desdobro entra com valor zero e reduz o preço médio).
+    - Saída: o custo da venda é o preço médio vezes a quantidade vendida, e o resultado é o valor da venda menos
+      esse custo. O preço médio não muda. Vendas maiores que a posição (histórico incompleto) vendem somente a
+      posição, e o valor é proporcional à quantidade que havia em carteira.
+    - Grupamento: a posição passa a ser a quantidade informada, com o mesmo custo.
+
+    A posição é uma soma cumulativa limitada a zero (como em calcular_saldos), e o custo é uma recorrência linear
+    (custo = fator * custo anterior + valor), resolvida por resolver_recorrencia.
+
+    Argumentos:
+        grupos (np.ndarray): Código do ticker de cada linha, com as linhas em ordem cronológica.
+        credito (np.ndarray): Array booleano marcando as entradas.
+        grupamento (np.ndarray): Array booleano marcando os grupamentos.
+        quantidade (np.ndarray): Quantidade da movimentação, sem sinal.
+        valor (np.ndarray): Valor da operação, sem sinal.
+        quantidade_inicial (np.ndarray): Posição de cada ticker antes das movimentações, pelo código do ticker.
+        custo_inicial (np.ndarray): Custo de cada ticker antes das movimentações, pelo código do ticker.
+
+    Retorna:
+        dict: Arrays na ordem recebida com "Quantidade" e "Custo" após cada linha, "Quantidade Vendida",
+        "Custo Venda" e "Resultado" de cada venda.
+    """
+    ordem = np.argsort(grupos, kind="stable")
+    grupos = grupos[ordem]
+    credito = credito[ordem]
+    grupamento = grupamento[ordem]
+    quantidade = np.nan_to_num(quantidade[ordem].astype("float64"))
+    valor = np.abs(np.nan_to_num(valor[ordem].astype("float64")))
+
+    inicio_grupo = np.ones(len(grupos), dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+    quantidade_anterior_grupo = quantidade_inicial[grupos].astype("float64")
+    custo_anterior_grupo = custo_inicial[grupos].astype("float64")
+
+    # Posição: soma cumulativa limitada a zero, recomeçando no início do ticker e em cada grupamento
+    variacao = np.where(credito, quantidade, -quantidade)
+    inicio_posicao = inicio_grupo | grupamento
+    variacao = np.where(grupamento, quantidade, variacao)
+    variacao = np.where(
+        inicio_grupo & ~grupamento, quantidade_anterior_grupo + variacao, variacao
+    )
+    soma = acumular_por_trecho(valores=variacao, inicios=inicio_posicao)
+    minimo = pd.Series(soma).groupby(np.cumsum(inicio_posicao)).cummin().to_numpy()
+    posicao = soma - np.minimum(minimo, 0)
+    posicao[posicao < TOLERANCIA_QUANTIDADE] = 0
+
+    posicao_anterior = deslocar_por_grupo(
+        valores=posicao, inicio_grupo=inicio_grupo, iniciais=quantidade_anterior_grupo
+    )
+    venda = ~credito & ~grupamento
+    vendida = np.where(venda, np.minimum(quantidade, posicao_anterior), 0.0)
+
+    # Custo: nas vendas o custo é multiplicado pela fração da posição que continua em carteira
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fator = np.where(
+            venda & (posicao_anterior > 0), posicao / posicao_anterior, 1.0
+        )
+    acrescimo = np.where(credito & ~grupamento, valor, 0.0)
+    zerada = venda & (posicao == 0)
+    inicio_custo = inicio_grupo | zerada
+    custo = resolver_recorrencia(
+        fator=np.where(zerada, 0.0, fator),
+        soma=acrescimo,
+        inicios=inicio_custo,
+        valores_iniciais=np.where(inicio_grupo & ~zerada, custo_anterior_grupo, 0.0),
+    )
+    custo[posicao == 0] = 0
+
+    custo_anterior = deslocar_por_grupo(
+        valores=custo, inicio_grupo=inicio_grupo, iniciais=custo_anterior_grupo
+    )
+    custo_venda = np.where(venda, custo_anterior - custo, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valor_venda = np.where(
+            venda & (quantidade > 0), valor * vendida / quantidade, 0.0
+        )
+    resultado = np.where(venda, valor_venda - custo_venda, 0.0)
+
+    # Volta para a ordem recebida
+    saida = {}
+    for nome, valores in [
+        ("Quantidade", posicao),
+        ("Custo", custo),
+        ("Quantidade Vendida", vendida),
+        ("Custo Venda", custo_venda),
+        ("Resultado", resultado),
+    ]:
+        saida[nome] = np.empty_like(valores)
+        saida[nome][ordem] = valores
+
+    return saida
+
+
+def estado_vazio() -> pd.DataFrame:
+    """
+    Retorna o estado sem nenhum ticker.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe vazio com as colunas de COLUNAS_ESTADO (list), indexado pelo ticker.
+    """
+    return pd.DataFrame(
+        {
+            "Classe": pd.Series(dtype=object),
+            "Quantidade": pd.Series(dtype="float64"),
+            "Custo": pd.Series(dtype="float64"),
+            "Resultado Realizado": pd.Series(dtype="float64"),
+            "Rendimentos": pd.Series(dtype="float64"),
+        },
+        index=pd.Index([], dtype=object, name="Ticker"),
+    )
+
+
+def hash_linhas(df: pd.DataFrame) -> np.ndarray:
+    """
+    Retorna o hash do conteúdo de cada movimentação.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas.
+
+    Retorna:
+        np.ndarray: Hash das colunas de COLUNAS_CHAVE (list) de cada linha.
+    """
+    return pd.util.hash_pandas_object(df[COLUNAS_CHAVE], index=False).to_numpy()
+
+
+def contar_ate(df, data: pd.Timestamp) -> int:
+    """
+    Retorna a quantidade de movimentações até a data, inclusive.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Movimentações já tratadas, em ordem cronológica.
+        data (pd.Timestamp): Data limite.
+
+    Retorna:
+        int: Quantidade de movimentações com data menor ou igual à data. No pandas dataframe é uma busca binária
+        nas datas ordenadas, sem percorrer as movimentações.
+    """
+    if isinstance(df, ConsultaParquet):
+        return len(df.onde('"Data" <= ?', data))
+
+    return int(df["Data"].searchsorted(data, side="right"))
+
+
+def movimentacoes_desde(df, data: pd.Timestamp, incluir_data: bool = True):
+    """
+    Retorna somente as movimentações a partir da data.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Movimentações já tratadas, em ordem cronológica.
+        data (pd.Timestamp): Data inicial.
+        incluir_data (bool): Se False, retorna somente as movimentações depois da data.
+
+    Retorna:
+        pd.DataFrame | ConsultaParquet: As movimentações a partir da data, do mesmo tipo recebido. A ConsultaParquet
+        recebe a condição da data, e nada é lido.
+    """
+    if isinstance(df, ConsultaParquet):
+        return df.onde(f'"Data" {">=" if incluir_data else ">"} ?', data)
+
+    inicio = df["Data"].searchsorted(data, side="left" if incluir_data else "right")
+
+    return df.iloc[inicio:]
+
+
+def ultima_movimentacao(df, ate: pd.Timestamp | None = None) -> pd.DataFrame:
+    """
+    Retorna a última movimentação, ou a última movimentação até a data.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Movimentações já tratadas, em ordem cronológica.
+        ate (pd.Timestamp | None): Data limite. Se None, considera todas as movimentações.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com a última movimentação, ou vazio se não há movimentações.
+    """
+    if isinstance(df, ConsultaParquet):
+        return (df if ate is None else df.onde('"Data" <= ?', ate)).ultima_linha()
+
+    fim = len(df) if ate is None else contar_ate(df=df, data=ate)
+
+    return df.iloc[max(fim - 1, 0) : fim]
+
+
+def fronteira(df, chaves: list | None) -> tuple | None:
+    """
+    Retorna a fronteira das movimentações processadas: as chaves dos extratos, a data e o hash da última
+    movimentação. Somente a última movimentação é lida.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Movimentações processadas, em ordem cronológica.
+        chaves (list | None): Chaves dos extratos das movimentações (CacheExtratos.calcular_chave).
+
+    Retorna:
+        tuple | None: Chaves, data e hash da última movimentação, ou None sem chaves ou sem movimentações.
+    """
+    if chaves is None:
+        return None
+    ultima = ultima_movimentacao(df=df)
+    if ultima.empty:
+        return None
+
+    return frozenset(chaves), ultima["Data"].iloc[0], int(hash_linhas(df=ultima)[0])
+
+
+def continuar(df, linhas: int, processadas: tuple | None, chaves: list | None) -> bool:
+    """
+    Verifica se as movimentações começam pelas mesmas linhas já processadas, para que somente as movimentações
+    depois da data da fronteira sejam calculadas.
+
+    Os extratos processados precisam continuar entre os extratos enviados (as chaves são o hash do conteúdo, então
+    o extrato não mudou), nenhuma movimentação nova pode estar até a data da fronteira, e a última movimentação até
+    essa data precisa ser a mesma. Somente as datas e a movimentação da fronteira são lidas, e não todo o histórico.
+
+    Argumentos:
+        df (pd.DataFrame | ConsultaParquet): Todas as movimentações, em ordem cronológica.
+        linhas (int): Quantidade de movimentações já processadas.
+        processadas (tuple | None): Fronteira das movimentações processadas, de fronteira.
+        chaves (list | None): Chaves dos extratos das movimentações. Sem chaves, as movimentações são recalculadas.
+
+    Retorna:
+        bool: True se as movimentações depois da data da fronteira podem ser somadas ao estado guardado.
+    """
+    if processadas is None or chaves is None or linhas == 0:
+        return False
+
+    chaves_processadas, data, hash_ultima = processadas
+    if not chaves_processadas <= set(chaves) or contar_ate(df=df, data=data) != linhas:
+        return False
+
+    return int(hash_linhas(df=ultima_movimentacao(df=df, ate=data))[0]) == hash_ultima
+
+
+@dataclass
+class Metricas:
+    """
+    Classe que mantém a posição, o custo, o preço médio, o resultado realizado e os rendimentos de cada ticker.
+
+    O estado de cada ticker é atualizado somente com as movimentações novas: atualizar guarda quantas linhas já
+    foram processadas e a fronteira delas (as chaves dos extratos, a data e o hash da última movimentação), e quando
+    os extratos processados continuam entre os enviados e as movimentações novas estão depois da data da fronteira
+    (por exemplo um extrato de um mês novo) somente as movimentações depois dessa data são lidas e calculadas, a
+    partir do estado guardado (continuar). Nos demais casos (um extrato removido ou um extrato antigo incluído
+    depois), o estado é recalculado. O estado também é recalculado quando as linhas novas têm um desdobro ou
+    grupamento de um ticker do estado, pois nos dados ajustados (EventosCorporativos.ajustar) o evento altera as
+    quantidades das linhas já processadas.
+
+    As movimentações de posição são as mesmas do PrecoMedio (MOVIMENTACOES_PRECO_MEDIO), e os rendimentos são as
+    movimentações de Rendimentos. O preço médio é o custo médio de calcular_custo_medio, em que a venda baixa o
+    custo pelo preço médio e não muda o preço médio. É diferente do preço médio da tabela do PrecoMedio, que mantém
+    o cálculo original do app e baixa o valor da venda do saldo de valor (o preço médio muda com o lucro ou o
+    prejuízo de cada venda parcial).
+    """
+
+    estado: pd.DataFrame = field(default_factory=estado_vazio)
+    linhas: int = 0
+    _processadas: tuple | None = field(default=None, init=False, repr=False)
+
+    def atualizar(self, df: pd.DataFrame, chaves: list | None = None) -> "Metricas":
+        """
+        Atualiza o estado com as movimentações do dataframe que ainda não foram processadas.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com todas as movimentações já tratadas e classificadas, em ordem
+            cronológica. Também aceita uma ConsultaParquet, em que somente as movimentações utilizadas são lidas.
+            chaves (list | None): Chaves dos extratos das movimentações (CacheExtratos.calcular_chave). Sem as
+            chaves, todas as movimentações são recalculadas.
+
+        Retorna:
+            Metricas: O próprio objeto, com o estado atualizado.
+        """
+        continua = continuar(
+            df=df, linhas=self.linhas, processadas=self._processadas, chaves=chaves
+        )
+        if continua:
+            movs, rendimentos = self._selecionar(
+                df=movimentacoes_desde(
+                    df=df, data=self._processadas[1], incluir_data=False
+                )
+            )
+            continua = not (
+                movs["Movimentação"].isin(MOVIMENTACOES_EVENTOS).to_numpy()
+                & movs["Ticker"].isin(self.estado.index).to_numpy()
+            ).any()
+        if not continua:
+            self.estado = estado_vazio()
+            movs, rendimentos = self._selecionar(df=df)
+
+        if len(movs) or len(rendimentos):
+            self._incluir(movs=movs, rendimentos=rendimentos)
+        self.linhas = len(df)
+        self._processadas = fronteira(df=df, chaves=chaves)
+
+        return self
+
+    @staticmethod
+    def _selecionar(df) -> tuple[pd.DataFrame, pd.Series]:
+        """
+        Retorna as movimentações de posição e a soma dos rendimentos por ticker e classe. Da ConsultaParquet,
+        somente as colunas de COLUNAS_CALCULO (list) das movimentações de posição são lidas, e os rendimentos são
+        somados pelo duckdb.
+        """
+        rendimentos = Rendimentos().pegar_somente_rendimentos(df=df)
+        if isinstance(df, ConsultaParquet):
+            movs = df.onde(
+                '"Movimentação" IS NOT NULL AND regexp_matches("Movimentação", ?)',
+                MOVIMENTACOES_PRECO_MEDIO,
+            ).dataframe(colunas=COLUNAS_CALCULO)
+            rendimentos = rendimentos.agrupar(colunas=["Ticker", "Classe"])
+        else:
+            movs = df.loc[selecionar_movimentacoes(df=df)]
+            rendimentos = rendimentos.groupby(["Ticker", "Classe"], observed=True)[
+                "Valor da Operação"
+            ].sum()
+
+        return movs, rendimentos
+
+    def _incluir(self, movs: pd.DataFrame, rendimentos: pd.Series) -> None:
+        """
+        Soma as movimentações de posição e os rendimentos novos ao estado guardado de cada ticker.
+        """
+        movs = movs[movs["Ticker"].notna()]
+        rendimentos = rendimentos.reset_index()
+        rendimentos = rendimentos[rendimentos["Ticker"].notna()]
+
+        tickers = pd.Index(movs["Ticker"].unique()).astype(object)
+        grupos = tickers.get_indexer(movs["Ticker"].astype(object))
+        anterior = self.estado.reindex(tickers)
+        calculo = calcular_custo_medio(
+            grupos=grupos,
+            credito=movs["Entrada/Saída"].to_numpy() == "Credito",
+            grupamento=movs["Movimentação"].to_numpy() == "Grupamento",
+            quantidade=movs["Quantidade"].to_numpy(dtype="float64"),
+            valor=movs["Valor da Operação"].to_numpy(dtype="float64"),
+            quantidade_inicial=anterior["Quantidade"].fillna(0).to_numpy(),
+            custo_inicial=anterior["Custo"].fillna(0).to_numpy(),
+        )
+
+        # Estado final de cada ticker: valores da última movimentação e soma dos resultados
+        calculado = pd.DataFrame(
+            {
+                "Ticker": tickers[grupos],
+                "Quantidade": calculo["Quantidade"],
+                "Custo": calculo["Custo"],
+                "Resultado": calculo["Resultado"],
+            }
+        ).groupby("Ticker", sort=False)
+        finais = calculado[["Quantidade", "Custo"]].last()
+        resultados = calculado["Resultado"].sum()
+
+        # Somente os tickers com movimentações de posição ou rendimentos entram no estado
+        utilizadas = pd.concat(
+            [
+                movs[["Ticker", "Classe"]].astype(object),
+                rendimentos[["Ticker", "Classe"]].astype(object),
+            ]
+        )
+        classes = utilizadas.groupby("Ticker")["Classe"].last()
+        estado = self.estado.reindex(
+            self.estado.index.union(classes.index.astype(object))
+        )
+        estado.index.name = "Ticker"
+        estado.loc[classes.index, "Classe"] = classes.astype(object)
+        estado.loc[finais.index, ["Quantidade", "Custo"]] = finais
+        estado["Resultado Realizado"] = (
+            estado["Resultado Realizado"].fillna(0).add(resultados, fill_value=0)
+        )
+        estado["Rendimentos"] = (
+            estado["Rendimentos"]
+            .fillna(0)
+            .add(
+                rendimentos.groupby(rendimentos["Ticker"].astype(str))[
+                    "Valor da Operação"
+                ].sum(),
+                fill_value=0,
+            )
+        )
+        estado[["Quantidade", "Custo"]] = estado[["Quantidade", "Custo"]].fillna(0)
+        self.estado = estado[COLUNAS_ESTADO]
+
+    def tabela(self) -> pd.DataFrame:
+        """
+        Retorna as métricas de cada ticker, com o preço médio da posição em carteira.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe por ticker com classe, quantidade, preço médio, custo,
+            resultado realizado e rendimentos, com as posições em carteira primeiro.
+        """
+        df = self.estado.copy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df.insert(
+                2,
+                "Preço Médio",
+                np.where(df["Quantidade"] > 0, df["Custo"] / df["Quantidade"], np.nan),
+            )
+
+        df = df.sort_index()
+
+        return df.iloc[np.argsort(~(df["Quantidade"].to_numpy() > 0), kind="stable")]
@@ -0,0 +1,201 @@
+import math
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from libs.ConsultaParquet import COLUNAS_CONSULTA, ConsultaParquet
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas de texto em que a pesquisa das tabelas paginadas procura o texto digitado
+COLUNAS_PESQUISA: list = [
+    "Entrada/Saída",
+    "Mes",
+    "Ticker",
+    "Descrição Ticker",
+    "Classe",
+    "Movimentação",
+    "Instituição",
+    "Contrato",
+    "Sentido",
+]
+
+# Quantidade de linhas de cada página quando nenhum tamanho é informado
+TAMANHO_PAGINA: int = 1_000
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def pesquisar_coluna(coluna: pd.Series, texto: str) -> np.ndarray:
+    """
+    Verifica quais linhas da coluna contêm o texto, sem diferenciar maiúsculas e minúsculas.
+    Nas colunas de categoria a pesquisa é feita somente nas categorias, e não em cada linha.
+
+    Argumentos:
+        coluna (pd.Series): Coluna de texto ou de categoria.
+        texto (str): Texto pesquisado.
+
+    Retorna:
+        np.ndarray: Array de bool com True nas linhas que contêm o texto.
+    """
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        categorias = pd.Series(coluna.cat.categories.astype(str))
+        encontradas = np.flatnonzero(
+            categorias.str.contains(texto, case=False, regex=False).to_numpy()
+        )
+
+        return np.isin(coluna.cat.codes.to_numpy(), encontradas)
+
+    return (
+        coluna.astype("string")
+        .str.contains(texto, case=False, regex=False)
+        .fillna(False)
+        .to_numpy(dtype=bool)
+    )
+
+
+@dataclass
+class Paginacao:
+    """
+    Classe que pagina, ordena e pesquisa as linhas de uma tabela no servidor, para que somente as linhas da página
+    sejam enviadas para o navegador.
+
+    No pandas dataframe a pesquisa e a ordenação são calculadas uma única vez e guardadas como as posições das
+    linhas, então trocar de página apenas seleciona as posições da página. Na ConsultaParquet a pesquisa, a
+    ordenação e a página são enviadas para o duckdb.
+
+    A tabela é identificada pela chave (extratos, filtros e tabela mostrada), e não pelo objeto do dataframe, que é
+    montado novamente a cada execução do app. A paginação guarda somente as posições e recebe a tabela em cada
+    método, então não mantém uma referência para a tabela inteira.
+
+    A ordenação é estável: as linhas com o mesmo valor mantêm a ordem original, e os valores vazios ficam no final.
+    """
+
+    chave: str
+    pesquisa: str = ""
+    ordenar_por: str | None = None
+    crescente: bool = True
+    tamanho_pagina: int = TAMANHO_PAGINA
+    _posicoes: np.ndarray | None = field(default=None, init=False, repr=False)
+    _linhas: int | None = field(default=None, init=False, repr=False)
+
+    def mesma_tabela(
+        self,
+        chave: str,
+        pesquisa: str,
+        ordenar_por: str | None,
+        crescente: bool,
+    ) -> bool:
+        """
+        Verifica se a paginação foi montada para a mesma tabela, pesquisa e ordenação, para ser reaproveitada.
+
+        Argumentos:
+            chave (str): Chave da tabela mostrada, que muda quando os extratos, os filtros ou a tabela mudam.
+            pesquisa (str): Texto pesquisado.
+            ordenar_por (str | None): Coluna da ordenação, ou None para a ordem original.
+            crescente (bool): Se True, ordem crescente.
+
+        Retorna:
+            bool: True se a paginação pode ser reaproveitada.
+        """
+        return (
+            self.chave == chave
+            and self.pesquisa == pesquisa
+            and self.ordenar_por == ordenar_por
+            and self.crescente == crescente
+        )
+
+    def consulta(self, df: ConsultaParquet) -> ConsultaParquet:
+        """
+        Retorna a ConsultaParquet com a pesquisa e a ordenação.
+
+        Argumentos:
+            df (ConsultaParquet): Tabela mostrada.
+        """
+        consulta = df
+        if self.pesquisa:
+            consulta = consulta.pesquisar(
+                texto=self.pesquisa,
+                colunas=[c for c in COLUNAS_PESQUISA if c in COLUNAS_CONSULTA],
+            )
+        if self.ordenar_por:
+            consulta = consulta.ordenar(
+                coluna=self.ordenar_por, crescente=self.crescente
+            )
+
+        return consulta
+
+    def posicoes(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Retorna as posições das linhas do dataframe que contêm o texto pesquisado, na ordem selecionada.
+        As posições são calculadas somente na primeira chamada.
+
+        Argumentos:
+            df (pd.DataFrame): Tabela mostrada.
+        """
+        if self._posicoes is None:
+            posicoes = np.arange(len(df))
+
+            if self.pesquisa:
+                encontradas = np.zeros(len(df), dtype=bool)
+                for coluna in COLUNAS_PESQUISA:
+                    if coluna in df.columns:
+                        encontradas |= pesquisar_coluna(
+                            coluna=df[coluna], texto=self.pesquisa
+                        )
+                posicoes = posicoes[encontradas]
+
+            if self.ordenar_por:
+                valores = df[self.ordenar_por].iloc[posicoes].reset_index(drop=True)
+                ordem = valores.sort_values(
+                    ascending=self.crescente, kind="stable", na_position="last"
+                ).index.to_numpy()
+                posicoes = posicoes[ordem]
+
+            self._posicoes = posicoes
+
+        return self._posicoes
+
+    def linhas(self, df: pd.DataFrame | ConsultaParquet) -> int:
+        """
+        Retorna a quantidade de linhas encontradas pela pesquisa.
+
+        Argumentos:
+            df (pd.DataFrame | ConsultaParquet): Tabela mostrada.
+        """
+        if self._linhas is None:
+            if isinstance(df, ConsultaParquet):
+                self._linhas = len(self.consulta(df=df))
+            else:
+                self._linhas = len(self.posicoes(df=df))
+
+        return self._linhas
+
+    def paginas(self, df: pd.DataFrame | ConsultaParquet) -> int:
+        """
+        Retorna a quantidade de páginas, no mínimo uma página mesmo sem linhas.
+
+        Argumentos:
+            df (pd.DataFrame | ConsultaParquet): Tabela mostrada.
+        """
+        return max(math.ceil(self.linhas(df=df) / self.tamanho_pagina), 1)
+
+    def pagina(self, df: pd.DataFrame | ConsultaParquet, numero: int) -> pd.DataFrame:
+        """
+        Retorna somente as linhas da página.
+
+        Argumentos:
+            df (pd.DataFrame | ConsultaParquet): Tabela mostrada.
+            numero (int): Número da página, começando em 1.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as linhas da página.
+        """
+        inicio = (min(max(numero, 1), self.paginas(df=df)) - 1) * self.tamanho_pagina
+
+        if isinstance(df, ConsultaParquet):
+            return self.consulta(df=df).pagina(
+                inicio=inicio, tamanho=self.tamanho_pagina
+            )
+
+        return df.iloc[self.posicoes(df=df)[inicio : inicio + self.tamanho_pagina]]
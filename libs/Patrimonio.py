@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from libs.ConsultaParquet import ConsultaParquet
+from libs.PrecoMedio import MOVIMENTACOES_PRECO_MEDIO, selecionar_movimentacoes
+from libs.Metricas import calcular_custo_medio
+from libs.ResultadoRealizado import CLASSES_RESULTADO
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas das posições diárias, na ordem apresentada
+COLUNAS_PATRIMONIO: list = [
+    "Data",
+    "Ticker",
+    "Classe",
+    "Quantidade",
+    "Custo",
+    "Fechamento",
+    "Valor de Mercado",
+]
+
+# Colunas das movimentações de posição lidas da ConsultaParquet
+COLUNAS_MOVIMENTACOES: list = [
+    "Data",
+    "Ticker",
+    "Classe",
+    "Movimentação",
+    "Entrada/Saída",
+    "Quantidade",
+    "Valor da Operação",
+]
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def ajustar_cotacoes(cotacoes: pd.DataFrame, eventos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajusta os preços de fechamento pelos desdobros e grupamentos, da mesma forma que as movimentações.
+
+    Cada cotação é dividida pelo "Fator Ajuste" do primeiro evento do ticker posterior à data da cotação, que já
+    inclui os eventos seguintes. O evento é encontrado com merge_asof para todas as cotações de uma vez.
+
+    Argumentos:
+        cotacoes (pd.DataFrame): Pandas dataframe com as colunas Data, Ticker e Fechamento, ordenado por data.
+        eventos (pd.DataFrame): Eventos de EventosCorporativos.eventos.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as cotações, com o Fechamento ajustado.
+    """
+    eventos = eventos[["Data", "Ticker", "Fator Ajuste"]].astype({"Ticker": object})
+    ajustadas = pd.merge_asof(
+        cotacoes,
+        eventos.sort_values("Data", kind="stable"),
+        on="Data",
+        by="Ticker",
+        direction="forward",
+        allow_exact_matches=False,
+    )
+    ajustadas["Fechamento"] = ajustadas["Fechamento"] / ajustadas.pop(
+        "Fator Ajuste"
+    ).fillna(1.0)
+
+    return ajustadas
+
+
+@dataclass
+class Patrimonio:
+    """
+    Classe que calcula o valor de mercado diário da carteira de Ações, FII e BDR.
+
+    A posição de cada ticker em cada dia é a última posição (calcular_custo_medio) até o dia, e o preço é o último
+    fechamento até o dia. As duas são encontradas com merge_asof para todos os tickers e dias de uma vez, sem
+    percorrer os dias.
+    """
+
+    def posicoes_diarias(
+        self,
+        df: pd.DataFrame,
+        cotacoes: pd.DataFrame,
+        eventos: pd.DataFrame | None = None,
+    ) -> pd.DataFrame:
+        """
+        Monta a posição e o valor de mercado de cada ticker em carteira em cada dia de pregão das cotações.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com todas as movimentações já tratadas e classificadas, em ordem
+            cronológica. Também aceita uma ConsultaParquet, em que somente as colunas de COLUNAS_MOVIMENTACOES (list)
+            das movimentações consideradas no cálculo são lidas.
+            cotacoes (pd.DataFrame): Cotações de BaseCotacoes.ler, sem ajuste.
+            eventos (pd.DataFrame | None): Eventos de EventosCorporativos.eventos, quando as movimentações estão
+            ajustadas pelos desdobros e grupamentos, para ajustar também as cotações.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_PATRIMONIO (list), uma linha por ticker
+            em carteira e dia, a partir da primeira movimentação de cada ticker. Tickers sem cotação não aparecem.
+        """
+        if isinstance(df, ConsultaParquet):
+            marcadores = ", ".join("?" for _ in CLASSES_RESULTADO)
+            df = df.onde(
+                '"Movimentação" IS NOT NULL AND regexp_matches("Movimentação", ?) '
+                f'AND "Classe" IN ({marcadores})',
+                MOVIMENTACOES_PRECO_MEDIO,
+                *CLASSES_RESULTADO,
+            ).dataframe(colunas=COLUNAS_MOVIMENTACOES)
+
+        movs = df.loc[
+            selecionar_movimentacoes(df=df)
+            & df["Classe"].isin(CLASSES_RESULTADO).to_numpy()
+            & df["Ticker"].notna().to_numpy()
+        ]
+        grupos, tickers = pd.factorize(movs["Ticker"])
+        zeros = np.zeros(len(tickers))
+
+        calculo = calcular_custo_medio(
+            grupos=grupos,
+            credito=movs["Entrada/Saída"].to_numpy() == "Credito",
+            grupamento=movs["Movimentação"].to_numpy() == "Grupamento",
+            quantidade=movs["Quantidade"].to_numpy(dtype="float64"),
+            valor=movs["Valor da Operação"].to_numpy(dtype="float64"),
+            quantidade_inicial=zeros,
+            custo_inicial=zeros,
+        )
+
+        precos = cotacoes[["Data", "Ticker", "Fechamento"]].astype({"Ticker": object})
+        if eventos is not None and not eventos.empty:
+            precos = ajustar_cotacoes(cotacoes=precos, eventos=eventos)
+
+        # Os tickers com movimentação e cotação são trocados por códigos inteiros, em ordem alfabética, para
+        # que os merge_asof comparem inteiros e a grade já saia ordenada por data e ticker
+        tickers = pd.Index(np.sort(precos["Ticker"].unique())).intersection(
+            tickers.astype(object)
+        )
+        codigos_movs = tickers.get_indexer(movs["Ticker"].astype(object))
+        codigos_precos = tickers.get_indexer(precos["Ticker"])
+        precos = pd.DataFrame(
+            {
+                "Data": precos["Data"].to_numpy()[codigos_precos >= 0],
+                "Codigo": codigos_precos[codigos_precos >= 0],
+                "Fechamento": precos["Fechamento"].to_numpy()[codigos_precos >= 0],
+            }
+        )
+
+        # Posição no fim de cada dia com movimentação: a última linha do ticker no dia
+        posicoes = pd.DataFrame(
+            {
+                "Data": pd.to_datetime(movs["Data"].to_numpy()),
+                "Codigo": codigos_movs,
+                "Quantidade": calculo["Quantidade"],
+                "Custo": calculo["Custo"],
+            }
+        )[codigos_movs >= 0].drop_duplicates(subset=["Codigo", "Data"], keep="last")
+        classes = (
+            pd.Series(movs["Classe"].astype(object).to_numpy()[codigos_movs >= 0])
+            .groupby(codigos_movs[codigos_movs >= 0])
+            .last()
+            .reindex(np.arange(len(tickers)))
+            .to_numpy()
+        )
+
+        # Todos os dias de pregão, a partir da primeira movimentação, para todos os tickers
+        dias = np.unique(precos["Data"].to_numpy())
+        dias = dias[dias >= posicoes["Data"].min()] if len(posicoes) else dias[:0]
+        grade = pd.DataFrame(
+            {
+                "Data": np.repeat(dias, len(tickers)),
+                "Codigo": np.tile(np.arange(len(tickers)), len(dias)),
+            }
+        )
+        grade = pd.merge_asof(
+            grade, posicoes.sort_values("Data", kind="stable"), on="Data", by="Codigo"
+        )
+        grade = pd.merge_asof(grade, precos, on="Data", by="Codigo")
+        grade = grade[(grade["Quantidade"] > 0) & grade["Fechamento"].notna()]
+
+        codigos = grade.pop("Codigo").to_numpy()
+        grade.insert(1, "Ticker", tickers.to_numpy()[codigos])
+        grade.insert(2, "Classe", classes[codigos])
+        grade["Valor de Mercado"] = grade["Quantidade"] * grade["Fechamento"]
+
+        return grade.reset_index(drop=True)[COLUNAS_PATRIMONIO]
+
+    def por_classe(self, posicoes: pd.DataFrame) -> pd.DataFrame:
+        """
+        Soma o valor de mercado das posições diárias por classe de ativo.
+
+        Argumentos:
+            posicoes (pd.DataFrame): Posições diárias de posicoes_diarias.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe indexado pela data, com o valor de mercado de cada classe de
+            ativo, o valor total ("Total") e o custo total ("Custo") da carteira.
+        """
+        df = posicoes.pivot_table(
+            index="Data",
+            columns="Classe",
+            values="Valor de Mercado",
+            aggfunc="sum",
+            fill_value=0,
+            observed=True,
+        )
+        df.columns = list(df.columns)
+        df["Total"] = df.sum(axis=1)
+        df["Custo"] = posicoes.groupby("Data")["Custo"].sum()
+
+        return df
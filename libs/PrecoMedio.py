@@ -1,60 +1,208 @@
 import pandas as pd
+import numpy as np
 from dataclasses import dataclass
+from libs.ConsultaParquet import ConsultaParquet
 
 # PANDAS CONFIG
 # -----------------------------
 pd.set_option("future.no_silent_downcasting", True)
 
 
+# CONSTANTES
+# -----------------------------
+# Movimentações consideradas no cálculo do saldo e do preço médio
+MOVIMENTACOES_PRECO_MEDIO: str = "Transferência - Liquidação|Grupamento|Desdobro"
+
+# Movimentações de eventos corporativos que alteram a quantidade de ações sem alterar o custo
+MOVIMENTACOES_EVENTOS: list = ["Desdobro", "Grupamento"]
+
+
 @dataclass
 class PrecoMedio:
     """
     Classe que trata o cáculo do preço médio dos ativos.
 
-    Para calcular corretamente, o ativo precisa ser agrupado para que o cálculo seja feito apenas em um ativo.
+    O cálculo é feito para todos os ativos ao mesmo tempo, agrupando as movimentações por ticker.
     """
 
-    # TODO: Facilitar o cálculo do preço médio
     def calcular_preco_medio(self, df: pd.DataFrame) -> pd.DataFrame:
-        mask = df["Movimentação"].str.contains(
-            "Transferência - Liquidação|Grupamento|Desdobro"
-        )
-        df.loc[mask, "Saldo Quantidade"] = df.loc[mask, "Quantidade"].where(
-            df.loc[mask, "Entrada/Saída"] == "Credito", -df.loc[mask, "Quantidade"]
-        )
-        df.loc[mask, "Saldo Valor"] = df.loc[mask, "Valor da Operação"].where(
-            df.loc[mask, "Entrada/Saída"] == "Credito",
-            -df.loc[mask, "Valor da Operação"],
-        )
+        """
+        Calcula o saldo de valor, o saldo de quantidade e o preço médio de cada ticker.
+
+        O saldo é acumulado na ordem das movimentações de cada ticker. Quando o saldo de valor fica negativo
+        (venda total) o saldo de valor e de quantidade voltam para zero, e no grupamento o saldo de quantidade
+        passa a ser a quantidade informada na movimentação.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas. Também aceita uma ConsultaParquet,
+            em que somente as movimentações consideradas no cálculo são lidas e retornadas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas "Saldo Quantidade", "Saldo Valor" e "Preço Médio"
+            preenchidas nas movimentações consideradas no cálculo.
+        """
+        if isinstance(df, ConsultaParquet):
+            df = df.onde(
+                '"Movimentação" IS NOT NULL AND regexp_matches("Movimentação", ?)',
+                MOVIMENTACOES_PRECO_MEDIO,
+            ).dataframe()
+
+        df = df.copy()
+        mask = selecionar_movimentacoes(df=df)
+        movs = df.loc[mask]
 
-        # Cálculo manual de soma cumulativa para considerar cenários de venda total, grupamento ou desdobramento
-        # TODO: verificar outra forma de calcular agrupamento e desdobramentos
-        # Mais prático atualizar todas as movimentações a partir da data de agrupamento/desdobro e utilizar função cumsum
-        # apenas nas movimentações de entrada e saída
-        saldo_valor = 0
-        saldo_valores = []
-        saldo_quantidade = 0
-        saldo_quantidades = []
-        for idx, row in df[mask].iterrows():
-            if row["Movimentação"] in ["Grupamento"]:
-                saldo_quantidade = row["Quantidade"]
-            else:
-                saldo_quantidade += row["Saldo Quantidade"]
-            saldo_valor += row["Saldo Valor"]
-            if saldo_valor < 0:
-                saldo_valor = 0
-                saldo_quantidade = 0
-            saldo_valores.append(saldo_valor)
-            saldo_quantidades.append(saldo_quantidade)
-        df.loc[mask, "Saldo Valor"] = saldo_valores
-        df.loc[mask, "Saldo Quantidade"] = saldo_quantidades
-        df.loc[mask, "Preço Médio"] = df.loc[mask].apply(
-            lambda row: (
-                abs(row["Saldo Valor"] / row["Saldo Quantidade"])
-                if row["Saldo Quantidade"] > 0
-                else row["Valor da Operação"] / row["Quantidade"]
-            ),
-            axis=1,
+        credito = movs["Entrada/Saída"].to_numpy() == "Credito"
+        grupamento = movs["Movimentação"].to_numpy() == "Grupamento"
+        quantidade = movs["Quantidade"].to_numpy(dtype="float64")
+        valor = movs["Valor da Operação"].to_numpy(dtype="float64")
+        grupos = pd.factorize(movs["Ticker"], use_na_sentinel=False)[0]
+
+        saldo_valor, saldo_quantidade = calcular_saldos(
+            grupos=grupos,
+            valor=np.where(credito, valor, -valor),
+            quantidade=np.where(credito, quantidade, -quantidade),
+            grupamento=grupamento,
+            quantidade_grupamento=quantidade,
         )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            preco_medio = np.where(
+                saldo_quantidade > 0,
+                np.abs(saldo_valor / saldo_quantidade),
+                valor / quantidade,
+            )
+
+        df.loc[mask, "Saldo Quantidade"] = saldo_quantidade
+        df.loc[mask, "Saldo Valor"] = saldo_valor
+        df.loc[mask, "Preço Médio"] = preco_medio
 
         return df
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def selecionar_movimentacoes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Marca as movimentações consideradas no cálculo do saldo e do preço médio, de MOVIMENTACOES_PRECO_MEDIO (str).
+    O padrão é verificado apenas nos valores únicos de movimentação, e não em cada linha.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas.
+
+    Retorna:
+        np.ndarray: Array booleano com True nas movimentações consideradas.
+    """
+    movimentacoes = df["Movimentação"].dropna().unique()
+    movimentacoes = movimentacoes[
+        pd.Series(movimentacoes).str.contains(MOVIMENTACOES_PRECO_MEDIO).to_numpy()
+    ]
+
+    return df["Movimentação"].isin(movimentacoes).to_numpy()
+
+
+def somar_por_segmento(valores: np.ndarray, inicios: np.ndarray) -> np.ndarray:
+    """
+    Soma cumulativa que recomeça do zero em cada posição marcada em inicios.
+
+    Cada segmento é somado separadamente, na ordem das linhas, então o resultado é o mesmo de somar as linhas uma a
+    uma e não depende dos valores dos outros segmentos. Os segmentos com tamanhos próximos (na mesma potência de 2)
+    são colocados nas linhas de uma matriz, completada com zeros no final, e somados juntos com np.cumsum.
+
+    Argumentos:
+        valores (np.ndarray): Valores a serem somados.
+        inicios (np.ndarray): Array booleano marcando o início de cada segmento.
+
+    Retorna:
+        np.ndarray: Soma cumulativa de cada segmento.
+    """
+    valores = np.asarray(valores, dtype="float64")
+    soma = np.empty(len(valores))
+    if len(valores) == 0:
+        return soma
+
+    posicoes = np.flatnonzero(inicios)
+    if len(posicoes) == 0 or posicoes[0] != 0:
+        posicoes = np.insert(posicoes, 0, 0)
+    tamanhos = np.diff(np.append(posicoes, len(valores)))
+    faixas = np.ceil(np.log2(tamanhos)).astype(np.int64)
+
+    for faixa in np.unique(faixas):
+        segmentos = np.flatnonzero(faixas == faixa)
+        colunas = np.arange(tamanhos[segmentos].max())
+        preenchidas = colunas < tamanhos[segmentos][:, None]
+        linhas = (posicoes[segmentos][:, None] + colunas)[preenchidas]
+        matriz = np.zeros(preenchidas.shape)
+        matriz[preenchidas] = valores[linhas]
+        soma[linhas] = np.cumsum(matriz, axis=1)[preenchidas]
+
+    return soma
+
+
+def calcular_saldos(
+    grupos: np.ndarray,
+    valor: np.ndarray,
+    quantidade: np.ndarray,
+    grupamento: np.ndarray,
+    quantidade_grupamento: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula o saldo de valor e de quantidade acumulado de cada grupo, sem percorrer as linhas.
+
+    O saldo de valor segue a regra saldo = max(saldo anterior + valor, 0): as linhas em que o saldo fica negativo
+    são as vendas totais, em que os saldos voltam para zero. Com as vendas totais conhecidas, o saldo de valor é
+    uma soma cumulativa que recomeça após cada venda total. As vendas totais são estimadas pela soma cumulativa
+    menos o menor valor já atingido pela soma, e a estimativa é corrigida recalculando a soma até que as vendas
+    totais não mudem (cada recálculo acerta ao menos a primeira venda total errada, e normalmente basta um).
+    O saldo de quantidade é uma soma cumulativa que recomeça após cada venda total e em cada grupamento, que
+    inicia o segmento com a quantidade informada. Os saldos são os mesmos de percorrer as linhas uma a uma.
+
+    Argumentos:
+        grupos (np.ndarray): Código do grupo (ticker) de cada linha, com as linhas em ordem cronológica.
+        valor (np.ndarray): Valor da movimentação com sinal (positivo na entrada, negativo na saída).
+        quantidade (np.ndarray): Quantidade da movimentação com sinal (positivo na entrada, negativo na saída).
+        grupamento (np.ndarray): Array booleano marcando as movimentações de grupamento.
+        quantidade_grupamento (np.ndarray): Quantidade após o grupamento, usada nas linhas de grupamento.
+
+    Retorna:
+        tuple[np.ndarray, np.ndarray]: Saldo de valor e saldo de quantidade de cada linha, na ordem recebida.
+    """
+    # Ordena por grupo mantendo a ordem cronológica dentro de cada grupo
+    ordem = np.argsort(grupos, kind="stable")
+    grupos = grupos[ordem]
+    valor = valor[ordem]
+    inicio_grupo = np.ones(len(grupos), dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+
+    # Estimativa das vendas totais: linhas em que a soma atinge um novo mínimo negativo
+    soma = somar_por_segmento(valores=valor, inicios=inicio_grupo)
+    minimo = np.minimum(pd.Series(soma).groupby(grupos).cummin().to_numpy(), 0)
+    minimo_anterior = np.zeros(len(minimo))
+    minimo_anterior[1:] = minimo[:-1]
+    minimo_anterior[inicio_grupo] = 0
+    venda_total = soma < minimo_anterior
+
+    # Saldo de valor: soma cumulativa que recomeça após cada venda total, até as vendas totais não mudarem
+    while True:
+        inicio_valor = inicio_grupo.copy()
+        inicio_valor[1:] |= venda_total[:-1]
+        soma = somar_por_segmento(valores=valor, inicios=inicio_valor)
+        if np.array_equal(soma < 0, venda_total):
+            break
+        venda_total = soma < 0
+    saldo_valor = np.where(venda_total, 0, soma)
+
+    # Saldo de quantidade: recomeça no início do grupo, após cada venda total e em cada grupamento
+    grupamento = grupamento[ordem]
+    inicio_quantidade = inicio_valor | grupamento
+    saldo_quantidade = somar_por_segmento(
+        valores=np.where(grupamento, quantidade_grupamento[ordem], quantidade[ordem]),
+        inicios=inicio_quantidade,
+    )
+    saldo_quantidade[venda_total] = 0
+
+    # Volta para a ordem recebida
+    saida_valor = np.empty_like(saldo_valor)
+    saida_quantidade = np.empty_like(saldo_quantidade)
+    saida_valor[ordem] = saldo_valor
+    saida_quantidade[ordem] = saldo_quantidade
+
+    return saida_valor, saida_quantidade
@@ -1,5 +1,6 @@
 import pandas as pd
 from dataclasses import dataclass
+from libs.ConsultaParquet import ConsultaParquet
 
 # PANDAS CONFIG
 # -----------------------------
@@ -33,10 +34,15 @@ class Rendimentos:
 
         Argumentos:
             df (pd.DataFrame): Pandas dataframe com as movimentações dos extratos para tratamento inicial.
+            Também aceita uma ConsultaParquet, que retorna a consulta somente com as movimentações de rendimento.
 
         Retorna:
             df (pd.DataFrame): Pandas dataframe com os dados tratados e somente com as movimentações de rendimento informadas em TIPOS_DE_RENDIMENTO (list).
         """
+        if isinstance(df, ConsultaParquet):
+            marcadores = ", ".join("?" for _ in TIPOS_DE_RENDIMENTO)
+            return df.onde(f'"Movimentação" IN ({marcadores})', *TIPOS_DE_RENDIMENTO)
+
         df = df[df["Movimentação"].isin(TIPOS_DE_RENDIMENTO)]
 
         return df
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from libs.ConsultaParquet import ConsultaParquet
+from libs.PrecoMedio import MOVIMENTACOES_PRECO_MEDIO, selecionar_movimentacoes
+from libs.Metricas import calcular_custo_medio
+
+# PANDAS CONFIG
+# -----------------------------
+pd.set_option("future.no_silent_downcasting", True)
+
+
+# CONSTANTES
+# -----------------------------
+# Classes de ativo com resultado realizado calculado pelo preço médio
+CLASSES_RESULTADO: list = ["Ações", "FII", "BDR"]
+
+# Colunas do livro de resultados, na ordem apresentada
+COLUNAS_RESULTADO: list = [
+    "Ano",
+    "Mes",
+    "Data",
+    "Ticker",
+    "Descrição Ticker",
+    "Classe",
+    "Movimentação",
+    "Instituição",
+    "Quantidade",
+    "Preço unitário",
+    "Preço Médio",
+    "Valor Venda",
+    "Custo Venda",
+    "Valor da Operação",
+]
+
+# Colunas das movimentações lidas da ConsultaParquet: as colunas dos filtros, mantidas nas vendas, e as do cálculo
+COLUNAS_CALCULO_RESULTADO: list = COLUNAS_RESULTADO[:8] + [
+    "Entrada/Saída",
+    "Quantidade",
+    "Valor da Operação",
+]
+
+
+@dataclass
+class ResultadoRealizado:
+    """
+    Classe que calcula o resultado realizado (lucro ou prejuízo) de cada venda de Ações, FII e BDR.
+
+    Cada venda é comparada com o preço médio do ticker no momento da venda, calculado com todas as movimentações
+    anteriores do ticker (compras, vendas, desdobros e grupamentos). O cálculo é feito para todos os tickers de uma
+    vez por calcular_custo_medio, sem percorrer as linhas.
+    """
+
+    def calcular_resultado(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Monta o livro de resultados, com uma linha por venda.
+
+        As vendas mantêm as colunas dos filtros (ano, mês, ticker, movimentação e instituição), e a coluna
+        "Valor da Operação" recebe o resultado da venda, para que o livro possa ser agrupado pelas Tabelas
+        da mesma forma que as movimentações.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com todas as movimentações já tratadas e classificadas. O histórico
+            deve estar completo, pois o preço médio depende das compras anteriores às vendas. Também aceita uma
+            ConsultaParquet, em que somente as colunas de COLUNAS_CALCULO_RESULTADO (list) das movimentações
+            consideradas no cálculo são lidas.
+
+        Retorna:
+            df (pd.DataFrame): Pandas dataframe com as colunas de COLUNAS_RESULTADO (list), uma linha por venda.
+        """
+        if isinstance(df, ConsultaParquet):
+            marcadores = ", ".join("?" for _ in CLASSES_RESULTADO)
+            df = df.onde(
+                '"Movimentação" IS NOT NULL AND regexp_matches("Movimentação", ?) '
+                f'AND "Classe" IN ({marcadores})',
+                MOVIMENTACOES_PRECO_MEDIO,
+                *CLASSES_RESULTADO,
+            ).dataframe(colunas=COLUNAS_CALCULO_RESULTADO)
+
+        movs = df.loc[
+            selecionar_movimentacoes(df=df)
+            & df["Classe"].isin(CLASSES_RESULTADO).to_numpy()
+            & df["Ticker"].notna().to_numpy()
+        ]
+        grupos, tickers = pd.factorize(movs["Ticker"])
+        zeros = np.zeros(len(tickers))
+
+        calculo = calcular_custo_medio(
+            grupos=grupos,
+            credito=movs["Entrada/Saída"].to_numpy() == "Credito",
+            grupamento=movs["Movimentação"].to_numpy() == "Grupamento",
+            quantidade=movs["Quantidade"].to_numpy(dtype="float64"),
+            valor=movs["Valor da Operação"].to_numpy(dtype="float64"),
+            quantidade_inicial=zeros,
+            custo_inicial=zeros,
+        )
+
+        # Somente as vendas de posições em carteira geram resultado
+        venda = calculo["Quantidade Vendida"] > 0
+        vendas = movs.loc[venda, COLUNAS_CALCULO_RESULTADO[:8]].copy()
+        quantidade = calculo["Quantidade Vendida"][venda]
+        valor_venda = calculo["Resultado"][venda] + calculo["Custo Venda"][venda]
+
+        vendas["Quantidade"] = quantidade
+        vendas["Preço unitário"] = valor_venda / quantidade
+        vendas["Preço Médio"] = calculo["Custo Venda"][venda] / quantidade
+        vendas["Valor Venda"] = valor_venda
+        vendas["Custo Venda"] = calculo["Custo Venda"][venda]
+        vendas["Valor da Operação"] = calculo["Resultado"][venda]
+
+        return vendas[COLUNAS_RESULTADO]
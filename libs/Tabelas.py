@@ -1,6 +1,15 @@
+import weakref
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from libs.data_cleaning import *
+from libs.Diagnostico import Diagnostico
+from libs.ConsultaParquet import ConsultaParquet, materializar
+
+
+# CONSTANTES
+# -----------------------------
+# Colunas do cubo agregado utilizado pelas tabelas
+COLUNAS_CUBO: list = ["Ticker", "Movimentação", "Ano", "Mes"]
 
 
 @dataclass
@@ -11,8 +20,62 @@ class Tabelas:
     Os dados são primeiramente separados pelo tipo de ativo, e depois informados no tipo de tabela a ser apresentado.
     As tabelas são basicamente agrupamento de ativos por período, mes, ano, ticker, ou qualquer outro tipod de
     agrupoamento de dados que traga informação relevante para o usuário.
+
+    As tabelas por período, ticker e tipo são calculadas a partir de um único agrupamento por
+    Ticker, Movimentação, Ano e Mes, feito uma vez para cada dataframe recebido e reaproveitado pelas demais tabelas.
+    O dataframe não deve ser alterado depois de utilizado, pois o agrupamento fica guardado enquanto ele existir.
+    Cada tabela é medida pelo diagnostico informado, que por padrão fica desligado.
+
+    As tabelas também aceitam uma ConsultaParquet no lugar do dataframe, e nesse caso os agrupamentos são calculados
+    pelo duckdb direto nos arquivos parquet, sem ler as movimentações para a memória.
     """
 
+    diagnostico: Diagnostico = field(default_factory=Diagnostico, repr=False)
+    _cubos: dict = field(default_factory=dict, init=False, repr=False)
+
+    def _agrupar(self, df: pd.DataFrame, colunas: list) -> pd.Series:
+        """
+        Soma o valor da operação pelas colunas informadas, a partir do cubo agregado do dataframe.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas.
+            colunas (list): Colunas de COLUNAS_CUBO (list) para o agrupamento.
+
+        Retorna:
+            pd.Series: Soma do valor da operação agrupada pelas colunas informadas.
+        """
+        if isinstance(df, ConsultaParquet):
+            return df.agrupar(colunas=colunas)
+
+        chave = id(df)
+        referencia, cubo = self._cubos.get(chave, (None, None))
+
+        if referencia is None or referencia() is not df:
+            cubo = df.groupby(COLUNAS_CUBO, observed=True, dropna=False)[
+                "Valor da Operação"
+            ].sum()
+            self._cubos[chave] = (weakref.ref(df), cubo)
+            weakref.finalize(df, self._cubos.pop, chave, None)
+
+        return cubo.groupby(level=colunas, observed=True).sum()
+
+    def _somar(self, df: pd.DataFrame, colunas: list, coluna: str) -> pd.Series:
+        """
+        Soma a coluna agrupada pelas colunas informadas, no pandas ou no duckdb quando df é uma ConsultaParquet.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações já tratadas.
+            colunas (list): Colunas para o agrupamento.
+            coluna (str): Coluna somada.
+
+        Retorna:
+            pd.Series: Soma da coluna agrupada pelas colunas informadas.
+        """
+        if isinstance(df, ConsultaParquet):
+            return df.agrupar(colunas=colunas, coluna=coluna)
+
+        return df.groupby(colunas, observed=True)[coluna].sum()
+
     def por_periodo(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Recebe os dados limpos e retona um dataframe com as movimentações agrupadas por período (mes e ano).
@@ -23,11 +86,17 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações agrupadas por período.
         """
-        df = df.groupby(["Ano", "Mes"], observed=True)["Valor da Operação"].sum()
-        df = df.unstack(level=1).sort_values(by="Ano", ascending=False).fillna(value=0)
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(etapa="Tabelas.por_periodo", entrada=df) as etapa:
+            df = self._agrupar(df=df, colunas=["Ano", "Mes"])
+            df = (
+                df.unstack(level=1)
+                .sort_values(by="Ano", ascending=False)
+                .fillna(value=0)
+            )
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
 
@@ -41,13 +110,13 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações agrupadas por ticker, mes e ano.
         """
-        df = df.groupby(["Ticker", "Ano", "Mes"], observed=True)[
-            "Valor da Operação"
-        ].sum()
-        df = df.unstack().sort_values(by="Ticker", ascending=True).fillna(value=0)
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(etapa="Tabelas.ticker_mensal", entrada=df) as etapa:
+            df = self._agrupar(df=df, colunas=["Ticker", "Ano", "Mes"])
+            df = df.unstack().sort_values(by="Ticker", ascending=True).fillna(value=0)
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
 
@@ -61,11 +130,13 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações por ticker e ano.
         """
-        df = df.groupby(["Ticker", "Ano"], observed=True)["Valor da Operação"].sum()
-        df = df.unstack().sort_values(by="Ticker", ascending=True).fillna(value=0)
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(etapa="Tabelas.ticker_anual", entrada=df) as etapa:
+            df = self._agrupar(df=df, colunas=["Ticker", "Ano"])
+            df = df.unstack().sort_values(by="Ticker", ascending=True).fillna(value=0)
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
 
@@ -79,13 +150,17 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações de rendimento por tipo, mes e ano.
         """
-        df = df.groupby(["Movimentação", "Ano", "Mes"], observed=True)[
-            "Valor da Operação"
-        ].sum()
-        df = df.unstack().sort_values(by="Movimentação", ascending=True).fillna(value=0)
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(etapa="Tabelas.tipo_mensal", entrada=df) as etapa:
+            df = self._agrupar(df=df, colunas=["Movimentação", "Ano", "Mes"])
+            df = (
+                df.unstack()
+                .sort_values(by="Movimentação", ascending=True)
+                .fillna(value=0)
+            )
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
 
@@ -99,16 +174,73 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações agrupadas por tipo e ano.
         """
-        df = df.groupby(["Movimentação", "Ano"], observed=True)[
-            "Valor da Operação"
-        ].sum()
-        df = df.unstack().sort_values(by="Movimentação", ascending=True).fillna(value=0)
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(etapa="Tabelas.tipo_anual", entrada=df) as etapa:
+            df = self._agrupar(df=df, colunas=["Movimentação", "Ano"])
+            df = (
+                df.unstack()
+                .sort_values(by="Movimentação", ascending=True)
+                .fillna(value=0)
+            )
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
 
+    def planilhas(self, df: pd.DataFrame, prefixo: str) -> tuple[list, list]:
+        """
+        Monta o extrato e todas as tabelas do ativo para a exportação em excel com várias planilhas.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações do ativo já tratadas.
+            prefixo (str): Prefixo do nome das planilhas, normalmente o nome do ativo.
+
+        Retorna:
+            tuple[list, list]: Lista com os dataframes e lista com os nomes das planilhas.
+        """
+        dfs = [
+            materializar(df=df),
+            self.por_periodo(df=df).reset_index(),
+            self.ticker_mensal(df=df).reset_index(),
+            self.ticker_anual(df=df).reset_index(),
+            self.tipo_mensal(df=df).reset_index(),
+            self.tipo_anual(df=df).reset_index(),
+        ]
+        nome_planilhas = [
+            f"{prefixo} Extrato Consolidado",
+            f"{prefixo} Por Período",
+            f"{prefixo} Ticker Mensal",
+            f"{prefixo} Tiker Anual",
+            f"{prefixo} Tipo Mensal",
+            f"{prefixo} Tipo Anual",
+        ]
+
+        return dfs, nome_planilhas
+
+    def planilhas_futuros(self, df: pd.DataFrame) -> tuple[list, list]:
+        """
+        Monta o extrato e as tabelas de futuros para a exportação em excel com várias planilhas.
+
+        Argumentos:
+            df (pd.DataFrame): Pandas dataframe com as movimentações de futuros já tratadas.
+
+        Retorna:
+            tuple[list, list]: Lista com os dataframes e lista com os nomes das planilhas.
+        """
+        dfs = [
+            materializar(df=df),
+            self.futuros_por_dia(df=df).reset_index(),
+            self.futuros_por_periodo(df=df).reset_index(),
+        ]
+        nome_planilhas = [
+            "Futuros Extrato Consolidado",
+            "Futuros Por Dia",
+            "Futuros Por Período",
+        ]
+
+        return dfs, nome_planilhas
+
     # MARK: Tabelas Futuros
     # Com o objetivo de demonstrar os ganhos com daytrade em ativos futuros,
     # a lógica da tabela deste tipo de ativo é um pouco diferente e por isso
@@ -124,15 +256,19 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações agrupadas por dia.
         """
-        df = df.groupby(["Data", "Ticker"])["Preço unitário"].sum()
-        df = df.unstack(level=1).sort_values(by="Data", ascending=True).fillna(value=0)
-        for ticker in df.columns:
-            if "WDO" in ticker:
-                df[f"{ticker}"] = df[ticker] * 10
-            elif "WIN" in ticker:
-                df[f"{ticker}"] = df[ticker] * 0.20
-        df["Total"] = df.sum(axis=1)
-        df["Média"] = df.filter(regex="[^Total]").mean(axis=1)
+        with self.diagnostico.medir(
+            etapa="Tabelas.futuros_por_dia", entrada=df
+        ) as etapa:
+            df = self._somar(df=df, colunas=["Data", "Ticker"], coluna="Preço unitário")
+            df = (
+                df.unstack(level=1)
+                .sort_values(by="Data", ascending=True)
+                .fillna(value=0)
+            )
+            df = df.mul(valor_do_ponto(df.columns), axis=1)
+            df["Total"] = df.sum(axis=1)
+            df["Média"] = df.filter(regex="[^Total]").mean(axis=1)
+            etapa.registrar(df)
 
         return df
 
@@ -146,21 +282,21 @@ class Tabelas:
         Retorna:
             df (pd.DataFrame): Pandas dataframe com as movimentações agrupadas por ticker, mes e ano.
         """
-        df = df.groupby(
-            ["Ticker", "Mes", "Ano"],
-            observed=True,
-        )["Preço unitário"].sum()
-        df = (
-            df.unstack(level=1).sort_values(by="Ticker", ascending=True).fillna(value=0)
-        )
-        for index in df.index:
-            ticker = index[0]
-            if "WDO" in ticker:
-                df.loc[index] *= 10
-            elif "WIN" in ticker:
-                df.loc[index] *= 0.20
-        df = df.assign(
-            Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
-        )
+        with self.diagnostico.medir(
+            etapa="Tabelas.futuros_por_periodo", entrada=df
+        ) as etapa:
+            df = self._somar(
+                df=df, colunas=["Ticker", "Mes", "Ano"], coluna="Preço unitário"
+            )
+            df = (
+                df.unstack(level=1)
+                .sort_values(by="Ticker", ascending=True)
+                .fillna(value=0)
+            )
+            df = df.mul(valor_do_ponto(df.index.get_level_values("Ticker")), axis=0)
+            df = df.assign(
+                Total=df.sum(axis=1), Média=df.filter(regex="[^Total]").mean(axis=1)
+            )
+            etapa.registrar(df)
 
         return df
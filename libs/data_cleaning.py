@@ -1,5 +1,11 @@
+import os
+import importlib.util
+import multiprocessing
 import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from libs.Diagnostico import Diagnostico, DIAGNOSTICO_INATIVO
 
 # CONSTANTES
 # Meses em ordem cronológica
@@ -18,32 +24,188 @@ MESES: list = [
     "Dezembro",
 ]
 
+# Tipos de dados compactos utilizados por compactar_dados
+# Colunas com poucos valores distintos viram categorias e os textos livres utilizam strings do arrow
+TIPOS_COMPACTOS: dict = {
+    "Entrada/Saída": "category",
+    "Ano": "int16",
+    "Semana": "UInt8",
+    "Ticker": "string[pyarrow]",
+    "Descrição Ticker": "string[pyarrow]",
+    "Movimentação": "category",
+    "Instituição": "category",
+}
+
+# Colunas do extrato da B3 utilizadas no tratamento dos dados
+COLUNAS_EXTRATO: list = [
+    "Entrada/Saída",
+    "Data",
+    "Movimentação",
+    "Produto",
+    "Instituição",
+    "Quantidade",
+    "Preço unitário",
+    "Valor da Operação",
+]
+
+# Colunas de valores em que a B3 informa "-" quando não há valor
+COLUNAS_VALORES: list = ["Preço unitário", "Valor da Operação"]
+
+# Classes de ativos atribuídas por classificar_ativos
+# As regras são verificadas nesta ordem e o ativo fica com a primeira classe em que se encaixar
+CLASSES_ATIVOS: list = ["Futuros", "FII", "BDR", "Ações", "Outros"]
+
+# Especificações dos contratos futuros pelo código do ativo-objeto (três primeiras letras do ticker)
+# Valor do Ponto: valor em reais de cada ponto do contrato; Tick: variação mínima do preço em pontos
+# Para incluir um novo contrato basta adicionar o código do ativo-objeto e as especificações
+CONTRATOS_FUTUROS: dict = {
+    "WDO": {"Valor do Ponto": 10.0, "Tick": 0.5},
+    "WIN": {"Valor do Ponto": 0.20, "Tick": 5.0},
+    "DOL": {"Valor do Ponto": 50.0, "Tick": 0.5},
+    "IND": {"Valor do Ponto": 1.0, "Tick": 5.0},
+    "BIT": {"Valor do Ponto": 0.1, "Tick": 5.0},
+}
+
+# Padrões utilizados nas regras de classificação dos ativos
+# Futuros: código do ativo-objeto seguido da letra do mês de vencimento e do ano (ex.: WDOF24)
+PADRAO_FUTUROS: str = rf"(?:{'|'.join(CONTRATOS_FUTUROS)})[FGHJKMNQUVXZ]\d{{2}}"
+PADRAO_FII_DESCRICAO: str = (
+    "FII|INVESTIMENTO IMOBILIARIO|INVESTIMENTO IMOBILIÁRIO|INV IMOB"
+)
+PADRAO_FII_TICKER: str = "11"
+PADRAO_BDR_TICKER: str = "35|34|33|32|31"
+PADRAO_ACOES_TICKER: str = "3|4"
+
+# Quantidade de linhas convertidas por vez na escrita de excel em streaming
+TAMANHO_BLOCO_EXCEL: int = 10_000
+
+# Motores de leitura de excel em ordem de preferência e o módulo necessário para cada um
+# O calamine (Rust) é bem mais rápido, o openpyxl é utilizado caso ele não esteja instalado
+MOTORES_EXCEL: dict = {
+    "calamine": "python_calamine",
+    "openpyxl": "openpyxl",
+}
+
 
 # FUNÇOES AUXILIARES
 # -----------------------------
+# Escolher o motor de leitura de excel disponível
+def escolher_motor_excel() -> str:
+    """
+    Retorna o primeiro motor de leitura de excel de MOTORES_EXCEL (dict) que estiver instalado.
+
+    Retorna:
+        str: Nome do motor para o argumento engine do pd.read_excel.
+    """
+    for motor, modulo in MOTORES_EXCEL.items():
+        if importlib.util.find_spec(modulo) is not None:
+            return motor
+
+    return "openpyxl"
+
+
+# Ler um extrato e transformar em dataframe
+def ler_arquivo(extrato, motor: str | None = None) -> pd.DataFrame:
+    """
+    Lê um único extrato e transforma em dataframe.
+    São lidas apenas as colunas informadas em COLUNAS_EXTRATO (list), e o "-" das colunas de valores é
+    substituído por 0.
+
+    Argumentos:
+        extrato: Extrato no formato em excel (.xlsx) para leitura, enviado para upload ou caminho do arquivo.
+        motor (str | None): Motor de leitura do excel. Se None, utiliza o retornado por escolher_motor_excel.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as movimentações do extrato
+    """
+    df = pd.read_excel(
+        io=extrato,
+        engine=motor or escolher_motor_excel(),
+        usecols=COLUNAS_EXTRATO,
+    )
+
+    return converter_valores(df=df)
+
+
+# Converter as colunas de valores do extrato em números
+def converter_valores(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Substitui o "-" das colunas de COLUNAS_VALORES (list) por 0 e converte as colunas para float.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe com as colunas do extrato original.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com as colunas de valores numéricas.
+    """
+    for coluna in COLUNAS_VALORES:
+        df[coluna] = df[coluna].where(df[coluna] != "-", 0).astype("float64")
+
+    return df
+
+
+# Executar uma função em cada extrato, em paralelo quando houver mais de um extrato
+def processar_em_paralelo(funcao, extratos, processos: int | None = None) -> list:
+    """
+    Executa a função em cada um dos extratos utilizando vários processos.
+    A leitura de excel é limitada pelo GIL, por isso são utilizados processos ao invés de threads.
+
+    Argumentos:
+        funcao: Função que recebe um extrato. Precisa ser definida no nível do módulo para ser enviada aos processos.
+        extratos: Extratos enviados para upload ou caminhos dos arquivos.
+        processos (int | None): Quantidade máxima de processos. Se None, utiliza a quantidade de CPUs.
+
+    Retorna:
+        list: Resultados da função na mesma ordem dos extratos enviados.
+    """
+    # Arquivos enviados pelo upload são convertidos em BytesIO para poderem ser enviados aos processos
+    extratos = [
+        BytesIO(extrato.getvalue()) if hasattr(extrato, "getvalue") else extrato
+        for extrato in extratos
+    ]
+    processos = min(processos or os.cpu_count() or 1, len(extratos))
+
+    if processos <= 1:
+        return [funcao(extrato) for extrato in extratos]
+
+    with ProcessPoolExecutor(
+        max_workers=processos, mp_context=contexto_processos()
+    ) as executor:
+        return list(executor.map(funcao, extratos))
+
+
+def contexto_processos():
+    """
+    Retorna o contexto do multiprocessing utilizado para criar os processos.
+    O forkserver evita copiar o estado do servidor do Streamlit para cada processo.
+
+    Retorna:
+        Contexto forkserver, ou spawn quando o forkserver não está disponível no sistema.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload([__name__])
+        return contexto
+
+    return multiprocessing.get_context("spawn")
+
+
 # Ler extratos e transformar em um dataframe único
-def ler_arquivos(extratos) -> pd.DataFrame:
+def ler_arquivos(extratos, processos: int | None = None) -> pd.DataFrame:
     """
     Lê todos os extratos enviados e transforma em um dataframe único.
+    Os extratos são lidos em paralelo e concatenados na ordem em que foram enviados.
 
     Argumentos:
         extratos: Extratos enviados para upload no formato em excel (.xlsx) para leitura.
+        processos (int | None): Quantidade máxima de processos para a leitura. Se None, utiliza a quantidade de CPUs.
 
     Retorna:
         df (pd.DataFrame): Pandas datraframe com todos os extratos em um único dataframe
     """
-    dfs = []
-    transformar_em_zero = lambda x: 0 if x == "-" else x
-
-    for extrato in extratos:
-        df = pd.read_excel(
-            io=extrato,
-            converters={
-                "Preço unitário": transformar_em_zero,
-                "Valor da Operação": transformar_em_zero,
-            },
-        )
-        dfs.append(df)
+    dfs = processar_em_paralelo(
+        funcao=ler_arquivo, extratos=extratos, processos=processos
+    )
 
     df = pd.concat(dfs, ignore_index=True)
 
@@ -51,12 +213,13 @@ def ler_arquivos(extratos) -> pd.DataFrame:
 
 
 # Tratamento inicial dos dados para análise
-def tratar_dados(df: pd.DataFrame) -> pd.DataFrame:
+def tratar_dados(df: pd.DataFrame, compacto: bool = False) -> pd.DataFrame:
     """
     Processa os dados do extrato e retorna um dataframe padronizado para análise.
 
     Argumentos:
         df (pd.DataFrame): Pandas dataframe com os extratos originais para tratamento.
+        compacto (bool): Se True, converte as colunas para os tipos de TIPOS_COMPACTOS (dict) para ocupar menos memória.
 
     Retorna:
         df (pd.DataFrame): Pandas dataframe com os dados tratados para posterior análise.
@@ -71,18 +234,22 @@ def tratar_dados(df: pd.DataFrame) -> pd.DataFrame:
 
     # Criar mask do df original para separar apenas onde a descrição do ticket contém
     # as iniciais de ativos futuros para nomear o ticker
-    mask = df["Descrição Ticker"].str.contains("WDO|WIN")
+    mask = df["Descrição Ticker"].str.contains(PADRAO_FUTUROS)
     df.loc[mask, "Descrição Ticker"] = (
         df.loc[mask, "Descrição Ticker"] + " - " + df.loc[mask, "Ticker"]
     )
     df.loc[mask, "Ticker"] = df.loc[mask, "Descrição Ticker"].str[:6]
 
+    # O nome do mês vem da lista MESES pelo número do mês, sem depender do locale pt_BR do sistema
     df = df.assign(
         Semana=df["Data"].dt.isocalendar().week,
-        Mes=df["Data"].dt.month_name(locale="pt_BR"),
+        Mes=pd.Categorical.from_codes(
+            codes=df["Data"].dt.month.sub(1).fillna(-1).astype("int8"),
+            categories=MESES,
+            ordered=True,
+        ),
         Ano=df["Data"].dt.year,
     )
-    df["Mes"] = pd.Categorical(df["Mes"], categories=MESES, ordered=True)
     df = df[
         [
             "Entrada/Saída",
@@ -99,7 +266,131 @@ def tratar_dados(df: pd.DataFrame) -> pd.DataFrame:
             "Valor da Operação",
         ]
     ]
-    df = df.sort_values("Data", ascending=True)
+    # A B3 lista as movimentações da mais recente para a mais antiga. Invertendo o extrato antes da ordenação
+    # estável, as movimentações do mesmo dia ficam em ordem cronológica e sempre na mesma ordem
+    df = df.iloc[::-1].sort_values("Data", ascending=True, kind="stable")
+
+    if compacto:
+        df = compactar_dados(df=df)
+
+    return df
+
+
+# Converter o dataframe tratado para tipos de dados compactos
+def compactar_dados(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas do dataframe tratado para os tipos informados em TIPOS_COMPACTOS (dict).
+    Pode ser aplicada novamente após concatenar dataframes, que perdem as categorias quando elas são diferentes.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe já tratado.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com os tipos de dados compactos.
+    """
+    tipos = {
+        coluna: tipo for coluna, tipo in TIPOS_COMPACTOS.items() if coluna in df.columns
+    }
+
+    return df.astype(tipos)
+
+
+# Classificar os ativos em Ações, FII, BDR, Futuros ou Outros
+def classificar_ativos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adiciona a coluna "Classe" com a classe de cada ativo, conforme CLASSES_ATIVOS (list).
+
+    As regras são aplicadas uma única vez para cada combinação de ticker e descrição, e não para cada linha,
+    e depois distribuídas para todas as movimentações.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe já tratado.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com a coluna "Classe" após a coluna "Descrição Ticker".
+    """
+    colunas = ["Ticker", "Descrição Ticker"]
+    grupos = (
+        df.groupby(colunas, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    )
+    ativos = df[colunas].drop_duplicates()
+    ticker = ativos["Ticker"].astype(str)
+    descricao = ativos["Descrição Ticker"].astype(str)
+
+    regras = [
+        descricao.str.contains(PADRAO_FUTUROS),
+        descricao.str.contains(PADRAO_FII_DESCRICAO)
+        & ticker.str.contains(PADRAO_FII_TICKER),
+        ticker.str.contains(PADRAO_BDR_TICKER),
+        ticker.str.contains(PADRAO_ACOES_TICKER) & (ticker.str.len() == 5),
+    ]
+    classes = np.select(
+        condlist=[regra.to_numpy() for regra in regras],
+        choicelist=range(len(regras)),
+        default=CLASSES_ATIVOS.index("Outros"),
+    )
+
+    df = df.copy()
+    df.insert(
+        loc=df.columns.get_loc("Descrição Ticker") + 1,
+        column="Classe",
+        value=pd.Categorical.from_codes(classes[grupos], categories=CLASSES_ATIVOS),
+    )
+
+    return df
+
+
+# Valor do ponto dos contratos futuros
+def valor_do_ponto(tickers) -> np.ndarray:
+    """
+    Retorna o valor do ponto de cada ticker de contrato futuro conforme CONTRATOS_FUTUROS (dict).
+    Tickers que não estão em CONTRATOS_FUTUROS recebem valor 1.
+
+    Argumentos:
+        tickers: Lista, index ou series com os tickers dos contratos.
+
+    Retorna:
+        np.ndarray: Valor do ponto de cada ticker, na mesma ordem recebida.
+    """
+    valores = {
+        codigo: contrato["Valor do Ponto"]
+        for codigo, contrato in CONTRATOS_FUTUROS.items()
+    }
+
+    return (
+        pd.Series(tickers, dtype="object")
+        .str[:3]
+        .map(valores)
+        .fillna(1)
+        .to_numpy(dtype="float64")
+    )
+
+
+# Ler e tratar um extrato, utilizado na leitura em paralelo
+def ler_e_tratar_arquivo(
+    extrato, compacto: bool = False, diagnostico: Diagnostico | None = None
+) -> pd.DataFrame:
+    """
+    Lê um único extrato e retorna o dataframe já tratado para análise, com a classe de cada ativo.
+
+    Argumentos:
+        extrato: Extrato no formato em excel (.xlsx) para leitura, enviado para upload ou caminho do arquivo.
+        compacto (bool): Se True, utiliza os tipos de dados compactos de TIPOS_COMPACTOS (dict).
+        diagnostico (Diagnostico | None): Diagnóstico que mede a leitura, o tratamento e a classificação.
+
+    Retorna:
+        df (pd.DataFrame): Pandas dataframe com os dados tratados para posterior análise.
+    """
+    diagnostico = diagnostico or DIAGNOSTICO_INATIVO
+
+    with diagnostico.medir(etapa="ler_arquivo") as etapa:
+        df = etapa.registrar(ler_arquivo(extrato=extrato))
+
+    with diagnostico.medir(etapa="tratar_dados", entrada=df) as etapa:
+        df = etapa.registrar(tratar_dados(df=df, compacto=compacto))
+
+    with diagnostico.medir(etapa="classificar_ativos", entrada=df) as etapa:
+        df = etapa.registrar(classificar_ativos(df=df))
 
     return df
 
@@ -146,17 +437,21 @@ def separar_saidas(df: pd.DataFrame) -> pd.DataFrame:
 
 
 # Converter dataframes para excel
-def converter_para_excel(df: pd.DataFrame) -> BytesIO:
+def converter_para_excel(df: pd.DataFrame, streaming: bool = False) -> BytesIO:
     """
     Converte o dataframe para excel.
     Esta função converte para apenas uma planiha.
 
     Argumentos:
         df (pd.DataFrame): Pandas dataframe já tratado.
+        streaming (bool): Se True, escreve as linhas em blocos com memória constante (ver escrever_excel_streaming).
 
     Retorna:
         BytesIO: Objeto em bytes que pode ser posteriormente salvo em formato excel (.xlsx)
     """
+    if streaming:
+        return escrever_excel_streaming(dfs=[df], nome_planilhas=["Sheet1"])
+
     output = BytesIO()
 
     with pd.ExcelWriter(output, engine="openpyxl") as writer:
@@ -167,7 +462,9 @@ def converter_para_excel(df: pd.DataFrame) -> BytesIO:
     return output
 
 
-def converter_para_excel_varias_planilhas(dfs: list, nome_planilhas: list) -> BytesIO:
+def converter_para_excel_varias_planilhas(
+    dfs: list, nome_planilhas: list, streaming: bool = False
+) -> BytesIO:
     """
     Converte o dataframe para excel.
     Esta função converte vários dataframes para planilhas diferentes dentro do mesmo arquivo excel (.xlsx).
@@ -175,10 +472,14 @@ def converter_para_excel_varias_planilhas(dfs: list, nome_planilhas: list) -> By
     Argumentos:
         dfs (list): Lista com todos os pandas dataframe já tratados.
         nome_planilhas (list): Lista com os nomes das planilhas que devem ser utilizados.
+        streaming (bool): Se True, escreve as linhas em blocos com memória constante (ver escrever_excel_streaming).
 
     Retorna:
         BytesIO: Objeto em bytes que pode ser posteriormente salvo em formato excel (.xlsx)
     """
+    if streaming:
+        return escrever_excel_streaming(dfs=dfs, nome_planilhas=nome_planilhas)
+
     output = BytesIO()
 
     with pd.ExcelWriter(output, engine="openpyxl") as writer:
@@ -188,3 +489,39 @@ def converter_para_excel_varias_planilhas(dfs: list, nome_planilhas: list) -> By
     output.seek(0)
 
     return output
+
+
+def escrever_excel_streaming(dfs: list, nome_planilhas: list) -> BytesIO:
+    """
+    Escreve os dataframes em excel utilizando o modo write_only do openpyxl.
+
+    As linhas são enviadas direto para o arquivo, em blocos de TAMANHO_BLOCO_EXCEL (int) linhas, sem montar
+    todas as células da planilha em memória, o que mantém o uso de memória constante em extratos grandes.
+    O cabeçalho não recebe a formatação em negrito aplicada pelo pandas.
+
+    Argumentos:
+        dfs (list): Lista com todos os pandas dataframe já tratados.
+        nome_planilhas (list): Lista com os nomes das planilhas que devem ser utilizados.
+
+    Retorna:
+        BytesIO: Objeto em bytes que pode ser posteriormente salvo em formato excel (.xlsx)
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+
+    for df, nome_planilha in zip(dfs, nome_planilhas):
+        planilha = workbook.create_sheet(title=nome_planilha)
+        planilha.append(list(df.columns))
+
+        for inicio in range(0, len(df), TAMANHO_BLOCO_EXCEL):
+            bloco = df.iloc[inicio : inicio + TAMANHO_BLOCO_EXCEL].astype(object)
+            bloco = bloco.where(bloco.notna(), None)
+            for linha in bloco.itertuples(index=False, name=None):
+                planilha.append(linha)
+
+    output = BytesIO()
+    workbook.save(output)
+    output.seek(0)
+
+    return output
@@ -0,0 +1,165 @@
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from libs.data_cleaning import *
+from libs.Rendimentos import Rendimentos
+from libs.Fii import Fii
+from libs.Tabelas import Tabelas
+from libs.Futuros import Futuros
+from libs.Bdr import Bdr
+from libs.Acoes import Acoes
+from libs.EventosCorporativos import EventosCorporativos
+
+
+# CONSTANTES
+# -----------------------------
+# Padrão dos arquivos de extrato procurados em cada pasta de cliente
+PADRAO_EXTRATOS: str = "*.xlsx"
+
+
+# Listar os clientes e seus extratos
+def listar_clientes(pasta: Path) -> dict:
+    """
+    Procura os extratos em todas as subpastas da pasta informada. Cada pasta que contém extratos é um cliente.
+
+    Argumentos:
+        pasta (Path): Pasta com uma subpasta para cada cliente.
+
+    Retorna:
+        dict: Nome do cliente (caminho da pasta relativo à pasta informada) e lista com os extratos do cliente.
+    """
+    pasta = Path(pasta)
+    clientes = {}
+
+    for extrato in sorted(pasta.rglob(PADRAO_EXTRATOS)):
+        # Arquivos temporários criados pelo excel enquanto o extrato está aberto
+        if extrato.name.startswith("~$"):
+            continue
+
+        cliente = extrato.parent.relative_to(pasta).as_posix()
+        clientes.setdefault(cliente, []).append(extrato)
+
+    return clientes
+
+
+# Gerar todas as exportações de um cliente
+def gerar_exportacoes(df: pd.DataFrame) -> dict:
+    """
+    Gera os mesmos arquivos excel exportados pelo app, a partir dos extratos já tratados e classificados.
+    Os tipos de ativo sem movimentações não geram arquivo.
+
+    Argumentos:
+        df (pd.DataFrame): Pandas dataframe com todos os extratos do cliente já tratados e classificados.
+
+    Retorna:
+        dict: Nome do arquivo e conteúdo do arquivo excel em BytesIO.
+    """
+    tabelas = Tabelas()
+    exportacoes = {
+        "b3_extrato_consolidado.xlsx": converter_para_excel(df, streaming=True),
+        "b3_extrato_entradas_saidas.xlsx": converter_para_excel_varias_planilhas(
+            dfs=[separar_entradas(df=df), separar_saidas(df=df)],
+            nome_planilhas=["Entradas", "Saídas"],
+            streaming=True,
+        ),
+    }
+
+    ativos = {
+        "b3_acoes.xlsx": (Acoes().pegar_somente_acoes(df=df), "Açoes"),
+        "b3_fii.xlsx": (Fii().pegar_somente_fii(df=df), "FII"),
+        "b3_bdr.xlsx": (Bdr().pegar_somente_bdr(df=df), "BDR"),
+        "b3_rendimentos.xlsx": (
+            Rendimentos().pegar_somente_rendimentos(df=df),
+            "Rend.",
+        ),
+    }
+    for arquivo, (df_ativo, prefixo) in ativos.items():
+        if not df_ativo.empty:
+            exportacoes[arquivo] = converter_para_excel_varias_planilhas(
+                *tabelas.planilhas(df=df_ativo, prefixo=prefixo), streaming=True
+            )
+
+    futuros = Futuros().pegar_somente_futuros(df)
+    if not futuros.empty:
+        exportacoes["b3_futuros.xlsx"] = converter_para_excel_varias_planilhas(
+            *tabelas.planilhas_futuros(df=futuros), streaming=True
+        )
+
+    return exportacoes
+
+
+# Processar todos os extratos de um cliente
+def processar_cliente(cliente: str, extratos: list, destino: Path) -> dict:
+    """
+    Lê, trata e classifica os extratos do cliente e salva as exportações em excel na pasta do cliente no destino.
+    Os erros são retornados no resultado, para que um cliente com problema não interrompa o lote.
+
+    Argumentos:
+        cliente (str): Nome do cliente, utilizado como subpasta no destino.
+        extratos (list): Caminhos dos extratos do cliente.
+        destino (Path): Pasta onde as exportações são salvas.
+
+    Retorna:
+        dict: Cliente, quantidade de extratos, linhas, arquivos gerados, tempo em segundos e erro (ou None).
+    """
+    inicio = time.perf_counter()
+    resultado = {
+        "cliente": cliente,
+        "extratos": len(extratos),
+        "linhas": 0,
+        "arquivos": 0,
+        "segundos": 0.0,
+        "erro": None,
+    }
+
+    try:
+        # Os processos já são divididos entre os clientes, então cada cliente lê seus extratos em sequência
+        df = ler_arquivos(extratos=extratos, processos=1)
+        df = classificar_ativos(df=tratar_dados(df=df, compacto=True))
+        df = EventosCorporativos().ajustar(df=df)
+        resultado["linhas"] = len(df)
+
+        pasta_cliente = Path(destino) / cliente
+        pasta_cliente.mkdir(parents=True, exist_ok=True)
+        for arquivo, conteudo in gerar_exportacoes(df=df).items():
+            (pasta_cliente / arquivo).write_bytes(conteudo.getvalue())
+            resultado["arquivos"] += 1
+    except Exception as erro:
+        resultado["erro"] = f"{type(erro).__name__}: {erro}"
+
+    resultado["segundos"] = time.perf_counter() - inicio
+
+    return resultado
+
+
+# Processar o lote de clientes em paralelo
+def processar_lote(pasta: Path, destino: Path, processos: int | None = None):
+    """
+    Processa todos os clientes encontrados na pasta, distribuindo os clientes entre vários processos.
+
+    Argumentos:
+        pasta (Path): Pasta com uma subpasta de extratos para cada cliente.
+        destino (Path): Pasta onde as exportações de cada cliente são salvas.
+        processos (int | None): Quantidade máxima de processos. Se None, utiliza a quantidade de CPUs.
+
+    Retorna:
+        Gerador com o resultado de processar_cliente de cada cliente, na ordem em que terminam.
+    """
+    clientes = listar_clientes(pasta=pasta)
+    processos = min(processos or os.cpu_count() or 1, len(clientes))
+
+    if processos <= 1:
+        for cliente, extratos in clientes.items():
+            yield processar_cliente(cliente=cliente, extratos=extratos, destino=destino)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=processos, mp_context=contexto_processos()
+    ) as executor:
+        futuros = [
+            executor.submit(processar_cliente, cliente, extratos, destino)
+            for cliente, extratos in clientes.items()
+        ]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
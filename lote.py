@@ -0,0 +1,74 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+from libs.processamento_lote import processar_lote
+
+
+# PROCESSAMENTO EM LOTE
+# -------------------------------------------------------------
+# Processa os extratos de vários clientes sem o Streamlit. Cada subpasta com extratos (.xlsx) é um cliente,
+# e as exportações em excel de cada cliente são salvas com o mesmo caminho de subpasta na pasta de destino.
+#
+# Exemplo:
+#     python lote.py extratos/ exportacoes/ --processos 4
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Processa os extratos da B3 de cada cliente e gera as exportações em "
+            "excel."
+        )
+    )
+    parser.add_argument(
+        "pasta", type=Path, help="Pasta com uma subpasta para cada cliente."
+    )
+    parser.add_argument(
+        "destino", type=Path, help="Pasta onde as exportações são salvas."
+    )
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="Quantidade máxima de processos. Padrão: quantidade de CPUs.",
+    )
+    argumentos = parser.parse_args()
+
+    inicio = time.perf_counter()
+    clientes = linhas = erros = 0
+
+    for resultado in processar_lote(
+        pasta=argumentos.pasta,
+        destino=argumentos.destino,
+        processos=argumentos.processos,
+    ):
+        clientes += 1
+        linhas += resultado["linhas"]
+        linhas_por_segundo = resultado["linhas"] / max(resultado["segundos"], 1e-9)
+
+        if resultado["erro"] is None:
+            print(
+                f"{resultado['cliente']}: {resultado['extratos']} extratos, "
+                f"{resultado['linhas']} linhas, {resultado['arquivos']} arquivos em "
+                f"{resultado['segundos']:.2f} s ({linhas_por_segundo:,.0f} linhas/s)",
+                flush=True,
+            )
+        else:
+            erros += 1
+            print(
+                f"{resultado['cliente']}: ERRO {resultado['erro']}",
+                file=sys.stderr,
+                flush=True,
+            )
+
+    segundos = time.perf_counter() - inicio
+    print(
+        f"Total: {clientes} clientes ({erros} com erro), {linhas} linhas em "
+        f"{segundos:.2f} s ({clientes / max(segundos, 1e-9):.2f} clientes/s, "
+        f"{linhas / max(segundos, 1e-9):,.0f} linhas/s)"
+    )
+
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
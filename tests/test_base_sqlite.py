@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_extrato
+from libs.BaseSQLite import BaseSQLite
+from libs.ConsultaParquet import COLUNAS_CONSULTA
+from libs.data_cleaning import classificar_ativos, converter_valores, tratar_dados
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+@pytest.fixture(scope="module")
+def extrato() -> pd.DataFrame:
+    """
+    Extrato sintético já tratado e classificado, com os tipos compactos.
+    """
+    return classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=3_000)), compacto=True
+        )
+    )
+
+
+def comparar(calculado: pd.DataFrame, esperado: pd.DataFrame) -> None:
+    """
+    Compara os valores das movimentações, sem considerar os tipos das colunas.
+    """
+    pd.testing.assert_frame_equal(
+        calculado[COLUNAS_CONSULTA].reset_index(drop=True).astype(object),
+        esperado[COLUNAS_CONSULTA].reset_index(drop=True).astype(object),
+        check_exact=False,
+        rtol=1e-9,
+    )
+
+
+# TESTES
+# -----------------------------
+def test_ler_igual_ao_extrato(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+
+    assert base.incluir(conta="ana", df=extrato) == len(extrato)
+    comparar(calculado=base.ler(conta="ana"), esperado=extrato)
+
+
+def test_incluir_novamente_nao_duplica(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+    base.incluir(conta="ana", df=extrato, chave="extrato")
+    versao = base.versao(conta="ana")
+
+    assert base.incluir(conta="ana", df=extrato, chave="extrato") == 0
+    assert base.contar(conta="ana") == len(extrato)
+    assert base.versao(conta="ana") == versao
+    assert base.extrato_incluido(conta="ana", chave="extrato")
+
+
+def test_extratos_sobrepostos_incluem_somente_as_novas(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+    datas = extrato["Data"].sort_values().unique()
+    primeiro = extrato[extrato["Data"] < datas[len(datas) * 2 // 3]]
+    segundo = extrato[extrato["Data"] >= datas[len(datas) // 3]]
+    sobrepostas = (segundo["Data"] < datas[len(datas) * 2 // 3]).sum()
+
+    assert base.incluir(conta="ana", df=primeiro) == len(primeiro)
+    assert base.incluir(conta="ana", df=segundo) == len(segundo) - sobrepostas
+    comparar(calculado=base.ler(conta="ana"), esperado=extrato)
+
+
+def test_contas_separadas(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+    base.incluir(conta="ana", df=extrato, chave="extrato")
+
+    assert base.contar(conta="bia") == 0
+    assert len(base.ler(conta="bia")) == 0
+    assert not base.extrato_incluido(conta="bia", chave="extrato")
+    assert base.incluir(conta="bia", df=extrato.iloc[:100]) == 100
+    assert base.contar(conta="ana") == len(extrato)
+
+
+def test_ler_com_filtros(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+    base.incluir(conta="ana", df=extrato)
+    filtros = {"Ano": [2020, 2023], "Movimentação": ["Compra", "Venda"]}
+    esperado = extrato[
+        extrato["Ano"].isin(filtros["Ano"])
+        & extrato["Movimentação"].isin(filtros["Movimentação"])
+    ]
+
+    comparar(calculado=base.ler(conta="ana", filtros=filtros), esperado=esperado)
+
+    with pytest.raises(ValueError):
+        base.ler(conta="ana", filtros={"Conta": ["bia"]})
+
+
+def test_ler_partes_igual_a_ler(extrato, tmp_path):
+    base = BaseSQLite(arquivo=tmp_path / "base.sqlite")
+    base.incluir(conta="ana", df=extrato)
+    partes = list(base.ler_partes(conta="ana", linhas=700))
+
+    assert [len(parte) for parte in partes] == [700] * 4 + [len(extrato) - 2_800]
+    comparar(calculado=pd.concat(partes), esperado=base.ler(conta="ana"))
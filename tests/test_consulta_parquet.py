@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_extrato
+from libs.data_cleaning import classificar_ativos, converter_valores, tratar_dados
+from libs.Filtros import COLUNAS_FILTROS, IndiceFiltros
+
+pytest.importorskip("duckdb")
+from libs.ConsultaParquet import COLUNAS_CONSULTA, BaseParquet
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+@pytest.fixture(scope="module")
+def extrato() -> pd.DataFrame:
+    """
+    Extrato sintético já tratado e classificado, com os tipos compactos.
+    """
+    return classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=5_000)), compacto=True
+        )
+    )
+
+
+@pytest.fixture(scope="module")
+def base(extrato, tmp_path_factory) -> BaseParquet:
+    """
+    Base parquet com o extrato sintético gravado.
+    """
+    base = BaseParquet(pasta=tmp_path_factory.mktemp("parquet") / "base")
+    base.gravar(dfs=[extrato])
+
+    return base
+
+
+def sortear_filtros(indice: IndiceFiltros, semente: int) -> dict:
+    """
+    Sorteia alguns valores de algumas colunas de filtro.
+    """
+    gerador = np.random.default_rng(semente)
+    filtros = {}
+    for coluna in COLUNAS_FILTROS:
+        opcoes = indice.opcoes(coluna=coluna)
+        if gerador.random() < 0.5:
+            quantidade = gerador.integers(1, min(len(opcoes), 4) + 1)
+            filtros[coluna] = [
+                opcoes[posicao]
+                for posicao in gerador.choice(len(opcoes), quantidade, replace=False)
+            ]
+
+    return filtros
+
+
+def comparar(calculado: pd.DataFrame, esperado: pd.DataFrame) -> None:
+    """
+    Compara os valores das movimentações, sem considerar os tipos das colunas.
+    """
+    pd.testing.assert_frame_equal(
+        calculado.reset_index(drop=True).astype(object),
+        esperado[COLUNAS_CONSULTA].reset_index(drop=True).astype(object),
+        check_exact=False,
+        rtol=1e-9,
+    )
+
+
+# TESTES
+# -----------------------------
+def test_opcoes_iguais_ao_indice(extrato, base):
+    indice = IndiceFiltros(df=extrato)
+
+    for coluna in COLUNAS_FILTROS:
+        assert base.opcoes(coluna=coluna) == indice.opcoes(coluna=coluna)
+
+
+@pytest.mark.parametrize("semente", range(10))
+def test_filtrar_igual_ao_indice(extrato, base, semente):
+    indice = IndiceFiltros(df=extrato)
+    filtros = sortear_filtros(indice=indice, semente=semente)
+
+    comparar(
+        calculado=base.consulta().filtrar(filtros=filtros).dataframe(),
+        esperado=indice.filtrar(filtros=filtros),
+    )
+
+
+def test_pagina_igual_ao_dataframe(extrato, base):
+    consulta = base.consulta().filtrar(filtros={"Ano": [2021, 2022]})
+    esperado = IndiceFiltros(df=extrato).filtrar(filtros={"Ano": [2021, 2022]})
+
+    comparar(
+        calculado=consulta.pagina(inicio=100, tamanho=50),
+        esperado=esperado.iloc[100:150],
+    )
+    assert len(consulta) == len(esperado)
+
+
+def test_dataframe_somente_com_as_colunas_pedidas(extrato, base):
+    colunas = ["Data", "Ticker", "Valor da Operação"]
+    consulta = base.consulta().filtrar(filtros={"Ano": [2021]})
+    esperado = IndiceFiltros(df=extrato).filtrar(filtros={"Ano": [2021]})
+    calculado = consulta.dataframe(colunas=colunas)
+
+    assert calculado.columns.tolist() == colunas
+    pd.testing.assert_frame_equal(
+        calculado.reset_index(drop=True).astype(object),
+        esperado[colunas].reset_index(drop=True).astype(object),
+        check_exact=False,
+        rtol=1e-9,
+    )
+
+
+def test_pasta_com_aspas(extrato, tmp_path):
+    base = BaseParquet(pasta=tmp_path / "d'Ávila" / "base")
+    base.gravar(dfs=[extrato.iloc[:500]])
+
+    assert len(base.consulta()) == 500
@@ -0,0 +1,157 @@
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_cotahist
+from libs.Cotacoes import CAMPOS_COTAHIST, TAMANHO_REGISTRO_COTAHIST, ler_cotahist
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def registro_cotahist(
+    data: str,
+    ticker: str,
+    precos: list,
+    negocios: int,
+    quantidade: int,
+    volume: float,
+    fator: int = 1,
+    mercado: str = "010",
+) -> str:
+    """
+    Monta um registro de cotação do COTAHIST campo a campo, pelas posições de CAMPOS_COTAHIST (dict).
+    Os preços (abertura, máxima, mínima, média e fechamento) e o volume são informados em reais.
+    """
+    valores = {
+        "TIPREG": "01",
+        "DATPRE": data.replace("-", ""),
+        "CODNEG": ticker.ljust(12),
+        "TPMERC": mercado,
+        **{
+            campo: f"{round(preco * 100):013d}"
+            for campo, preco in zip(
+                ["PREABE", "PREMAX", "PREMIN", "PREMED", "PREULT"], precos
+            )
+        },
+        "TOTNEG": f"{negocios:05d}",
+        "QUATOT": f"{quantidade:018d}",
+        "VOLTOT": f"{round(volume * 100):018d}",
+        "FATCOT": f"{fator:07d}",
+    }
+    registro = [" "] * TAMANHO_REGISTRO_COTAHIST
+    for campo, (inicio, tamanho) in CAMPOS_COTAHIST.items():
+        assert len(valores[campo]) == tamanho
+        registro[inicio : inicio + tamanho] = valores[campo]
+
+    return "".join(registro)
+
+
+def arquivo_cotahist(registros: list) -> bytes:
+    """
+    Monta o arquivo COTAHIST com cabeçalho, rodapé e quebras de linha CRLF.
+    """
+    cabecalho = "00COTAHIST.2024BOVESPA 20241231".ljust(TAMANHO_REGISTRO_COTAHIST)
+    rodape = f"99COTAHIST.2024BOVESPA 20241231{len(registros) + 2:011d}".ljust(
+        TAMANHO_REGISTRO_COTAHIST
+    )
+
+    return "".join(linha + "\r\n" for linha in [cabecalho, *registros, rodape]).encode(
+        "ascii"
+    )
+
+
+@pytest.fixture
+def registros() -> list:
+    """
+    Registros fora de ordem, com um registro do mercado de opções que deve ser descartado.
+    """
+    return [
+        registro_cotahist(
+            "2024-01-03",
+            "VALE3",
+            [65.1, 66.0, 64.5, 65.3, 65.9],
+            1200,
+            350_000,
+            22_855_000.5,
+        ),
+        registro_cotahist(
+            "2024-01-02",
+            "PETR4",
+            [37.5, 38.0, 37.1, 37.6, 37.95],
+            54321,
+            1_000_000,
+            376e5,
+        ),
+        registro_cotahist(
+            "2024-01-02",
+            "XPTO11",
+            [1_234.0, 1_240.0, 1_230.0, 1_235.0, 1_238.0],
+            7,
+            10,
+            12_350.0,
+            fator=1_000,
+        ),
+        registro_cotahist(
+            "2024-01-02", "PETRA380", [1.0] * 5, 10, 100, 100.0, mercado="070"
+        ),
+    ]
+
+
+# TESTES
+# -----------------------------
+@pytest.mark.parametrize("compactado", [False, True])
+def test_ler_campos_do_registro(tmp_path, registros, compactado):
+    conteudo = arquivo_cotahist(registros=registros)
+    if compactado:
+        arquivo = tmp_path / "COTAHIST_A2024.ZIP"
+        with zipfile.ZipFile(arquivo, "w") as compactado_zip:
+            compactado_zip.writestr("COTAHIST_A2024.TXT", conteudo)
+    else:
+        arquivo = tmp_path / "COTAHIST_A2024.TXT"
+        arquivo.write_bytes(conteudo)
+
+    df = ler_cotahist(arquivo=arquivo)
+
+    assert df["Data"].tolist() == list(
+        pd.to_datetime(["2024-01-02", "2024-01-02", "2024-01-03"])
+    )
+    assert df["Ticker"].astype(str).tolist() == ["PETR4", "XPTO11", "VALE3"]
+    np.testing.assert_allclose(
+        df[["Abertura", "Máxima", "Mínima", "Média", "Fechamento"]].to_numpy(
+            dtype="float64"
+        ),
+        [
+            [37.5, 38.0, 37.1, 37.6, 37.95],
+            [1.234, 1.24, 1.23, 1.235, 1.238],
+            [65.1, 66.0, 64.5, 65.3, 65.9],
+        ],
+    )
+    assert df["Negócios"].tolist() == [54321, 7, 1200]
+    assert df["Quantidade Negociada"].tolist() == [1_000_000, 10, 350_000]
+    np.testing.assert_allclose(
+        df["Volume"].to_numpy(dtype="float64"), [376e5, 12_350.0, 22_855_000.5]
+    )
+
+
+def test_ler_somente_os_tickers(tmp_path, registros):
+    arquivo = tmp_path / "COTAHIST_A2024.TXT"
+    arquivo.write_bytes(arquivo_cotahist(registros=registros))
+
+    df = ler_cotahist(arquivo=arquivo, tickers=["vale3", "PETRA380", "ABCD3"])
+
+    assert df["Ticker"].astype(str).tolist() == ["VALE3"]
+
+
+def test_filtro_de_tickers_igual_ao_filtro_do_dataframe(tmp_path):
+    arquivo = tmp_path / "COTAHIST_A2023.TXT"
+    arquivo.write_bytes(gerar_cotahist(linhas=20_000))
+    todos = ler_cotahist(arquivo=arquivo)
+    tickers = todos["Ticker"].astype(str).drop_duplicates().sample(30, random_state=0)
+
+    filtrado = ler_cotahist(arquivo=arquivo, tickers=tickers.tolist())
+    esperado = todos[todos["Ticker"].astype(str).isin(tickers)]
+
+    pd.testing.assert_frame_equal(
+        filtrado.astype({"Ticker": str}).reset_index(drop=True),
+        esperado.astype({"Ticker": str}).reset_index(drop=True),
+    )
@@ -0,0 +1,48 @@
+import tracemalloc
+
+import numpy as np
+from libs.Diagnostico import Diagnostico
+
+
+# TESTES
+# -----------------------------
+def test_sem_medir_memoria_nao_liga_o_tracemalloc():
+    diagnostico = Diagnostico(ativo=True, registrar_log=False)
+
+    with diagnostico.medir(etapa="fora"):
+        assert not tracemalloc.is_tracing()
+        with diagnostico.medir(etapa="dentro"):
+            np.ones(1_000_000)
+
+    tabela = diagnostico.tabela()
+    assert tabela["etapa"].tolist() == ["dentro", "fora"]
+    assert tabela["pai"].tolist() == ["fora", None]
+    assert tabela["pico_mb"].isna().all()
+
+
+def test_medir_memoria_desliga_o_tracemalloc_ao_terminar():
+    diagnostico = Diagnostico(ativo=True, registrar_log=False, medir_memoria=True)
+
+    with diagnostico.medir(etapa="fora"):
+        with diagnostico.medir(etapa="dentro"):
+            assert tracemalloc.is_tracing()
+            dados = np.ones(1_000_000)
+        del dados
+    assert not tracemalloc.is_tracing()
+
+    picos = diagnostico.tabela().set_index("etapa")["pico_mb"]
+    assert picos["dentro"] >= 8.0
+    assert picos["fora"] >= picos["dentro"]
+
+
+def test_tracemalloc_ligado_por_outro_nao_e_alterado():
+    tracemalloc.start()
+    try:
+        diagnostico = Diagnostico(ativo=True, registrar_log=False, medir_memoria=True)
+        with diagnostico.medir(etapa="etapa"):
+            np.ones(1_000_000)
+
+        assert tracemalloc.is_tracing()
+        assert diagnostico.tabela()["pico_mb"].isna().all()
+    finally:
+        tracemalloc.stop()
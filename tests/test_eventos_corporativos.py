@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from libs.EventosCorporativos import EventosCorporativos
+from libs.PrecoMedio import PrecoMedio
+
+
+# CONSTANTES
+# -----------------------------
+# Movimentação de compra e venda das ações
+LIQUIDACAO: str = "Transferência - Liquidação"
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def movimentacoes(linhas: list) -> pd.DataFrame:
+    """
+    Monta as movimentações a partir de tuplas (data, ticker, movimentação, entrada/saída, quantidade, valor).
+    """
+    df = pd.DataFrame(
+        linhas,
+        columns=[
+            "Data",
+            "Ticker",
+            "Movimentação",
+            "Entrada/Saída",
+            "Quantidade",
+            "Valor da Operação",
+        ],
+    )
+    df["Data"] = pd.to_datetime(df["Data"])
+    df["Preço unitário"] = df["Valor da Operação"] / df["Quantidade"]
+
+    return df
+
+
+# TESTES
+# -----------------------------
+def test_desdobro():
+    df = movimentacoes(
+        [
+            ("2024-01-02", "PETR4", LIQUIDACAO, "Credito", 100.0, 1000.0),
+            ("2024-02-01", "PETR4", "Desdobro", "Credito", 100.0, 0.0),
+            ("2024-03-01", "PETR4", LIQUIDACAO, "Debito", 50.0, 300.0),
+        ]
+    )
+
+    eventos = EventosCorporativos().eventos(df=df)
+    ajustado = EventosCorporativos().ajustar(df=df, eventos=eventos)
+
+    assert eventos["Proporção"].tolist() == [2.0]
+    assert ajustado["Quantidade"].tolist() == [200.0, 0.0, 50.0]
+    assert ajustado["Preço unitário"].tolist() == [5.0, 0.0, 6.0]
+    assert ajustado["Valor da Operação"].tolist() == df["Valor da Operação"].tolist()
+
+
+def test_grupamento():
+    df = movimentacoes(
+        [
+            ("2024-01-02", "MGLU3", LIQUIDACAO, "Credito", 100.0, 1000.0),
+            ("2024-02-01", "MGLU3", "Grupamento", "Credito", 10.0, 0.0),
+            ("2024-03-01", "MGLU3", LIQUIDACAO, "Credito", 10.0, 1200.0),
+        ]
+    )
+
+    eventos = EventosCorporativos().eventos(df=df)
+    ajustado = EventosCorporativos().ajustar(df=df, eventos=eventos)
+
+    assert eventos["Proporção"].tolist() == [0.1]
+    np.testing.assert_allclose(ajustado["Quantidade"], [10.0, 10.0, 10.0])
+    np.testing.assert_allclose(ajustado["Preço unitário"], [100.0, 0.0, 120.0])
+
+    # O saldo de quantidade do grupamento é o mesmo com e sem o ajuste
+    saldos = PrecoMedio().calcular_preco_medio(df=df)["Saldo Quantidade"]
+    saldos_ajustados = PrecoMedio().calcular_preco_medio(df=ajustado)[
+        "Saldo Quantidade"
+    ]
+    assert saldos.iloc[1:].tolist() == saldos_ajustados.iloc[1:].tolist()
+
+
+def test_eventos_seguidos_e_outros_tickers():
+    df = movimentacoes(
+        [
+            ("2024-01-02", "PETR4", LIQUIDACAO, "Credito", 100.0, 1000.0),
+            ("2024-01-03", "VALE3", LIQUIDACAO, "Credito", 10.0, 650.0),
+            ("2024-02-01", "PETR4", "Desdobro", "Credito", 200.0, 0.0),
+            ("2024-03-01", "PETR4", "Grupamento", "Credito", 150.0, 0.0),
+        ]
+    )
+
+    eventos = EventosCorporativos().eventos(df=df)
+    ajustado = EventosCorporativos().ajustar(df=df, eventos=eventos)
+
+    np.testing.assert_allclose(eventos["Proporção"], [3.0, 0.5])
+    np.testing.assert_allclose(eventos["Fator Ajuste"], [1.5, 0.5])
+    np.testing.assert_allclose(ajustado["Quantidade"], [150.0, 10.0, 0.0, 150.0])
+    np.testing.assert_allclose(ajustado["Preço unitário"][:2], [10.0 / 1.5, 65.0])
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_extrato
+from libs.data_cleaning import classificar_ativos, converter_valores, tratar_dados
+from libs.Filtros import IndiceFiltros
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+@pytest.fixture(scope="module")
+def extrato() -> pd.DataFrame:
+    """
+    Extrato sintético já tratado e classificado, com os tipos compactos.
+    """
+    return classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=3_000)), compacto=True
+        )
+    )
+
+
+# TESTES
+# -----------------------------
+def test_filtrar_igual_ao_isin(extrato):
+    indice = IndiceFiltros(df=extrato)
+    anos = indice.opcoes(coluna="Ano")[:2]
+    tickers = indice.opcoes(coluna="Ticker")[::3]
+    filtros = {"Ano": anos, "Ticker": tickers, "Mes": []}
+
+    esperado = extrato[extrato["Ano"].isin(anos) & extrato["Ticker"].isin(tickers)]
+
+    pd.testing.assert_frame_equal(indice.filtrar(filtros=filtros), esperado)
+    assert indice.filtrar(filtros={}) is extrato
+
+
+def test_guarda_somente_as_posicoes(extrato):
+    indice = IndiceFiltros(df=extrato, tamanho_maximo=2)
+    for ano in indice.opcoes(coluna="Ano")[:3]:
+        indice.filtrar(filtros={"Ano": [ano]})
+
+    assert len(indice._filtradas) == 2
+    assert all(
+        isinstance(posicoes, np.ndarray) for posicoes in indice._filtradas.values()
+    )
@@ -0,0 +1,148 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pytest
+from libs.data_cleaning import classificar_ativos, tratar_dados
+from libs.Futuros import Futuros, parear_negocios
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def parear_negocios_loop(
+    grupos: np.ndarray, compra: np.ndarray, quantidade: np.ndarray
+) -> list:
+    """
+    Pareamento PEPS percorrendo os negócios de cada grupo um a um, com uma fila de negócios em aberto.
+    """
+    pares = []
+    for grupo in np.unique(grupos):
+        abertos = deque()
+        for posicao in np.flatnonzero(grupos == grupo):
+            restante = int(quantidade[posicao])
+            while restante and abertos and compra[abertos[0][0]] != compra[posicao]:
+                aberto, quantidade_aberta = abertos[0]
+                pareada = min(restante, quantidade_aberta)
+                par = (aberto, posicao) if compra[aberto] else (posicao, aberto)
+                pares.append((*par, pareada))
+                restante -= pareada
+                if pareada == quantidade_aberta:
+                    abertos.popleft()
+                else:
+                    abertos[0] = (aberto, quantidade_aberta - pareada)
+            if restante:
+                abertos.append((posicao, restante))
+
+    return sorted(pares)
+
+
+def agrupar_pares(
+    posicoes_compra: np.ndarray, posicoes_venda: np.ndarray, pareada: np.ndarray
+) -> list:
+    """
+    Soma a quantidade de cada par de compra e venda, já que um mesmo par pode aparecer em trechos seguidos.
+    """
+    pares = (
+        pd.DataFrame(
+            {"Compra": posicoes_compra, "Venda": posicoes_venda, "Quantidade": pareada}
+        )
+        .groupby(["Compra", "Venda"])["Quantidade"]
+        .sum()
+    )
+
+    return sorted(
+        (int(compra), int(venda), int(quantidade))
+        for (compra, venda), quantidade in pares.items()
+    )
+
+
+# TESTES
+# -----------------------------
+@pytest.mark.parametrize("semente", range(20))
+def test_parear_negocios_igual_ao_loop(semente):
+    gerador = np.random.default_rng(semente)
+    linhas = 500
+    grupos = np.sort(gerador.integers(0, 15, size=linhas))
+    compra = gerador.random(linhas) < 0.5
+    quantidade = gerador.integers(1, 10, size=linhas)
+
+    assert agrupar_pares(
+        *parear_negocios(grupos=grupos, compra=compra, quantidade=quantidade)
+    ) == parear_negocios_loop(grupos=grupos, compra=compra, quantidade=quantidade)
+
+
+def test_calcular_day_trade():
+    df = pd.DataFrame(
+        {
+            "Data": pd.to_datetime(
+                ["2024-01-02", "2024-01-02", "2024-01-02", "2024-01-02", "2024-01-03"]
+            ),
+            "Ticker": ["WDOG24", "WDOG24", "WDOG24", "WDOG24", "WDOG24"],
+            "Movimentação": ["Compra", "Venda", "Venda", "Compra", "Venda"],
+            "Quantidade": [2.0, 1.0, 3.0, 1.0, 1.0],
+            "Preço unitário": [5000.0, 5010.0, 5020.0, 5005.0, 5030.0],
+            "Classe": ["Futuros"] * 5,
+        }
+    )
+
+    operacoes, por_dia = Futuros().calcular_day_trade(df=df)
+
+    assert operacoes["Sentido"].tolist() == ["Comprado", "Comprado", "Vendido"]
+    assert operacoes["Quantidade"].tolist() == [1, 1, 1]
+    assert operacoes["Pontos"].tolist() == [10.0, 20.0, 15.0]
+    assert operacoes["Resultado"].tolist() == [100.0, 200.0, 150.0]
+    assert por_dia["Quantidade Day Trade"].tolist() == [3, 0]
+    assert por_dia["Resultado"].tolist() == [450.0, 0.0]
+    assert por_dia["Posição Carregada"].tolist() == [-1, -1]
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_day_trade_na_ordem_dos_negocios(semente):
+    # Extrato com 40 negócios no mesmo dia, listados do mais recente para o mais antigo, como no extrato da B3
+    gerador = np.random.default_rng(semente)
+    linhas = 40
+    compra = gerador.random(linhas) < 0.5
+    quantidade = gerador.integers(1, 5, size=linhas)
+    preco = 5_000.0 + np.arange(linhas)
+    extrato = pd.DataFrame(
+        {
+            "Entrada/Saída": np.where(compra, "Credito", "Debito"),
+            "Data": "02/01/2024",
+            "Movimentação": np.where(compra, "Compra", "Venda"),
+            "Produto": "WDO - WDOG24",
+            "Instituição": "XP INVESTIMENTOS CCTVM S/A",
+            "Quantidade": quantidade.astype("float64"),
+            "Preço unitário": preco,
+            "Valor da Operação": quantidade * preco,
+        }
+    ).iloc[::-1]
+
+    operacoes, _ = Futuros().calcular_day_trade(
+        df=classificar_ativos(df=tratar_dados(df=extrato.reset_index(drop=True)))
+    )
+
+    esperadas = [
+        (
+            preco[posicao_compra],
+            preco[posicao_venda],
+            quantidade_par,
+            "Comprado" if posicao_compra < posicao_venda else "Vendido",
+        )
+        for posicao_compra, posicao_venda, quantidade_par in parear_negocios_loop(
+            grupos=np.zeros(linhas, dtype=np.int64),
+            compra=compra,
+            quantidade=quantidade,
+        )
+    ]
+    calculadas = operacoes.groupby(
+        ["Preço Compra", "Preço Venda", "Sentido"], as_index=False
+    )["Quantidade"].sum()
+
+    assert sorted(esperadas) == sorted(
+        zip(
+            calculadas["Preço Compra"],
+            calculadas["Preço Venda"],
+            calculadas["Quantidade"],
+            calculadas["Sentido"],
+        )
+    )
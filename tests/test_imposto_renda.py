@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_extrato
+from libs.data_cleaning import classificar_ativos, converter_valores, tratar_dados
+from libs.ImpostoRenda import ImpostoRenda, compensar_prejuizos
+from libs.PrecoMedio import MOVIMENTACOES_EVENTOS
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def compensar_prejuizos_loop(
+    grupos: np.ndarray, resultado: np.ndarray, prejuizo_inicial: np.ndarray
+) -> dict:
+    """
+    Compensação dos prejuízos percorrendo os meses de cada grupo um a um.
+    """
+    colunas = {
+        "Prejuízo Anterior": [],
+        "Prejuízo Compensado": [],
+        "Base de Cálculo": [],
+        "Prejuízo a Compensar": [],
+    }
+    prejuizo = 0.0
+    for posicao, (grupo, valor) in enumerate(zip(grupos, resultado)):
+        if posicao == 0 or grupo != grupos[posicao - 1]:
+            prejuizo = prejuizo_inicial[grupo]
+        compensado = min(prejuizo, max(valor, 0))
+        colunas["Prejuízo Anterior"].append(prejuizo)
+        colunas["Prejuízo Compensado"].append(compensado)
+        colunas["Base de Cálculo"].append(max(valor, 0) - compensado)
+        prejuizo = max(prejuizo - valor, 0)
+        colunas["Prejuízo a Compensar"].append(prejuizo)
+
+    return colunas
+
+
+def separar_extratos(df: pd.DataFrame, partes: int) -> list:
+    """
+    Separa as movimentações em extratos de períodos seguidos, cortados entre duas datas.
+    """
+    datas = df["Data"].unique()
+    cortes = df["Data"].searchsorted(
+        datas[np.linspace(0, len(datas), partes + 1).astype(int)[1:-1]]
+    )
+    inicios = [0, *cortes]
+    fins = [*cortes, len(df)]
+
+    return [df.iloc[inicio:fim] for inicio, fim in zip(inicios, fins)]
+
+
+# TESTES
+# -----------------------------
+@pytest.mark.parametrize("semente", range(20))
+def test_compensar_prejuizos_igual_ao_loop(semente):
+    gerador = np.random.default_rng(semente)
+    linhas = 300
+    grupos = np.sort(gerador.integers(0, 3, size=linhas))
+    resultado = np.round(gerador.normal(0, 5_000, size=linhas), 2)
+    prejuizo_inicial = np.round(gerador.uniform(0, 10_000, size=3), 2)
+
+    calculo = compensar_prejuizos(
+        grupos=grupos, resultado=resultado, prejuizo_inicial=prejuizo_inicial
+    )
+    referencia = compensar_prejuizos_loop(
+        grupos=grupos, resultado=resultado, prejuizo_inicial=prejuizo_inicial
+    )
+
+    for coluna, valores in referencia.items():
+        np.testing.assert_allclose(calculo[coluna], valores, rtol=1e-9, atol=1e-6)
+
+
+def test_prejuizo_compensado_nos_meses_seguintes():
+    calculo = compensar_prejuizos(
+        grupos=np.array([0, 0, 0, 1, 1]),
+        resultado=np.array([-1_000.0, 400.0, 800.0, 500.0, -200.0]),
+        prejuizo_inicial=np.array([0.0, 100.0]),
+    )
+
+    assert calculo["Prejuízo Compensado"].tolist() == [0.0, 400.0, 600.0, 100.0, 0.0]
+    assert calculo["Base de Cálculo"].tolist() == [0.0, 0.0, 200.0, 400.0, 0.0]
+    assert calculo["Prejuízo a Compensar"].tolist() == [1_000.0, 600.0, 0.0, 0.0, 200.0]
+
+
+@pytest.mark.parametrize("eventos", [False, True])
+def test_atualizacao_incremental_igual_ao_calculo_completo(eventos):
+    # Os desdobros e grupamentos nas movimentações novas recalculam o livro
+    df = classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=5_000)), compacto=True
+        )
+    )
+    if not eventos:
+        df = df[~df["Movimentação"].isin(MOVIMENTACOES_EVENTOS)]
+    extratos = separar_extratos(df=df, partes=5)
+    completo = ImpostoRenda().atualizar(df=df)
+
+    incremental = ImpostoRenda()
+    for quantidade in [1, 2, 2, 4, 5]:
+        incremental.atualizar(
+            df=pd.concat(extratos[:quantidade]), chaves=list(range(quantidade))
+        )
+
+    pd.testing.assert_frame_equal(incremental.tabela(), completo.tabela(), rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental.livro(), completo.livro(), rtol=1e-9)
+
+
+def test_consulta_parquet_igual_ao_dataframe(tmp_path):
+    pytest.importorskip("duckdb")
+    from libs.ConsultaParquet import BaseParquet
+
+    df = classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=5_000)), compacto=True
+        )
+    )
+    df = df[~df["Movimentação"].isin(MOVIMENTACOES_EVENTOS)]
+    extratos = separar_extratos(df=df, partes=3)
+
+    imposto = ImpostoRenda()
+    for quantidade in [1, 2, 3]:
+        base = BaseParquet(pasta=tmp_path / f"base{quantidade}")
+        base.gravar(dfs=extratos[:quantidade])
+        imposto.atualizar(df=base.consulta(), chaves=list(range(quantidade)))
+    completo = ImpostoRenda().atualizar(df=df)
+
+    pd.testing.assert_frame_equal(imposto.tabela(), completo.tabela(), rtol=1e-9)
+    pd.testing.assert_frame_equal(imposto.livro(), completo.livro(), rtol=1e-9)
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from benchmarks.gerar_extratos import gerar_extrato, salvar_extrato
+from libs.CacheExtratos import CacheExtratos
+from libs.LeituraExtratos import (
+    ESTADO_CONCLUIDO,
+    ESTADO_ERRO,
+    ESTADO_LENDO,
+    ESTADO_NA_FILA,
+    LeituraExtratos,
+)
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+class ExecutorQuebrado:
+    """
+    Executor cujos processos terminaram durante a leitura: as leituras enviadas falham com BrokenProcessPool.
+    """
+
+    def submit(self, *args, **kwargs) -> Future:
+        futuro = Future()
+        futuro.set_exception(BrokenProcessPool("Processo terminado"))
+
+        return futuro
+
+
+def aguardar(leitura: LeituraExtratos, chaves: list, limite: float = 60) -> dict:
+    """
+    Aguarda o fim da leitura dos extratos e retorna o estado de cada um.
+    """
+    fim = time.monotonic() + limite
+    while True:
+        estados = leitura.estados(chaves=chaves)
+        pendentes = {ESTADO_NA_FILA, ESTADO_LENDO} & set(estados.values())
+        if not pendentes or time.monotonic() > fim:
+            return estados
+        time.sleep(0.05)
+
+
+# TESTES
+# -----------------------------
+def test_executor_quebrado_antes_do_envio(tmp_path):
+    arquivos = salvar_extrato(df=gerar_extrato(linhas=200), pasta=tmp_path)
+    leitura = LeituraExtratos(cache=CacheExtratos(), processos=2)
+
+    # Um processo termina de forma inesperada, e o executor deixa de aceitar leituras
+    executor = leitura._obter_executor()
+    assert isinstance(executor.submit(os._exit, 1).exception(), BrokenProcessPool)
+
+    chaves = leitura.enviar(extratos=arquivos)
+
+    assert aguardar(leitura=leitura, chaves=chaves) == {chaves[0]: ESTADO_CONCLUIDO}
+    assert leitura.cache.obter(chave=chaves[0]) is not None
+
+
+def test_executor_quebrado_durante_a_leitura(tmp_path):
+    arquivos = salvar_extrato(df=gerar_extrato(linhas=200), pasta=tmp_path)
+    leitura = LeituraExtratos(cache=CacheExtratos(), processos=1)
+    leitura._executor = ExecutorQuebrado()
+
+    chaves = leitura.enviar(extratos=arquivos)
+
+    assert leitura.estados(chaves=chaves) == {chaves[0]: ESTADO_ERRO}
+    assert isinstance(leitura.erro(chave=chaves[0]), BrokenProcessPool)
+
+    # O mesmo envio não lê o extrato novamente, mas um novo envio lê em um novo executor
+    assert leitura.enviar(extratos=arquivos) == chaves
+    assert leitura.estados(chaves=chaves) == {chaves[0]: ESTADO_ERRO}
+
+    leitura.enviar(extratos=arquivos, repetir_erros=True)
+
+    assert aguardar(leitura=leitura, chaves=chaves) == {chaves[0]: ESTADO_CONCLUIDO}
+    assert leitura.erro(chave=chaves[0]) is None
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.gerar_extratos import gerar_extrato
+from libs.data_cleaning import classificar_ativos, converter_valores, tratar_dados
+from libs.Metricas import Metricas
+from libs.PrecoMedio import MOVIMENTACOES_EVENTOS
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def extrato_tratado(linhas: int, semente: int = 0) -> pd.DataFrame:
+    """
+    Gera um extrato sintético já tratado e classificado, com os tipos compactos.
+    """
+    return classificar_ativos(
+        df=tratar_dados(
+            df=converter_valores(df=gerar_extrato(linhas=linhas, semente=semente)),
+            compacto=True,
+        )
+    )
+
+
+def separar_extratos(df: pd.DataFrame, partes: int) -> list:
+    """
+    Separa as movimentações em extratos de períodos seguidos, cortados entre duas datas.
+    """
+    datas = df["Data"].unique()
+    cortes = df["Data"].searchsorted(
+        datas[np.linspace(0, len(datas), partes + 1).astype(int)[1:-1]]
+    )
+    inicios = [0, *cortes]
+    fins = [*cortes, len(df)]
+
+    return [df.iloc[inicio:fim] for inicio, fim in zip(inicios, fins)]
+
+
+def registrar_calculos(metricas: Metricas, monkeypatch) -> list:
+    """
+    Registra a quantidade de movimentações de posição calculadas em cada atualização.
+    """
+    calculadas = []
+    incluir = metricas._incluir
+
+    def registrar(movs: pd.DataFrame, rendimentos: pd.Series) -> None:
+        calculadas.append(len(movs))
+        incluir(movs=movs, rendimentos=rendimentos)
+
+    monkeypatch.setattr(metricas, "_incluir", registrar)
+
+    return calculadas
+
+
+# TESTES
+# -----------------------------
+@pytest.mark.parametrize("eventos", [False, True])
+def test_atualizacao_incremental_igual_ao_calculo_completo(eventos):
+    # Os desdobros e grupamentos nas movimentações novas recalculam o estado
+    df = extrato_tratado(linhas=5_000)
+    if not eventos:
+        df = df[~df["Movimentação"].isin(MOVIMENTACOES_EVENTOS)]
+    extratos = separar_extratos(df=df, partes=5)
+    completo = Metricas().atualizar(df=df)
+
+    incremental = Metricas()
+    for quantidade in [1, 2, 2, 4, 5]:
+        incremental.atualizar(
+            df=pd.concat(extratos[:quantidade]), chaves=list(range(quantidade))
+        )
+
+    pd.testing.assert_frame_equal(incremental.tabela(), completo.tabela(), rtol=1e-9)
+
+
+def test_somente_as_movimentacoes_novas_sao_calculadas(monkeypatch):
+    # Sem desdobros e grupamentos, que recalculam o estado
+    df = extrato_tratado(linhas=3_000)
+    df = df[~df["Movimentação"].isin(MOVIMENTACOES_EVENTOS)]
+    extratos = separar_extratos(df=df, partes=2)
+    metricas = Metricas().atualizar(df=extratos[0], chaves=[0])
+    calculadas = registrar_calculos(metricas=metricas, monkeypatch=monkeypatch)
+
+    metricas.atualizar(df=df, chaves=[0, 1])
+
+    assert calculadas == [len(Metricas._selecionar(df=extratos[1])[0])]
+    assert metricas.linhas == len(df)
+
+
+def test_extrato_antigo_incluido_depois_recalcula_o_estado():
+    df = extrato_tratado(linhas=3_000)
+    extratos = separar_extratos(df=df, partes=3)
+
+    metricas = Metricas().atualizar(df=pd.concat(extratos[1:]), chaves=[1, 2])
+    metricas.atualizar(df=df, chaves=[0, 1, 2])
+
+    pd.testing.assert_frame_equal(
+        metricas.tabela(), Metricas().atualizar(df=df).tabela(), rtol=1e-9
+    )
+
+
+def test_extrato_removido_recalcula_o_estado():
+    df = extrato_tratado(linhas=3_000)
+    extratos = separar_extratos(df=df, partes=3)
+
+    metricas = Metricas().atualizar(df=df, chaves=[0, 1, 2])
+    metricas.atualizar(df=pd.concat([extratos[0], extratos[2]]), chaves=[0, 2])
+
+    pd.testing.assert_frame_equal(
+        metricas.tabela(),
+        Metricas().atualizar(df=pd.concat([extratos[0], extratos[2]])).tabela(),
+        rtol=1e-9,
+    )
+
+
+def test_consulta_parquet_igual_ao_dataframe(tmp_path, monkeypatch):
+    pytest.importorskip("duckdb")
+    from libs.ConsultaParquet import BaseParquet
+
+    df = extrato_tratado(linhas=3_000)
+    df = df[~df["Movimentação"].isin(MOVIMENTACOES_EVENTOS)]
+    extratos = separar_extratos(df=df, partes=2)
+    metricas = Metricas()
+    calculadas = registrar_calculos(metricas=metricas, monkeypatch=monkeypatch)
+    for quantidade in [1, 2]:
+        base = BaseParquet(pasta=tmp_path / f"base{quantidade}")
+        base.gravar(dfs=extratos[:quantidade])
+        metricas.atualizar(df=base.consulta(), chaves=list(range(quantidade)))
+
+    # Na segunda atualização somente as movimentações do extrato novo são lidas
+    novo = BaseParquet(pasta=tmp_path / "novo")
+    novo.gravar(dfs=extratos[1:])
+    assert calculadas[1] == len(Metricas._selecionar(df=novo.consulta())[0])
+    assert metricas.linhas == len(df)
+    pd.testing.assert_frame_equal(
+        metricas.tabela(), Metricas().atualizar(df=df).tabela(), rtol=1e-9
+    )
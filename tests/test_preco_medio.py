@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+from libs.PrecoMedio import PrecoMedio, somar_por_segmento
+
+
+# FUNÇOES AUXILIARES
+# -----------------------------
+def calcular_preco_medio_loop(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cálculo anterior do preço médio, percorrendo as movimentações de cada ticker uma a uma.
+    """
+    df = df.copy()
+    for _, movs in df.groupby("Ticker", sort=False):
+        saldo_valor = 0
+        saldo_quantidade = 0
+        saldo_valores = []
+        saldo_quantidades = []
+        precos_medios = []
+        for _, row in movs.iterrows():
+            if row["Movimentação"] in ["Grupamento"]:
+                saldo_quantidade = row["Quantidade"]
+            elif row["Entrada/Saída"] == "Credito":
+                saldo_quantidade += row["Quantidade"]
+            else:
+                saldo_quantidade += -row["Quantidade"]
+            if row["Entrada/Saída"] == "Credito":
+                saldo_valor += row["Valor da Operação"]
+            else:
+                saldo_valor += -row["Valor da Operação"]
+            if saldo_valor < 0:
+                saldo_valor = 0
+                saldo_quantidade = 0
+            saldo_valores.append(saldo_valor)
+            saldo_quantidades.append(saldo_quantidade)
+            precos_medios.append(
+                abs(saldo_valor / saldo_quantidade)
+                if saldo_quantidade > 0
+                else row["Valor da Operação"] / row["Quantidade"]
+            )
+        df.loc[movs.index, "Saldo Quantidade"] = saldo_quantidades
+        df.loc[movs.index, "Saldo Valor"] = saldo_valores
+        df.loc[movs.index, "Preço Médio"] = precos_medios
+
+    return df
+
+
+def gerar_movimentacoes(semente: int, linhas: int, tickers: list) -> pd.DataFrame:
+    """
+    Gera movimentações aleatórias de compra, venda, desdobro e grupamento dos tickers.
+    """
+    gerador = np.random.default_rng(semente)
+    movimentacao = gerador.choice(
+        ["Transferência - Liquidação", "Desdobro", "Grupamento"],
+        size=linhas,
+        p=[0.9, 0.05, 0.05],
+    )
+    credito = gerador.random(linhas) < 0.6
+    quantidade = gerador.integers(1, 200, size=linhas).astype("float64")
+
+    return pd.DataFrame(
+        {
+            "Entrada/Saída": np.where(
+                credito | (movimentacao != "Transferência - Liquidação"),
+                "Credito",
+                "Debito",
+            ),
+            "Movimentação": movimentacao,
+            "Ticker": gerador.choice(tickers, size=linhas),
+            "Quantidade": quantidade,
+            "Valor da Operação": np.where(
+                movimentacao == "Transferência - Liquidação",
+                np.round(quantidade * gerador.uniform(1, 100, size=linhas), 2),
+                0.0,
+            ),
+        }
+    )
+
+
+def venda_total_exata(ticker: str) -> pd.DataFrame:
+    """
+    Duas compras e a venda de metade das ações pela soma exata dos valores das compras.
+    """
+    compras = [100.1, 0.2]
+
+    return pd.DataFrame(
+        {
+            "Entrada/Saída": ["Credito", "Credito", "Debito", "Credito"],
+            "Movimentação": ["Transferência - Liquidação"] * 4,
+            "Ticker": [ticker] * 4,
+            "Quantidade": [5.0, 5.0, 5.0, 1.0],
+            "Valor da Operação": [*compras, compras[0] + compras[1], 10.0],
+        }
+    )
+
+
+# TESTES
+# -----------------------------
+@pytest.mark.parametrize("semente", range(20))
+def test_preco_medio_igual_ao_loop(semente):
+    df = gerar_movimentacoes(
+        semente=semente, linhas=600, tickers=["PETR4", "VALE3", "HGLG11", "AAPL34"]
+    )
+
+    pd.testing.assert_frame_equal(
+        PrecoMedio().calcular_preco_medio(df=df),
+        calcular_preco_medio_loop(df=df),
+        check_exact=True,
+    )
+
+
+@pytest.mark.parametrize("semente", range(20))
+def test_preco_medio_nao_depende_dos_outros_tickers(semente):
+    outro_ticker = gerar_movimentacoes(
+        semente=semente, linhas=100_000, tickers=["ITSA4"]
+    )
+    outro_ticker["Entrada/Saída"] = "Credito"
+    df = pd.concat([outro_ticker, venda_total_exata(ticker="WEGE3")], ignore_index=True)
+
+    resultado = PrecoMedio().calcular_preco_medio(df=df)
+    wege = resultado[resultado["Ticker"] == "WEGE3"].reset_index(drop=True)
+
+    assert wege["Saldo Quantidade"].tolist() == [5.0, 10.0, 5.0, 6.0]
+    assert wege["Saldo Valor"].iloc[0] == 100.1
+    pd.testing.assert_frame_equal(
+        wege,
+        calcular_preco_medio_loop(df=venda_total_exata(ticker="WEGE3")),
+        check_exact=True,
+    )
+
+
+def test_somar_por_segmento():
+    valores = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    inicios = np.array([True, False, True, False, False, True])
+
+    np.testing.assert_array_equal(
+        somar_por_segmento(valores=valores, inicios=inicios),
+        [1.0, 3.0, 3.0, 7.0, 12.0, 6.0],
+    )